@@ -2,6 +2,8 @@
 from pymongo import MongoClient
 import os
 from dotenv import load_dotenv
+from pricing import with_price_fields
+from products import with_product_refs
 
 load_dotenv()
 MONGO_URL = os.getenv('MONGO_URL', 'mongodb://localhost:27017/')
@@ -52,7 +54,7 @@ new_looks = [
     }
 ]
 
-result = db['beauty_looks'].insert_many(new_looks)
+result = db['beauty_looks'].insert_many(with_product_refs(db, [with_price_fields(doc) for doc in new_looks]))
 print(f'✓ Added {len(new_looks)} new beauty looks')
 
 print('\n📊 Updated beauty counts:')
@@ -7,6 +7,8 @@ Makes the Shop The Look section consistent across multiple outfits
 from pymongo import MongoClient
 import os
 from dotenv import load_dotenv
+from pricing import price_fields
+from products import product_refs
 
 load_dotenv()
 
@@ -209,7 +211,8 @@ def add_products_to_outfits():
         # Update the outfit
         outfits_collection.update_one(
             {'_id': outfit['_id']},
-            {'$set': {'products': selected_products}}
+            {'$set': {'products': product_refs(db, selected_products),
+                      **price_fields({**outfit, 'products': selected_products})}}
         )
         
         updated_count += 1
@@ -7,6 +7,8 @@ Prepares the schema for affiliate monetization
 from pymongo import MongoClient
 import os
 from dotenv import load_dotenv
+from pricing import price_fields
+from products import product_refs
 
 load_dotenv()
 
@@ -51,7 +53,8 @@ def add_products_field():
         ]
         outfits_collection.update_one(
             {'_id': sample_outfit['_id']},
-            {'$set': {'products': sample_products}}
+            {'$set': {'products': product_refs(db, sample_products),
+                      **price_fields({**sample_outfit, 'products': sample_products})}}
         )
         print(f"   📝 Added sample products to outfit: {sample_outfit.get('title', 'Unknown')}")
     
@@ -91,7 +94,8 @@ def add_products_field():
         ]
         beauty_collection.update_one(
             {'_id': sample_beauty['_id']},
-            {'$set': {'products': sample_products}}
+            {'$set': {'products': product_refs(db, sample_products),
+                      **price_fields({**sample_beauty, 'products': sample_products})}}
         )
         print(f"   📝 Added sample products to beauty look: {sample_beauty.get('title', 'Unknown')}")
     
@@ -0,0 +1,556 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks for backend hot paths
+
+No database or API keys needed - everything runs on fixtures or synthetic data.
+
+Usage:
+    python benchmarks.py                  # run every benchmark
+    python benchmarks.py normalization    # run one benchmark by name
+"""
+
+import heapq
+import json
+import random
+import re
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+from query_normalize import search_key, is_generic, normalize_query, fold
+import title_scorer
+from search_index import SearchIndex, SuggestIndex, catalog_suggestions, OUTFIT_FIELDS, OUTFIT_FILTERS
+from pricing import PRICE_BANDS, with_price_fields, price_bands, price_window
+from weather_scoring import WeatherScorer, outfit_features, weather_vector
+from similar_items import SimilarIndex
+from coengagement import CoEngagement
+from trending import OUTFIT_EVENT_WEIGHTS
+
+FIXTURES_DIR = Path(__file__).parent / 'fixtures'
+
+BENCHMARKS = {}
+
+
+def benchmark(name: str):
+    """Register a benchmark function under `name`"""
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def timed(func, *args, repeat: int = 5):
+    """Best-of-`repeat` wall time in milliseconds, plus the last result"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def load_vision_fixtures(path: Path = None) -> list:
+    """Vision responses recorded as {name, best_guess, web_entities, text}"""
+    with open(path or FIXTURES_DIR / 'vision_samples.json') as f:
+        return json.load(f)
+
+
+def image_candidate_queries(sample: dict) -> list:
+    """
+    Every TMDB search `recognize_image` would issue for a Vision response if
+    nothing matched - best guesses, non-generic entities, then OCR windows.
+    """
+    queries = list(sample.get('best_guess', [])[:3])
+    queries += [e['text'] for e in sample.get('web_entities', [])[:25] if not is_generic(e['text'])]
+    texts = sample.get('text', [])
+    words = texts[0].replace('\n', ' ').split() if texts else []
+    for i in range(min(20, len(words) - 1)):
+        queries.append(f"{words[i]} {words[i+1]}")
+        if i < len(words) - 2:
+            queries.append(f"{words[i]} {words[i+1]} {words[i+2]}")
+    return queries
+
+
+@benchmark('normalization')
+def bench_normalization(fixtures_path: str = None):
+    """TMDB search calls per Vision fixture before and after query normalization"""
+    samples = load_vision_fixtures(Path(fixtures_path) if fixtures_path else None)
+    totals = {'raw': 0, 'exact': 0, 'normalized': 0}
+    all_keys = set()
+    print(f"{'fixture':<24}{'raw':>6}{'exact':>8}{'normalized':>12}")
+    for sample in samples:
+        queries = image_candidate_queries(sample)
+        keys = {search_key(q) for q in queries}
+        counts = {'raw': len(queries), 'exact': len(set(queries)), 'normalized': len(keys)}
+        all_keys |= keys
+        for k, v in counts.items():
+            totals[k] += v
+        print(f"{sample['name']:<24}{counts['raw']:>6}{counts['exact']:>8}{counts['normalized']:>12}")
+    print(f"{'total':<24}{totals['raw']:>6}{totals['exact']:>8}{totals['normalized']:>12}")
+    print(f"distinct keys across all fixtures (shared cache): {len(all_keys)}")
+    saved = 1 - totals['normalized'] / totals['raw'] if totals['raw'] else 0
+    print(f"calls saved within requests: {saved:.1%}")
+
+
+SYNTHETIC_TITLES = [
+    'The Dark Knight', 'The Dark Knight Rises', 'Batman Begins', 'Inception', 'Interstellar',
+    'The Matrix', 'The Matrix Reloaded', 'A Quiet Place', 'A Quiet Place Part II',
+    'Spirited Away', "Harry Potter and the Philosopher's Stone", 'Amélie', 'Joker',
+    'Leonardo', 'Tenet', 'Dunkirk', 'Memento', 'The Prestige', 'Oppenheimer', 'Her',
+]
+
+
+TITLE_WORDS = [
+    'night', 'dark', 'last', 'lost', 'city', 'love', 'house', 'war', 'dead', 'star', 'blood', 'story',
+    'king', 'girl', 'man', 'road', 'fire', 'storm', 'secret', 'shadow', 'world', 'heart', 'river', 'moon',
+    'silent', 'broken', 'golden', 'wild', 'black', 'red', 'summer', 'winter', 'empire', 'return', 'rising',
+    'dream', 'ghost', 'island', 'kingdom', 'legend', 'hunter', 'garden', 'promise', 'escape', 'mission',
+]
+
+
+def synthetic_titles(n: int, seed: int = 11) -> list:
+    """`n` distinct movie-like titles ("The Silent River", "Golden Empire II", ...)"""
+    rng = random.Random(seed)
+    titles = dict.fromkeys(SYNTHETIC_TITLES)
+    while len(titles) < n:
+        words = [w.title() for w in rng.sample(TITLE_WORDS, rng.randint(1, 3))]
+        if rng.random() < 0.3:
+            words.append(''.join(rng.choices(SYLLABLES, k=rng.randint(2, 3))).title())
+        title = ('The ' if rng.random() < 0.4 else '') + ' '.join(words)
+        if rng.random() < 0.15:
+            title += ' ' + rng.choice(['II', 'III', '2', 'Part II', 'Returns'])
+        titles.setdefault(title)
+    return list(titles)[:n]
+
+
+def clear_scoring_caches():
+    """Every memo on the scoring path, so a run measures the cold path"""
+    title_scorer.edit_similarity.cache_clear()
+    normalize_query.cache_clear()
+    fold.cache_clear()
+
+
+@benchmark('scoring')
+def bench_scoring(candidates: str = '500'):
+    """
+    Time to rank N fresh (query, TMDB result) pairs with every memo cache
+    cleared, as 50 queries x N/50 search results and as one query x N credits
+    (the people path), plus the one-off cost of keying the results at fetch
+    """
+    n = int(candidates)
+    titles = synthetic_titles(n)
+    samples = load_vision_fixtures()
+    queries = list(dict.fromkeys(e['text'] for s in samples for e in s['web_entities'] if not is_generic(e['text'])))
+    rng = random.Random(5)
+    while len(queries) < 50:
+        # Vision-style entities: a title with a trailing label or a dropped word
+        title = rng.choice(titles)
+        queries.append(rng.choice([f"{title} film", f"{title} poster", ' '.join(title.split()[1:]) or title]))
+    queries = queries[:50]
+
+    def fetch():
+        return title_scorer.with_title_keys([{'id': i, 'title': t, 'popularity': float(i % 300)}
+                                             for i, t in enumerate(titles)])
+
+    clear_scoring_caches()
+    keying_ms, results = timed(fetch, repeat=1)
+    per_query = max(1, n // len(queries))
+    searches = [(q, results[i * per_query:(i + 1) * per_query]) for i, q in enumerate(queries)]
+    credits_query = queries[0]
+
+    def best_cold(func, repeat: int = 20) -> float:
+        best = float('inf')
+        for _ in range(repeat):
+            clear_scoring_caches()
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+        return best * 1000
+
+    def score_searches():
+        return [title_scorer.rank_results(q, rs, top_n=len(rs)) for q, rs in searches]
+
+    def score_credits():
+        return title_scorer.rank_results(credits_query, results, top_n=len(results))
+
+    print(f"keying {n} fetched results (once, at fetch): {keying_ms:.3f} ms")
+    for label, func in ((f"{len(searches)} queries x {per_query} results", score_searches),
+                        (f"1 query x {n} credits", score_credits)):
+        cold_ms = best_cold(func)
+        warm_ms, _ = timed(func, repeat=20)
+        print(f"{label}: cold {cold_ms:.3f} ms, warm {warm_ms:.3f} ms")
+
+
+OUTFIT_CATEGORIES = ['casual', 'streetwear', 'elegant', 'business', 'date-night', 'summer', 'winter', 'athleisure']
+OUTFIT_WORDS = [
+    'linen', 'denim', 'oversized', 'cropped', 'leather', 'wool', 'silk', 'vintage', 'minimal', 'tailored',
+    'blazer', 'jacket', 'coat', 'sneakers', 'boots', 'sandals', 'dress', 'skirt', 'jeans', 'trousers',
+    'hoodie', 'sweater', 'cardigan', 'tank', 'shorts', 'scarf', 'beanie', 'layers', 'neutral', 'black',
+    'white', 'navy', 'camel', 'olive', 'pastel', 'monochrome', 'weekend', 'office', 'evening', 'brunch',
+]
+
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'ne', 'su', 'to', 'vi', 'za', 'be', 'do', 'fi', 'gu', 'ha', 'je', 'ly']
+
+
+def synthetic_catalog(n: int, seed: int = 7) -> list:
+    """
+    `n` outfit-shaped documents. Titles and descriptions mix common OUTFIT_WORDS
+    with a long tail of made-up brand/material words, like a real catalog.
+    """
+    rng = random.Random(seed)
+    rare_words = sorted({''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(20_000)})
+    docs = []
+    for i in range(n):
+        low = rng.randint(20, 600)
+        docs.append({
+            '_id': f"{i:024x}",
+            'title': ' '.join(rng.sample(OUTFIT_WORDS, 2) + rng.sample(rare_words, 1)).title(),
+            'description': ' '.join(rng.choices(OUTFIT_WORDS, k=6) + rng.choices(rare_words, k=6)),
+            'category': rng.choice(OUTFIT_CATEGORIES),
+            'gender': rng.choice(['women', 'men', 'unisex']),
+            'isCelebrity': rng.random() < 0.1,
+            'priceRange': f"${low} - ${low + rng.randint(0, 400)}",
+        })
+    return docs
+
+
+@benchmark('search')
+def bench_search(docs: str = '100000'):
+    """Unanchored case-insensitive regex scan (what $regex does without an index) vs the BM25 index"""
+    catalog = synthetic_catalog(int(docs))
+    queries = ['linen', 'oversized blazer', 'black leather boots', 'camel co', 'weekend brunch dress', 'kalo', 'mira']
+
+    start = time.perf_counter()
+    index = SearchIndex(OUTFIT_FIELDS, OUTFIT_FILTERS)
+    index.rebuild((doc['_id'], doc) for doc in catalog)
+    build_ms = (time.perf_counter() - start) * 1000
+    print(f"{len(catalog)} docs, index build {build_ms:.0f} ms, {index.stats()['terms']} terms")
+
+    def regex_scan(q):
+        pattern = re.compile(re.escape(q), re.IGNORECASE)
+        hits = [d for d in catalog
+                if pattern.search(d['title']) or pattern.search(d['description']) or pattern.search(d['category'])]
+        return hits[:50]
+
+    print(f"{'query':<24}{'regex ms':>10}{'hits':>7}{'index ms':>10}{'hits':>7}")
+    for q in queries:
+        regex_ms, regex_hits = timed(regex_scan, q, repeat=3)
+        index_ms, ranked = timed(lambda: index.search(q, limit=50))
+        print(f"{q:<24}{regex_ms:>10.2f}{len(regex_hits):>7}{index_ms:>10.2f}{len(ranked):>7}")
+
+    doc = dict(catalog[0], title='Tailored Camel Overcoat')
+    incremental_ms, _ = timed(lambda: index.upsert(doc['_id'], dict(doc, description=str(time.perf_counter()))))
+    print(f"incremental upsert of one doc: {incremental_ms:.3f} ms")
+
+
+@benchmark('suggest')
+def bench_suggest(docs: str = '20000'):
+    """Typeahead latency per keystroke over catalog titles, categories and movie titles"""
+    catalog = synthetic_catalog(int(docs))
+    index = SuggestIndex()
+    start = time.perf_counter()
+    index.sync('outfit', {doc['_id']: catalog_suggestions('outfit', doc) for doc in catalog})
+    for i, title in enumerate(SYNTHETIC_TITLES):
+        index.set_source(f"movie:{i}", [('movie', title)])
+    print(f"{len(catalog)} docs -> {index.stats()} in {(time.perf_counter() - start) * 1000:.0f} ms")
+    prefixes = ('l', 'li', 'lin', 'line', 'linen', 'linen bla', 'blac', 'blaz', 'leat', 'leather', 'over',
+                'the da', 'stre')
+
+    def keystrokes(label):
+        print(label)
+        for typed in prefixes:
+            first_ms, _ = timed(lambda: index.suggest(typed), repeat=1)
+            ms, suggestions = timed(lambda: index.suggest(typed), repeat=50)
+            lo, hi = index._range(fold(typed))
+            assert suggestions == [{'text': display, 'type': kind, 'score': round(score, 3)}
+                                   for score, display, kind in index._ranked(lo, hi)[:8]], typed
+            print(f"  {typed!r:<14}{first_ms:>8.3f} ms first{ms:>8.3f} ms  {hi - lo:>6} keys  "
+                  f"{[s['text'] for s in suggestions[:3]]}")
+
+    keystrokes('first keystrokes after startup, then repeats:')
+    # 1% of the catalog edited: titles replaced, categories moved
+    rng = random.Random(3)
+    edited = {doc['_id']: catalog_suggestions('outfit', {**doc, 'title': rng.choice(catalog)['title'] + ' Edit',
+                                                           'category': rng.choice(OUTFIT_CATEGORIES)})
+              for doc in rng.sample(catalog, len(catalog) // 100)}
+    start = time.perf_counter()
+    for doc_id, entries in edited.items():
+        index.set_source(f"outfit:{doc_id}", entries)
+    print(f"{len(edited)} docs edited in {(time.perf_counter() - start) * 1000:.1f} ms, "
+          f"{index.stats()['cached_prefixes']} cached prefixes kept")
+    keystrokes('after the edits:')
+
+
+@benchmark('facets')
+def bench_facets(docs: str = '100000'):
+    """Category, gender and price band counts: separate count queries vs one pass over the index"""
+    catalog = [with_price_fields(doc) for doc in synthetic_catalog(int(docs))]
+    index = SearchIndex(OUTFIT_FIELDS, OUTFIT_FILTERS)
+    index.rebuild((doc['_id'], doc) for doc in catalog)
+    facets = {
+        'category': lambda attrs: [attrs['category']],
+        'gender': lambda attrs: [attrs['gender']],
+        'price': lambda attrs: price_bands(attrs['priceMinCents'], attrs['priceMaxCents']),
+    }
+    values = {'category': OUTFIT_CATEGORIES, 'gender': ['women', 'men', 'unisex']}
+    cases = [
+        ('', {}, None),
+        ('black', {}, None),
+        ('oversized blazer', {'category': 'business'}, None),
+        ('', {'category': 'streetwear'}, (100, 250)),
+    ]
+
+    def separate_queries(q, equals, prices):
+        # What a filter screen does today: one count per facet value, each re-running the search
+        # with the other facets' filters applied
+        ranges = price_window(*prices) if prices else {}
+        counts = {name: {} for name in facets}
+        for name, options in values.items():
+            others = {field: value for field, value in equals.items() if field != name}
+            for value in options:
+                hits = index.search(q, limit=None, equals={**others, name: value}, ranges=ranges) if q else \
+                    [d for d in index._attributes if index.matches(d, equals={**others, name: value}, ranges=ranges)]
+                if hits:
+                    counts[name][value] = len(hits)
+        for band, low, high in PRICE_BANDS:
+            window = price_window(low, high)
+            hits = index.search(q, limit=None, equals=equals, ranges=window) if q else \
+                [d for d in index._attributes if index.matches(d, equals=equals, ranges=window)]
+            if hits:
+                counts['price'][band] = len(hits)
+        return counts
+
+    def single_pass(q, equals, prices):
+        filters = {field: (lambda attrs, only={field: value}: SearchIndex.attributes_match(attrs, equals=only))
+                   for field, value in equals.items()}
+        if prices:
+            filters['price'] = lambda attrs: SearchIndex.attributes_match(attrs, ranges=price_window(*prices))
+        return index.facets(q, facets, filters)
+
+    print(f"{len(catalog)} docs")
+    print(f"{'query':<20}{'filters':<34}{'separate ms':>12}{'queries':>9}{'single ms':>11}{'same':>6}")
+    for q, equals, prices in cases:
+        separate_ms, expected = timed(separate_queries, q, equals, prices, repeat=1)
+        single_ms, counts = timed(single_pass, q, equals, prices, repeat=3)
+        queries = sum(len(v) for v in values.values()) + len(PRICE_BANDS)
+        label = ', '.join(f"{k}={v}" for k, v in equals.items()) + (f" price={prices}" if prices else '')
+        print(f"{q or '(none)':<20}{label or '-':<34}{separate_ms:>12.1f}{queries:>9}{single_ms:>11.1f}"
+              f"{str(counts == expected):>6}")
+
+
+@benchmark('price_pages')
+def bench_price_pages(docs: str = '100000', size: str = '20'):
+    """Price-sorted search pages: sorting every match per page vs walking the index's price order"""
+    catalog = [with_price_fields(doc) for doc in synthetic_catalog(int(docs))]
+    index = SearchIndex(OUTFIT_FIELDS, OUTFIT_FILTERS, sorts=('priceMinCents',))
+    index.rebuild((doc['_id'], doc) for doc in catalog)
+    n = int(size)
+    cases = [
+        ('', {}, None),
+        ('', {'category': 'streetwear'}, (100, 250)),
+        ('black', {}, None),
+        ('oversized blazer', {'category': 'business'}, None),
+    ]
+
+    def sorted_page(q, equals, ranges, descending, after):
+        # The previous approach: every match collected and sorted, then cut at the cursor
+        ids = [doc_id for doc_id, _ in index.search(q, limit=None, equals=equals, ranges=ranges)] if q else \
+            [d for d in index._attributes if index.matches(d, equals=equals, ranges=ranges)]
+        keyed = sorted((index.attributes(d)['priceMinCents'], d) for d in ids
+                       if index.attributes(d).get('priceMinCents') is not None)
+        if descending:
+            keyed.reverse()
+        if after:
+            keyed = [key for key in keyed if (key < after if descending else key > after)]
+        return keyed[:n + 1]
+
+    def ordered_page(q, equals, ranges, descending, after):
+        if q:
+            return index.ordered('priceMinCents', n + 1, descending, after,
+                                 among=index.hits(q, equals=equals, ranges=ranges))
+        return index.ordered('priceMinCents', n + 1, descending, after, equals=equals, ranges=ranges)
+
+    print(f"{len(catalog)} docs, {n} per page")
+    print(f"{'query':<18}{'filters':<38}{'order':<6}{'pages':>6}{'sorted ms/page':>16}{'ordered ms/page':>17}")
+    for q, equals, prices in cases:
+        ranges = price_window(*prices) if prices else {}
+        for descending in (False, True):
+            cursors, after = [None], None
+            while True:
+                page = ordered_page(q, equals, ranges, descending, after)
+                if len(page) <= n or len(cursors) >= 200:
+                    break
+                after = page[n - 1]
+                cursors.append(after)
+            assert all(ordered_page(q, equals, ranges, descending, after) ==
+                       sorted_page(q, equals, ranges, descending, after) for after in cursors[::10] + cursors[-1:])
+            sorted_ms, _ = timed(lambda: [sorted_page(q, equals, ranges, descending, a) for a in cursors[::20]],
+                                 repeat=1)
+            ordered_ms, _ = timed(lambda: [ordered_page(q, equals, ranges, descending, a) for a in cursors], repeat=3)
+            label = ', '.join(f"{k}={v}" for k, v in equals.items()) + (f" price={prices}" if prices else '')
+            print(f"{q or '(none)':<18}{label or '-':<38}{'desc' if descending else 'asc':<6}{len(cursors):>6}"
+                  f"{sorted_ms / len(cursors[::20]):>16.2f}{ordered_ms / len(cursors):>17.3f}")
+
+
+@benchmark('weather')
+def bench_weather(docs: str = '100000', locations: str = '1000'):
+    """Weather top-k: per-outfit Python scoring vs the NumPy feature matrix, single and batched"""
+    catalog = synthetic_catalog(int(docs))
+    rng = random.Random(11)
+    conditions = ['Clear', 'Clouds', 'Rain', 'Snow', 'Wind', 'Drizzle']
+    weathers = [(rng.uniform(10, 100), rng.choice(conditions)) for _ in range(int(locations))]
+
+    start = time.perf_counter()
+    scorer = WeatherScorer()
+    for doc in catalog:
+        scorer.update(doc['_id'], doc)
+    build_ms = (time.perf_counter() - start) * 1000
+    print(f"{len(catalog)} docs, feature matrix build {build_ms:.0f} ms, {scorer.stats()}")
+
+    # The same scores one outfit at a time, as a loop over sparse feature rows
+    rows = [(doc['_id'], [(i, float(v)) for i, v in enumerate(outfit_features(doc)) if v]) for doc in catalog]
+
+    def python_top(temp_f, condition, k=6):
+        vector = weather_vector(temp_f, condition).tolist()
+        scored = ((sum(v * vector[i] for i, v in row), doc_id) for doc_id, row in rows)
+        return heapq.nlargest(k, scored)
+
+    print(f"{'weather':<16}{'python ms':>10}{'numpy ms':>10}{'same':>6}")
+    for temp_f, condition in [(95, 'Clear'), (72, 'Clouds'), (60, 'Rain'), (20, 'Snow')]:
+        python_ms, expected = timed(python_top, temp_f, condition, repeat=1)
+        numpy_ms, ranked = timed(scorer.top, temp_f, condition, 6)
+        same = np.allclose(sorted(s for s, _ in expected), sorted(s for _, s in ranked), atol=1e-4)
+        print(f"{f'{temp_f}F {condition}':<16}{python_ms:>10.1f}{numpy_ms:>10.2f}{str(same):>6}")
+
+    singles_ms, singles = timed(lambda: [scorer.top(t, c, 6) for t, c in weathers], repeat=1)
+    batch_ms, batched = timed(scorer.top_batch, weathers, 6, repeat=1)
+    # Compare scores rather than ids: synthetic outfits tie a lot
+    same = all(np.allclose([s for _, s in a], [s for _, s in b], atol=1e-4) for a, b in zip(singles, batched))
+    print(f"{len(weathers)} locations: {singles_ms:.0f} ms one at a time, {batch_ms:.0f} ms batched "
+          f"({singles_ms / batch_ms:.1f}x), same top-6: {same}")
+
+    doc = dict(catalog[0], title='Waterproof Trench Rain Boots')
+    update_ms, _ = timed(scorer.update, doc['_id'], doc, repeat=50)
+    print(f"incremental update of one outfit: {update_ms:.3f} ms")
+
+
+@benchmark('similar')
+def bench_similar(docs: str = '20000'):
+    """Similar-items full build (time, peak memory), incremental updates and O(1) lookups"""
+    catalog = [dict(doc, id=doc['_id']) for doc in synthetic_catalog(int(docs))]
+    index = SimilarIndex()
+    build_ms, _ = timed(index.rebuild, catalog, repeat=1)
+    stats = index.stats()
+    print(f"{len(catalog)} docs, {stats['terms']} terms ({stats['dense_terms']} dense), build {build_ms:.0f} ms, "
+          f"index ~{stats['memory_mb']} MB")
+
+    tracemalloc.start()
+    SimilarIndex().rebuild(catalog)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"peak traced memory during build: {peak / 1e6:.0f} MB")
+
+    # Spot-check lists against brute-force scoring
+    rng = random.Random(5)
+    sample = rng.sample(range(len(catalog)), 20)
+    exact = all(np.allclose([s for _, s in index._top_k(index._scores_locked(row))],
+                            [s for _, s in index._lists[row]], atol=1e-5) for row in sample)
+    print(f"lists match brute force on {len(sample)} docs: {exact}")
+
+    edits = [dict(rng.choice(catalog), title=f"{rng.choice(OUTFIT_WORDS)} {rng.choice(OUTFIT_WORDS)} edit")
+             for _ in range(50)]
+    start = time.perf_counter()
+    for doc in edits:
+        index.apply({doc['id']: doc})
+    update_ms = (time.perf_counter() - start) * 1000 / len(edits)
+    print(f"incremental update: {update_ms:.1f} ms per changed doc "
+          f"({index.metrics['lists_recomputed'] / len(edits):.0f} lists touched on average), "
+          f"vs {build_ms:.0f} ms full rebuild")
+
+    ids = [doc['id'] for doc in catalog[:1000]]
+    lookup_ms, _ = timed(lambda: [index.neighbors(doc_id, 10) for doc_id in ids], repeat=5)
+    print(f"neighbor lookup: {lookup_ms * 1000 / len(ids):.2f} us per request")
+
+
+def synthetic_sessions(n_events: int, n_items: int = 20000, n_clusters: int = 400, seed: int = 3):
+    """
+    Session event stream in time order: each session browses one taste cluster
+    of items (Zipf-popular within it), with the odd random click
+    """
+    rng = random.Random(seed)
+    cluster_of = [rng.randrange(n_clusters) for _ in range(n_items)]
+    members = {}
+    for item, cluster in enumerate(cluster_of):
+        members.setdefault(cluster, []).append(f"{item:024x}")
+    zipf = [1 / (rank + 1) for rank in range(max(len(m) for m in members.values()))]
+    event_types = ['outfit_view'] * 8 + ['product_click'] * 2 + ['outfit_favorited']
+    events, now, session = [], 0.0, 0
+    while len(events) < n_events:
+        session += 1
+        pool = members[rng.randrange(n_clusters)]
+        for _ in range(rng.randint(2, 12)):
+            now += rng.random()
+            item = rng.choices(pool, weights=zipf[:len(pool)])[0] if rng.random() < 0.9 else \
+                f"{rng.randrange(n_items):024x}"
+            events.append((f"s{session}", item, rng.choice(event_types), now))
+    return events[:n_events], {f"{item:024x}": cluster for item, cluster in enumerate(cluster_of)}
+
+
+@benchmark('coengagement')
+def bench_coengagement(events: str = '200000'):
+    """Also-viewed: event throughput, publish time and memory, bounded (top-k pruned) vs unbounded"""
+    stream, cluster_of = synthetic_sessions(int(events))
+    print(f"{len(stream)} events, {len(set(e[0] for e in stream))} sessions, {len(cluster_of)} items")
+    print(f"{'candidates':<12}{'events/s':>10}{'publish ms':>12}{'pairs':>10}{'peak MB':>9}{'in-cluster':>12}")
+    lists = {}
+    for label, max_candidates in (('unbounded', 10 ** 9), ('200', 200), ('50', 50)):
+        def replay():
+            co = CoEngagement(OUTFIT_EVENT_WEIGHTS, max_candidates=max_candidates)
+            for session_id, item_id, event_type, timestamp in stream:
+                co.record(session_id, item_id, event_type, timestamp)
+            return co
+
+        record_ms, co = timed(replay, repeat=1)
+        tracemalloc.start()
+        replay()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        publish_ms, _ = timed(co.publish, True, repeat=1)
+        lists[label] = {item: [other for other, _ in co.also_viewed(item)] for item in cluster_of}
+        listed = [(item, other) for item, others in lists[label].items() for other in others]
+        precision = sum(cluster_of[item] == cluster_of[other] for item, other in listed) / max(len(listed), 1)
+        print(f"{label:<12}{len(stream) / record_ms * 1000:>10.0f}{publish_ms:>12.0f}{co.stats()['pair_entries']:>10}"
+              f"{peak / 1e6:>9.0f}{precision:>12.3f}")
+    for label in ('200', '50'):
+        overlap = [len(set(lists[label][item]) & set(exact)) / len(exact)
+                   for item, exact in lists['unbounded'].items() if exact]
+        print(f"top-10 overlap with unbounded, {label} candidates: {sum(overlap) / len(overlap):.3f}")
+
+    # Live serving: one tracked event, then the background publish of what it changed
+    items = list(cluster_of)
+    for i, item in enumerate(items[:5]):
+        co.record('live', item, 'outfit_view', stream[-1][3] + i)
+    incremental_ms, published = timed(co.publish, repeat=1)
+    lookup_ms, _ = timed(lambda: [co.also_viewed(item, 10) for item in items[:1000]])
+    print(f"publish after 5 live events: {incremental_ms:.2f} ms ({published} lists); "
+          f"lookup {lookup_ms * 1000 / 1000:.3f} us per request")
+
+
+def main(argv):
+    names = argv[1:2] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark '{name}'. Available: {', '.join(BENCHMARKS)}")
+            return 1
+        print(f"\n=== {name} ===")
+        BENCHMARKS[name](*argv[2:])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,236 @@
+"""
+Provider quota and cost budget manager
+
+Counts outbound calls to paid/free-tier providers (Google Vision, AudD,
+Whisper, TMDB, OpenWeather) per provider, per endpoint and per day/month,
+persists the counters in MongoDB and enforces daily/monthly ceilings plus a
+token-bucket rate limit so a burst of traffic cannot silently drain a quota.
+
+Accounting is in-memory; counter deltas are written to MongoDB (Motor) by a
+background task (the server's state flush loop), never on the request path.
+
+Limits are configured through environment variables, e.g.:
+    BUDGET_VISION_DAILY=100  BUDGET_VISION_MONTHLY=1000  BUDGET_VISION_RPS=5
+A limit of 0 (or unset with no default) means unlimited.
+"""
+
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Endpoint currently being served - set per request so provider calls made
+# deep inside helper functions are attributed to the route that caused them
+current_endpoint: ContextVar[str] = ContextVar('current_endpoint', default='background')
+
+# Default ceilings roughly matching the free tiers we run on
+DEFAULT_LIMITS = {
+    'vision': {'daily': 100, 'monthly': 1000, 'rps': 5, 'burst': 10},
+    'audd': {'daily': 20, 'monthly': 300, 'rps': 2, 'burst': 4},
+    'whisper': {'daily': 200, 'monthly': 0, 'rps': 2, 'burst': 4},
+    'tmdb': {'daily': 0, 'monthly': 0, 'rps': 40, 'burst': 50},
+    'openweather': {'daily': 1000, 'monthly': 0, 'rps': 1, 'burst': 60},
+}
+
+# Fraction of a ceiling after which callers should switch to cheaper paths
+DEFAULT_SOFT_RATIO = 0.9
+
+
+def _env_number(name: str, default: float) -> float:
+    value = os.environ.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        logger.warning(f"Ignoring invalid budget setting {name}={value!r}")
+        return default
+
+
+def load_limits_from_env() -> dict:
+    """Merge BUDGET_<PROVIDER>_<DAILY|MONTHLY|RPS|BURST> overrides into the defaults"""
+    limits = {}
+    for provider, defaults in DEFAULT_LIMITS.items():
+        limits[provider] = {
+            key: _env_number(f"BUDGET_{provider.upper()}_{key.upper()}", value)
+            for key, value in defaults.items()
+        }
+    return limits
+
+
+def _periods(now: float = None) -> dict:
+    """Current period keys for each accounting window (UTC)"""
+    dt = datetime.utcfromtimestamp(now if now is not None else time.time())
+    return {'day': dt.strftime('%Y-%m-%d'), 'month': dt.strftime('%Y-%m')}
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `capacity` banked"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+
+class BudgetManager:
+    """Per-provider call accounting with ceilings, rate limits and Mongo persistence"""
+
+    def __init__(self, collection=None, limits: dict = None, soft_ratio: float = None):
+        self.collection = collection
+        self.limits = limits or load_limits_from_env()
+        self.soft_ratio = soft_ratio if soft_ratio is not None else _env_number(
+            'BUDGET_SOFT_RATIO', DEFAULT_SOFT_RATIO)
+        self._lock = threading.Lock()
+        self._buckets = {
+            provider: TokenBucket(cfg.get('rps', 0), cfg.get('burst', cfg.get('rps', 1)))
+            for provider, cfg in self.limits.items()
+        }
+        # (provider, window, period) -> calls, across all endpoints
+        self._totals = {}
+        # (provider, endpoint, window, period) -> {'calls': n, 'denied': n}
+        self._counts = {}
+        # Deltas not yet written to Mongo, same keys as _counts
+        self._pending = {}
+
+    # ---------- persistence ----------
+
+    async def load(self):
+        """Seed in-memory counters for the current day/month from MongoDB"""
+        if self.collection is None:
+            return
+        periods = _periods()
+        try:
+            docs = await self.collection.find({"$or": [
+                {"window": window, "period": period} for window, period in periods.items()
+            ]}).to_list(length=None)
+            with self._lock:
+                for doc in docs:
+                    self._apply(doc['provider'], doc.get('endpoint', 'unknown'), doc['window'],
+                                doc['period'], doc.get('calls', 0), doc.get('denied', 0))
+            logger.info("Budget counters loaded from MongoDB")
+        except Exception as e:
+            logger.warning(f"Could not load budget counters: {e}")
+
+    async def flush(self):
+        """Write pending counter deltas to MongoDB with upserting $inc updates"""
+        if self.collection is None:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        from pymongo import UpdateOne
+        ops = [
+            UpdateOne(
+                {"provider": provider, "endpoint": endpoint, "window": window, "period": period},
+                {"$inc": {"calls": delta['calls'], "denied": delta['denied']}},
+                upsert=True
+            )
+            for (provider, endpoint, window, period), delta in pending.items()
+        ]
+        try:
+            await self.collection.bulk_write(ops, ordered=False)
+        except Exception as e:
+            logger.warning(f"Budget flush failed, will retry: {e}")
+            with self._lock:
+                for key, delta in pending.items():
+                    slot = self._pending.setdefault(key, {'calls': 0, 'denied': 0})
+                    slot['calls'] += delta['calls']
+                    slot['denied'] += delta['denied']
+
+    # ---------- accounting ----------
+
+    def _apply(self, provider, endpoint, window, period, calls, denied):
+        slot = self._counts.setdefault((provider, endpoint, window, period), {'calls': 0, 'denied': 0})
+        slot['calls'] += calls
+        slot['denied'] += denied
+        total_key = (provider, window, period)
+        self._totals[total_key] = self._totals.get(total_key, 0) + calls
+
+    def _record(self, provider, endpoint, calls, denied):
+        for window, period in _periods().items():
+            self._apply(provider, endpoint, window, period, calls, denied)
+            slot = self._pending.setdefault((provider, endpoint, window, period), {'calls': 0, 'denied': 0})
+            slot['calls'] += calls
+            slot['denied'] += denied
+
+    def usage(self, provider: str) -> dict:
+        """Calls used vs ceiling for each window of one provider"""
+        cfg = self.limits.get(provider, {})
+        result = {}
+        for window, period in _periods().items():
+            limit = int(cfg.get('daily' if window == 'day' else 'monthly', 0) or 0)
+            used = self._totals.get((provider, window, period), 0)
+            result[window] = {
+                'period': period,
+                'used': used,
+                'limit': limit or None,
+                'remaining': max(limit - used, 0) if limit else None,
+            }
+        return result
+
+    def _ratio(self, provider: str) -> float:
+        ratios = [
+            w['used'] / w['limit'] for w in self.usage(provider).values() if w['limit']
+        ]
+        return max(ratios) if ratios else 0.0
+
+    def is_degraded(self, provider: str) -> bool:
+        """True once any window is past the soft ratio - callers should prefer cheap paths"""
+        return self._ratio(provider) >= self.soft_ratio
+
+    def is_exhausted(self, provider: str) -> bool:
+        return self._ratio(provider) >= 1.0
+
+    def acquire(self, provider: str, endpoint: str = None) -> bool:
+        """
+        Reserve one call to `provider`. Returns False (and counts a denial) when a
+        ceiling is reached or the rate limit is exceeded; the caller must then skip
+        the network call and fall back to a cached/local path.
+        """
+        endpoint = endpoint or current_endpoint.get()
+        with self._lock:
+            allowed = not self.is_exhausted(provider)
+            if allowed:
+                bucket = self._buckets.get(provider)
+                allowed = bucket.try_acquire() if bucket else True
+            self._record(provider, endpoint, 1 if allowed else 0, 0 if allowed else 1)
+        if not allowed:
+            logger.warning(f"Budget denied {provider} call from {endpoint}")
+        return allowed
+
+    def report(self) -> dict:
+        """Spend per provider and per endpoint for the current day and month"""
+        periods = _periods()
+        providers = {}
+        with self._lock:
+            for provider in self.limits:
+                providers[provider] = {
+                    **self.usage(provider),
+                    'degraded': self.is_degraded(provider),
+                    'exhausted': self.is_exhausted(provider),
+                    'endpoints': {},
+                }
+            for (provider, endpoint, window, period), slot in self._counts.items():
+                if periods.get(window) != period or provider not in providers:
+                    continue
+                endpoint_stats = providers[provider]['endpoints'].setdefault(endpoint, {})
+                endpoint_stats[window] = dict(slot)
+        return {'periods': periods, 'soft_ratio': self.soft_ratio, 'providers': providers}
@@ -0,0 +1,335 @@
+"""
+In-memory catalog snapshots
+
+The outfit and beauty catalogs are small, read-mostly and written in bulk by
+the `load_*.py` scripts, so the listing and deep-link endpoints read them from
+a process-local snapshot instead of MongoDB. Each snapshot holds documents in
+API form (string `id`) indexed by id and by a few fields (category,
+isCelebrity, gender, ...).
+
+Freshness comes from a MongoDB change stream. Standalone servers have no
+change streams, so the snapshot falls back to polling and diffing the
+collection every `poll_interval` seconds. Listeners (the search and suggest
+indexes) are told about every document that changed.
+"""
+
+import asyncio
+import bisect
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from database import to_api
+
+logger = logging.getLogger(__name__)
+
+# "The $changeStream stage is only supported on replica sets"
+CHANGE_STREAM_UNSUPPORTED = (40573, 40324)
+# Events after which a stream is invalidated (resuming after them is rejected)
+STREAM_ENDING_OPERATIONS = ('drop', 'rename', 'dropDatabase', 'invalidate')
+# InvalidResumeToken, ChangeStreamFatalError, ChangeStreamHistoryLost
+RESUME_TOKEN_REJECTED = (260, 280, 286)
+
+OUTFIT_INDEXED_FIELDS = ('category', 'isCelebrity', 'gender')
+BEAUTY_INDEXED_FIELDS = ('category', 'celebrity')
+
+# What list screens render. Listing, trending, search and recommendation
+# endpoints return these "cards"; full documents only come from /id/ routes.
+OUTFIT_CARD_FIELDS = ('id', 'title', 'image', 'image_url', 'category', 'priceRange', 'price_range',
+                      'gender', 'isCelebrity', 'celebrity')
+BEAUTY_CARD_FIELDS = ('id', 'title', 'image', 'image_url', 'category', 'priceRange', 'price_range',
+                      'celebrity', 'difficulty')
+
+
+def card_projection(fields: tuple) -> dict:
+    """MongoDB projection for a card (the snapshot uses `to_card` instead)"""
+    return {('_id' if field == 'id' else field): 1 for field in fields}
+
+
+def to_card(doc: dict, fields: tuple) -> dict:
+    return {field: doc[field] for field in fields if field in doc}
+
+
+def document_fingerprint(doc: dict) -> str:
+    payload = json.dumps(doc, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=12).hexdigest()
+
+
+class CatalogSnapshot:
+    """Process-local copy of one catalog collection, indexed for the read endpoints"""
+
+    def __init__(self, collection, name: str, indexed_fields: tuple = (), poll_interval: float = 30,
+                 card_fields: tuple = ('id',)):
+        self.collection = collection
+        self.name = name
+        self.indexed_fields = indexed_fields
+        self.card_fields = card_fields
+        self.poll_interval = poll_interval
+        # id -> document, and id -> card projection of it (built once per change)
+        self._docs = {}
+        self._cards = {}
+        self._fingerprints = {}
+        # All ids, and field -> value -> ids, as sorted lists. ObjectId hex
+        # strings sort by creation time, so these double as keyset orderings
+        self._ids = []
+        self._by_field = {field: {} for field in indexed_fields}
+        self._listeners = []
+        self._lock = threading.RLock()
+        self.ready = False
+        # Bumped on every applied change; lets callers cache derived data per version
+        self.version = 0
+        self.mode = None
+        self.metrics = {
+            'loads': 0,
+            'last_load_ms': None,
+            'events_applied': 0,
+            'last_event_lag_ms': None,
+            'polls': 0,
+            'last_poll_ms': None,
+            'last_refresh_at': None,
+        }
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def subscribe(self, listener):
+        """Call `listener(doc_id, doc)` for every changed document (doc is None when deleted)"""
+        self._listeners.append(listener)
+
+    # ---------- reads ----------
+
+    def get(self, doc_id: str):
+        return self._docs.get(doc_id)
+
+    def card(self, doc_id: str):
+        return self._cards.get(doc_id)
+
+    def all(self) -> list:
+        with self._lock:
+            return list(self._docs.values())
+
+    def find(self, limit: int = None, after: str = None, predicate=None, cards: bool = False, **filters) -> list:
+        """
+        Documents (or their cards) whose indexed fields equal every filter
+        (and that satisfy `predicate`, if given), in id (creation) order.
+        `after` is a keyset position: only ids greater than it are returned,
+        found by bisection, so every page costs the same.
+        """
+        with self._lock:
+            candidates = []
+            for field, value in filters.items():
+                ids = self._by_field[field].get(self._index_key(value))
+                if not ids:
+                    return []
+                candidates.append((ids, field, value))
+            if candidates:
+                candidates.sort(key=lambda c: len(c[0]))
+                ids, rest = candidates[0][0], candidates[1:]
+            else:
+                ids, rest = self._ids, []
+            docs = []
+            for i in range(bisect.bisect_right(ids, after) if after else 0, len(ids)):
+                doc = self._docs[ids[i]]
+                if all(doc.get(field) == value for _, field, value in rest) and (predicate is None or predicate(doc)):
+                    docs.append(self._cards[ids[i]] if cards else doc)
+                    if limit and len(docs) >= limit:
+                        break
+            return docs
+
+    def values(self, field: str) -> list:
+        """Distinct values of an indexed field"""
+        with self._lock:
+            return [value for value, ids in self._by_field[field].items() if ids]
+
+    # ---------- maintenance ----------
+
+    def _index_key(self, value):
+        # Lists and dicts are not hashable - such values are simply not indexed
+        return value if isinstance(value, (str, int, float, bool, type(None))) else None
+
+    @staticmethod
+    def _sorted_discard(ids: list, doc_id: str):
+        i = bisect.bisect_left(ids, doc_id)
+        if i < len(ids) and ids[i] == doc_id:
+            ids.pop(i)
+
+    def _put_locked(self, doc_id: str, doc: dict, fingerprint: str):
+        old = self._docs.get(doc_id)
+        if old is None:
+            bisect.insort(self._ids, doc_id)
+        for field in self.indexed_fields:
+            key = self._index_key(doc.get(field))
+            if old is not None:
+                old_key = self._index_key(old.get(field))
+                if old_key == key:
+                    continue
+                self._sorted_discard(self._by_field[field].get(old_key, []), doc_id)
+            bisect.insort(self._by_field[field].setdefault(key, []), doc_id)
+        self._docs[doc_id] = doc
+        self._cards[doc_id] = to_card(doc, self.card_fields)
+        self._fingerprints[doc_id] = fingerprint
+
+    def _remove_locked(self, doc_id: str) -> bool:
+        old = self._docs.pop(doc_id, None)
+        if old is None:
+            return False
+        self._cards.pop(doc_id, None)
+        self._fingerprints.pop(doc_id, None)
+        self._sorted_discard(self._ids, doc_id)
+        for field in self.indexed_fields:
+            self._sorted_discard(self._by_field[field].get(self._index_key(old.get(field)), []), doc_id)
+        return True
+
+    def _notify(self, doc_id: str, doc):
+        for listener in self._listeners:
+            try:
+                listener(doc_id, doc)
+            except Exception as e:
+                logger.warning(f"{self.name} snapshot listener failed for {doc_id}: {e}")
+
+    def renotify(self, doc_id: str):
+        """Re-run the listeners for an unchanged document whose joined data (e.g. its products) changed"""
+        doc = self._docs.get(doc_id)
+        if doc is not None:
+            self._notify(doc_id, doc)
+
+    def apply(self, doc_id: str, doc) -> bool:
+        """Upsert (doc) or delete (None) one document; returns True if anything changed"""
+        with self._lock:
+            if doc is None:
+                changed = self._remove_locked(doc_id)
+            else:
+                fingerprint = document_fingerprint(doc)
+                changed = self._fingerprints.get(doc_id) != fingerprint
+                if changed:
+                    self._put_locked(doc_id, doc, fingerprint)
+            if changed:
+                self.version += 1
+        if changed:
+            self._notify(doc_id, doc)
+        return changed
+
+    def replace_all(self, docs: list) -> int:
+        """Diff a full listing (API-form docs) against the snapshot; returns the number of changes"""
+        fresh = {doc['id']: doc for doc in docs}
+        changed, removed = [], []
+        with self._lock:
+            for doc_id in [i for i in self._docs if i not in fresh]:
+                self._remove_locked(doc_id)
+                removed.append(doc_id)
+            for doc_id, doc in fresh.items():
+                fingerprint = document_fingerprint(doc)
+                if self._fingerprints.get(doc_id) != fingerprint:
+                    self._put_locked(doc_id, doc, fingerprint)
+                    changed.append(doc_id)
+            if changed or removed:
+                self.version += 1
+        for doc_id in removed:
+            self._notify(doc_id, None)
+        for doc_id in changed:
+            self._notify(doc_id, fresh[doc_id])
+        return len(changed) + len(removed)
+
+    async def load(self) -> int:
+        """Fetch the whole collection and apply the difference"""
+        start = time.perf_counter()
+        docs = [to_api(doc) for doc in await self.collection.find({}).to_list(length=None)]
+        changes = await asyncio.to_thread(self.replace_all, docs)
+        self.ready = True
+        elapsed = round((time.perf_counter() - start) * 1000, 2)
+        self.metrics.update(loads=self.metrics['loads'] + 1, last_load_ms=elapsed, last_refresh_at=time.time())
+        return changes
+
+    # ---------- freshness ----------
+
+    async def _apply_event(self, event: dict):
+        operation = event.get('operationType')
+        if operation in ('insert', 'update', 'replace'):
+            doc = event.get('fullDocument')
+            if doc is None:
+                # Deleted again before the update lookup ran
+                self.apply(str(event['documentKey']['_id']), None)
+            else:
+                self.apply(str(doc['_id']), to_api(doc))
+        elif operation == 'delete':
+            self.apply(str(event['documentKey']['_id']), None)
+        else:
+            return
+        cluster_time = event.get('clusterTime')
+        if cluster_time is not None:
+            self.metrics['last_event_lag_ms'] = max(0.0, round((time.time() - cluster_time.time) * 1000, 1))
+        self.metrics['events_applied'] += 1
+        self.metrics['last_refresh_at'] = time.time()
+
+    async def _watch(self):
+        resume_token = None
+        while True:
+            try:
+                async with self.collection.watch(full_document='updateLookup',
+                                                 resume_after=resume_token) as stream:
+                    self.mode = 'change_stream'
+                    if resume_token is None:
+                        # Catch up on anything written between the initial load and the stream opening
+                        await self.load()
+                    async for event in stream:
+                        if event.get('operationType') in STREAM_ENDING_OPERATIONS:
+                            # The stream is closed and cannot be resumed past this event:
+                            # open a fresh one, which reloads the snapshot
+                            logger.info(f"{self.name} change stream ended ({event['operationType']}), reopening")
+                            resume_token = None
+                            break
+                        await self._apply_event(event)
+                        resume_token = stream.resume_token
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if getattr(e, 'code', None) in CHANGE_STREAM_UNSUPPORTED:
+                    raise
+                if getattr(e, 'code', None) in RESUME_TOKEN_REJECTED:
+                    # Resume point gone (invalidated, or aged out of the oplog): start over
+                    resume_token = None
+                logger.warning(f"{self.name} change stream interrupted, resuming: {e}")
+                await asyncio.sleep(1)
+
+    async def _poll(self):
+        self.mode = 'polling'
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            start = time.perf_counter()
+            try:
+                changes = await self.load()
+                if changes:
+                    logger.info(f"{self.name} snapshot picked up {changes} changes")
+            except Exception as e:
+                logger.warning(f"{self.name} snapshot poll failed: {e}")
+            self.metrics['polls'] += 1
+            self.metrics['last_poll_ms'] = round((time.perf_counter() - start) * 1000, 2)
+
+    async def run(self):
+        """Keep the snapshot fresh: change stream when available, polling otherwise"""
+        try:
+            await self._watch()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(f"{self.name} snapshot: change streams unavailable ({e}), polling every "
+                        f"{self.poll_interval:.0f}s")
+            await self._poll()
+
+    def stats(self) -> dict:
+        with self._lock:
+            approx_bytes = sum(len(json.dumps(doc, default=str)) for doc in self._docs.values())
+            card_bytes = sum(len(json.dumps(card, default=str)) for card in self._cards.values())
+            return {
+                'documents': len(self._docs),
+                'approx_bytes': approx_bytes,
+                'card_bytes': card_bytes,
+                'version': self.version,
+                'ready': self.ready,
+                'mode': self.mode,
+                'indexed_fields': {field: len([v for v, ids in values.items() if ids])
+                                   for field, values in self._by_field.items()},
+                **self.metrics,
+            }
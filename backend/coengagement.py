@@ -0,0 +1,165 @@
+"""
+"People who viewed this also viewed" from session co-engagement
+
+Analytics events carry a `session_id`. Two items engaged with in the same
+session (within `session_gap` seconds of each other) co-occur; each pair adds
+the smaller of the two events' weights, so a favorite next to a favorite
+counts more than two passing views. The co-occurrence matrix is sparse and
+kept as one candidate dict per item.
+
+Events are folded in one at a time as they are tracked (and streamed from the
+analytics collection at startup, ordered by session and time), so the matrix
+is always current. Memory is bounded on every axis: open sessions are
+LRU-capped, a session remembers its last `session_items` items, and an
+item's candidate dict is pruned back to its strongest half whenever it grows
+past `max_candidates`.
+
+Ranked lists (co-count normalized by both items' popularity, i.e. cosine)
+are republished in the background for items whose counts changed, so serving
+one is a dict lookup.
+"""
+
+import heapq
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_K = 10
+SESSION_GAP = 30 * 60
+SESSION_ITEMS = 20
+MAX_SESSIONS = 50_000
+MAX_CANDIDATES = 200
+# Pairs seen less than this (in summed weight) are noise, not a recommendation
+MIN_SUPPORT = 2.0
+
+
+class CoEngagement:
+    """Sparse item-item co-occurrence over sessions, with top-k lists per item"""
+
+    def __init__(self, weights: dict, k: int = DEFAULT_K, session_gap: float = SESSION_GAP,
+                 session_items: int = SESSION_ITEMS, max_sessions: int = MAX_SESSIONS,
+                 max_candidates: int = MAX_CANDIDATES, min_support: float = MIN_SUPPORT):
+        self.weights = weights
+        self.k = k
+        self.session_gap = session_gap
+        self.session_items = session_items
+        self.max_sessions = max_sessions
+        self.max_candidates = max_candidates
+        self.min_support = min_support
+        # session id -> [last event time, {item: strongest weight}] in LRU order
+        self._sessions = OrderedDict()
+        # item -> {other item: co-occurrence weight}, and item -> total engagement weight
+        self._pairs = {}
+        self._popularity = {}
+        self._dirty = set()
+        # item -> ((other item, score), ...), best first
+        self._published = {}
+        self._lock = threading.Lock()
+        self.version = 0
+        self.metrics = {'events': 0, 'sessions_evicted': 0, 'prunes': 0, 'last_publish_ms': None}
+
+    def record(self, session_id: str, item_id: str, event_type: str, timestamp: float = None):
+        weight = self.weights.get(event_type)
+        if not weight or not session_id or not item_id:
+            return
+        now = timestamp if timestamp is not None else time.time()
+        with self._lock:
+            self.metrics['events'] += 1
+            self._popularity[item_id] = self._popularity.get(item_id, 0.0) + weight
+            session = self._sessions.get(session_id)
+            if session is None or now - session[0] > self.session_gap:
+                session = self._sessions[session_id] = [now, {}]
+                if len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.metrics['sessions_evicted'] += 1
+            self._sessions.move_to_end(session_id)
+            session[0] = now
+            items = session[1]
+            previous = items.get(item_id, 0.0)
+            if weight <= previous:
+                return
+            # New item, or a stronger event on one already seen (view -> favorite): add the difference
+            for other, other_weight in items.items():
+                if other != item_id:
+                    delta = min(weight, other_weight) - min(previous, other_weight)
+                    if delta > 0:
+                        self._add_locked(item_id, other, delta)
+                        self._add_locked(other, item_id, delta)
+            items.pop(item_id, None)
+            items[item_id] = weight
+            if len(items) > self.session_items:
+                del items[next(iter(items))]
+
+    def _add_locked(self, item_id: str, other: str, weight: float):
+        candidates = self._pairs.get(item_id)
+        if candidates is None:
+            candidates = self._pairs[item_id] = {}
+        candidates[other] = candidates.get(other, 0.0) + weight
+        self._dirty.add(item_id)
+        if len(candidates) > self.max_candidates:
+            keep = heapq.nlargest(self.max_candidates // 2, candidates.items(), key=lambda item: item[1])
+            self._pairs[item_id] = dict(keep)
+            self.metrics['prunes'] += 1
+
+    def publish(self, everything: bool = False) -> int:
+        """Re-rank the lists of items whose co-occurrences changed; returns how many"""
+        start = time.perf_counter()
+        with self._lock:
+            dirty = set(self._pairs) if everything else self._dirty
+            self._dirty = set()
+            ranked = {}
+            for item_id in dirty:
+                popularity = self._popularity.get(item_id, 0.0)
+                scored = [(count / math.sqrt(popularity * self._popularity[other]), other)
+                          for other, count in self._pairs.get(item_id, {}).items()
+                          if count >= self.min_support and self._popularity.get(other)]
+                ranked[item_id] = tuple((other, round(score, 4)) for score, other in heapq.nlargest(self.k, scored))
+        self._published.update(ranked)
+        if ranked:
+            self.version += 1
+        self.metrics['last_publish_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        return len(ranked)
+
+    async def load(self, analytics, window_days: int = 30, keep=None):
+        """
+        Stream the last `window_days` of session events from the analytics
+        collection, in session and time order (served by the session_id
+        index), then publish every list. `keep(item_id)` filters items.
+        """
+        since = time.time() - window_days * 86400
+        cursor = analytics.find(
+            {"session_id": {"$type": "string"}, "timestamp": {"$gte": since},
+             "event_type": {"$in": list(self.weights)}},
+            {"_id": 0, "session_id": 1, "item_id": 1, "event_type": 1, "timestamp": 1},
+        ).sort([("session_id", 1), ("timestamp", 1)]).batch_size(1000)
+        loaded = 0
+        try:
+            async for event in cursor:
+                if keep is not None and not keep(event.get('item_id')):
+                    continue
+                self.record(event['session_id'], event.get('item_id'), event['event_type'], event['timestamp'])
+                loaded += 1
+        except Exception as e:
+            logger.warning(f"Could not load co-engagement from analytics: {e}")
+        self.publish(everything=True)
+        logger.info(f"Co-engagement loaded: {loaded} events, {len(self._published)} items with lists")
+
+    def also_viewed(self, item_id: str, limit: int = None) -> tuple:
+        """((other item, score), ...) best first"""
+        neighbors = self._published.get(item_id, ())
+        return neighbors[:limit] if limit is not None else neighbors
+
+    def stats(self) -> dict:
+        return {
+            'items': len(self._popularity),
+            'items_with_lists': sum(1 for neighbors in self._published.values() if neighbors),
+            'pair_entries': sum(len(candidates) for candidates in self._pairs.values()),
+            'open_sessions': len(self._sessions),
+            'pending': len(self._dirty),
+            'version': self.version,
+            **self.metrics,
+        }
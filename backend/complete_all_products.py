@@ -7,6 +7,8 @@ Makes the app feel complete with no empty product sections
 from pymongo import MongoClient
 import os
 from dotenv import load_dotenv
+from pricing import price_fields
+from products import product_refs
 import random
 
 load_dotenv()
@@ -213,7 +215,8 @@ def complete_all_products():
         
         outfits_collection.update_one(
             {'_id': outfit['_id']},
-            {'$set': {'products': selected_products}}
+            {'$set': {'products': product_refs(db, selected_products),
+                      **price_fields({**outfit, 'products': selected_products})}}
         )
         
         outfit_count += 1
@@ -240,7 +243,8 @@ def complete_all_products():
         
         beauty_collection.update_one(
             {'_id': look['_id']},
-            {'$set': {'products': selected_products}}
+            {'$set': {'products': product_refs(db, selected_products),
+                      **price_fields({**look, 'products': selected_products})}}
         )
         
         beauty_count += 1
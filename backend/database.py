@@ -0,0 +1,75 @@
+"""
+MongoDB data-access layer
+
+All request-path database access goes through the async Motor driver so a
+slow query never blocks the event loop. The client is created once and its
+lifecycle (connectivity check, close) is owned by the app lifespan.
+
+Connection settings come from the environment:
+    MONGO_URL, DB_NAME
+    MONGO_MAX_POOL_SIZE       (default 50)
+    MONGO_MIN_POOL_SIZE       (default 0)
+    MONGO_TIMEOUT_MS          server selection / connect timeout (default 5000)
+    MONGO_SOCKET_TIMEOUT_MS   per-operation socket timeout (default 20000)
+    MONGO_READ_PREFERENCE     primary | primaryPreferred | secondary |
+                              secondaryPreferred | nearest (default primaryPreferred)
+"""
+
+import logging
+import os
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+logger = logging.getLogger(__name__)
+
+READ_PREFERENCES = ('primary', 'primaryPreferred', 'secondary', 'secondaryPreferred', 'nearest')
+
+
+def mongo_client_options() -> dict:
+    """Motor/PyMongo client keyword arguments built from the environment"""
+    read_preference = os.environ.get('MONGO_READ_PREFERENCE', 'primaryPreferred')
+    if read_preference not in READ_PREFERENCES:
+        logger.warning(f"Unknown MONGO_READ_PREFERENCE '{read_preference}', using primaryPreferred")
+        read_preference = 'primaryPreferred'
+    timeout_ms = int(os.environ.get('MONGO_TIMEOUT_MS', 5000))
+    return {
+        'maxPoolSize': int(os.environ.get('MONGO_MAX_POOL_SIZE', 50)),
+        'minPoolSize': int(os.environ.get('MONGO_MIN_POOL_SIZE', 0)),
+        'serverSelectionTimeoutMS': timeout_ms,
+        'connectTimeoutMS': timeout_ms,
+        'socketTimeoutMS': int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', 20000)),
+        'readPreference': read_preference,
+    }
+
+
+class Database:
+    """Motor client plus the database the API reads and writes"""
+
+    def __init__(self, url: str = None, name: str = None):
+        self.url = url or os.environ.get('MONGO_URL', 'mongodb://localhost:27017/')
+        self.name = name or os.environ.get('DB_NAME', 'app_database')
+        self.options = mongo_client_options()
+        # Motor connects lazily on the first operation, so this does no I/O
+        self.client = AsyncIOMotorClient(self.url, **self.options)
+        self.db = self.client[self.name]
+
+    def __getitem__(self, collection_name: str):
+        return self.db[collection_name]
+
+    async def ping(self) -> bool:
+        try:
+            await self.client.admin.command('ping')
+            return True
+        except Exception as e:
+            logger.error(f"MongoDB ping failed: {e}")
+            return False
+
+    def close(self):
+        self.client.close()
+
+
+def to_api(doc: dict) -> dict:
+    """Replace Mongo's ObjectId `_id` with a string `id` for JSON responses"""
+    if doc is not None and '_id' in doc:
+        doc['id'] = str(doc.pop('_id'))
+    return doc
@@ -2,6 +2,8 @@
 from pymongo import MongoClient
 import os
 from dotenv import load_dotenv
+from pricing import with_price_fields
+from products import with_product_refs
 
 load_dotenv()
 MONGO_URL = os.getenv('MONGO_URL', 'mongodb://localhost:27017/')
@@ -64,7 +66,7 @@ celebrity_outfits = [
     }
 ]
 
-result = db['outfits'].insert_many(celebrity_outfits)
+result = db['outfits'].insert_many(with_product_refs(db, [with_price_fields(doc) for doc in celebrity_outfits]))
 print(f'✓ Added {len(celebrity_outfits)} celebrity outfits')
 
 print('\n📊 Updated counts:')
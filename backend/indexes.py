@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Declarative index registry
+
+Every index the API relies on is declared here next to the query pattern it
+serves. The app ensures them at startup (ENSURE_INDEXES=false to skip) and
+the CLI can create, audit or explain them:
+
+    python indexes.py ensure     # create missing indexes
+    python indexes.py report     # missing / unused / undeclared indexes ($indexStats)
+    python indexes.py explain    # winning plan for each declared query pattern
+"""
+
+import asyncio
+import json
+import logging
+import sys
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+logger = logging.getLogger(__name__)
+
+# collection -> [(index name, keys, options)]
+INDEXES = {
+    # Listings page on _id within a filter (keyset pagination), hence the _id suffixes
+    'outfits': [
+        ('category_1__id_1', [('category', ASCENDING), ('_id', ASCENDING)], {}),
+        ('isCelebrity_1__id_1', [('isCelebrity', ASCENDING), ('_id', ASCENDING)], {}),
+        ('gender_1', [('gender', ASCENDING)], {}),
+        # Price-filtered / price-sorted search (see pricing.py): range scan on the
+        # minimum, keyset tiebreak on _id
+        ('priceMinCents_1__id_1', [('priceMinCents', ASCENDING), ('_id', ASCENDING)], {}),
+        ('category_1_priceMinCents_1__id_1',
+         [('category', ASCENDING), ('priceMinCents', ASCENDING), ('_id', ASCENDING)], {}),
+        # /recommendations/weather fallback on the stored weather tags (multikey)
+        ('weatherTemps_1__id_1', [('weatherTemps', ASCENDING), ('_id', ASCENDING)], {}),
+    ],
+    'beauty_looks': [
+        ('category_1__id_1', [('category', ASCENDING), ('_id', ASCENDING)], {}),
+        ('celebrity_1', [('celebrity', ASCENDING)], {}),
+    ],
+    'analytics': [
+        ('event_type_1_timestamp_-1', [('event_type', ASCENDING), ('timestamp', DESCENDING)], {}),
+        ('timestamp_-1', [('timestamp', DESCENDING)], {}),
+        # Co-engagement load streams session events in session / time order (see coengagement.py)
+        ('session_id_1_timestamp_1', [('session_id', ASCENDING), ('timestamp', ASCENDING)],
+         {'partialFilterExpression': {'session_id': {'$type': 'string'}}}),
+    ],
+    'provider_usage': [
+        ('provider_1_endpoint_1_window_1_period_1',
+         [('provider', ASCENDING), ('endpoint', ASCENDING), ('window', ASCENDING), ('period', ASCENDING)],
+         {'unique': True}),
+        ('window_1_period_1', [('window', ASCENDING), ('period', ASCENDING)], {}),
+    ],
+}
+
+# Representative filters for each endpoint, used by `explain`
+QUERY_PATTERNS = {
+    'outfits': [
+        ('/outfits/{category}', {"category": "streetwear"}),
+        ('/outfits/celebrity', {"isCelebrity": True}),
+        ('/search/outfits?gender=', {"gender": {"$regex": "women", "$options": "i"}}),
+        ('/search/outfits?min_price=&max_price=', {"priceMinCents": {"$lte": 30000}, "priceMaxCents": {"$gte": 10000}}),
+        ('/search/outfits?category=&max_price=', {"category": "streetwear", "priceMinCents": {"$lte": 30000}}),
+        ('/recommendations/weather', {"weatherTemps": "mild"}),
+    ],
+    'beauty_looks': [
+        ('/beauty/{category}', {"category": "natural"}),
+        ('/search/beauty?celebrity=', {"celebrity": {"$regex": "zendaya", "$options": "i"}}),
+    ],
+    'analytics': [
+        ('/analytics/dashboard', {"event_type": "outfit_view", "timestamp": {"$gte": 0}}),
+        ('/analytics/dashboard (totals)', {"timestamp": {"$gte": 0}}),
+        ('co-engagement load', {"session_id": {"$type": "string"}, "timestamp": {"$gte": 0}}),
+    ],
+}
+
+
+def index_models(collection_name: str) -> list:
+    return [IndexModel(keys, name=name, **options) for name, keys, options in INDEXES.get(collection_name, [])]
+
+
+async def ensure_indexes(db) -> dict:
+    """Create every declared index that does not exist yet; returns names per collection"""
+    created = {}
+    for collection_name in INDEXES:
+        try:
+            created[collection_name] = await db[collection_name].create_indexes(index_models(collection_name))
+        except Exception as e:
+            logger.error(f"Index creation failed for {collection_name}: {e}")
+            created[collection_name] = {'error': str(e)}
+    logger.info(f"Indexes ensured: {', '.join(INDEXES)}")
+    return created
+
+
+async def index_report(db) -> dict:
+    """
+    Compare declared indexes with what exists. `unused` lists indexes with zero
+    accesses since the server last started, according to $indexStats.
+    """
+    report = {}
+    for collection_name, declared in INDEXES.items():
+        collection = db[collection_name]
+        declared_names = {name for name, _, _ in declared}
+        try:
+            existing = await collection.index_information()
+            stats = await collection.aggregate([{"$indexStats": {}}]).to_list(length=None)
+        except Exception as e:
+            report[collection_name] = {'error': str(e)}
+            continue
+        accesses = {s['name']: s.get('accesses', {}).get('ops', 0) for s in stats}
+        report[collection_name] = {
+            'missing': sorted(declared_names - set(existing)),
+            'undeclared': sorted(set(existing) - declared_names - {'_id_'}),
+            'unused': sorted(name for name, ops in accesses.items() if ops == 0 and name != '_id_'),
+            'accesses': accesses,
+        }
+    return report
+
+
+def _winning_stages(plan: dict) -> list:
+    """Flatten a winning plan into its stage names, e.g. ['FETCH', 'IXSCAN']"""
+    stages = []
+    while plan:
+        stages.append(plan.get('stage'))
+        plan = plan.get('inputStage') or (plan.get('inputStages') or [None])[0]
+    return stages
+
+
+async def explain_patterns(db) -> dict:
+    """Winning plan stages and index used for every declared query pattern"""
+    results = {}
+    for collection_name, patterns in QUERY_PATTERNS.items():
+        for endpoint, query in patterns:
+            try:
+                explanation = await db[collection_name].find(query).explain()
+                winning = explanation.get('queryPlanner', {}).get('winningPlan', {})
+                stages = _winning_stages(winning)
+                index_name = None
+                node = winning
+                while node:
+                    index_name = node.get('indexName') or index_name
+                    node = node.get('inputStage')
+                results[endpoint] = {
+                    'collection': collection_name,
+                    'stages': stages,
+                    'index': index_name,
+                    'collection_scan': 'COLLSCAN' in stages,
+                }
+            except Exception as e:
+                results[endpoint] = {'collection': collection_name, 'error': str(e)}
+    return results
+
+
+async def _main(command: str):
+    from database import Database
+
+    mongo = Database()
+    try:
+        if command == 'ensure':
+            result = await ensure_indexes(mongo.db)
+        elif command == 'report':
+            result = await index_report(mongo.db)
+        elif command == 'explain':
+            result = await explain_patterns(mongo.db)
+        else:
+            print(__doc__)
+            return 1
+        print(json.dumps(result, indent=2, default=str))
+        return 0
+    finally:
+        mongo.close()
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    sys.exit(asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else '')))
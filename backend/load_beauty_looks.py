@@ -6,6 +6,8 @@ Load beauty look data into MongoDB
 import os
 from pymongo import MongoClient
 from dotenv import load_dotenv
+from pricing import with_price_fields
+from products import with_product_refs
 
 load_dotenv()
 
@@ -168,7 +170,7 @@ def load_beauty_looks():
         
         # Insert new beauty looks
         print(f"Inserting {len(beauty_looks_data)} beauty looks...")
-        result = beauty_collection.insert_many(beauty_looks_data)
+        result = beauty_collection.insert_many(with_product_refs(db, [with_price_fields(doc) for doc in beauty_looks_data]))
         
         print(f"✅ Successfully loaded {len(result.inserted_ids)} beauty looks!")
         
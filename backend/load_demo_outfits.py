@@ -4,6 +4,8 @@
 import os
 from pymongo import MongoClient
 from dotenv import load_dotenv
+from pricing import with_price_fields
+from products import with_product_refs
 
 load_dotenv()
 
@@ -197,7 +199,7 @@ demo_outfits = [
 ]
 
 # Insert outfits
-result = outfits_collection.insert_many(demo_outfits)
+result = outfits_collection.insert_many(with_product_refs(db, [with_price_fields(doc) for doc in demo_outfits]))
 print(f"✅ Inserted {len(result.inserted_ids)} demo outfits")
 
 # Show counts by category
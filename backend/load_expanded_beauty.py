@@ -7,6 +7,8 @@ Adds 15+ new beauty looks across all categories
 from pymongo import MongoClient
 import os
 from dotenv import load_dotenv
+from pricing import with_price_fields
+from products import with_product_refs
 
 load_dotenv()
 
@@ -385,7 +387,7 @@ def load_expanded_beauty_looks():
     
     # Insert new beauty looks
     print(f"\n📥 Inserting {len(EXPANDED_BEAUTY_LOOKS)} new beauty looks...")
-    result = collection.insert_many(EXPANDED_BEAUTY_LOOKS)
+    result = collection.insert_many(with_product_refs(db, [with_price_fields(doc) for doc in EXPANDED_BEAUTY_LOOKS]))
     print(f"✅ Inserted {len(result.inserted_ids)} beauty looks")
     
     # Count by category
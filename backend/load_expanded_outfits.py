@@ -7,6 +7,8 @@ Adds 20+ new outfits across all categories
 from pymongo import MongoClient
 import os
 from dotenv import load_dotenv
+from pricing import with_price_fields
+from products import with_product_refs
 
 load_dotenv()
 
@@ -382,7 +384,7 @@ def load_expanded_outfits():
     
     # Insert new outfits
     print(f"\n📥 Inserting {len(EXPANDED_OUTFITS)} new outfits...")
-    result = collection.insert_many(EXPANDED_OUTFITS)
+    result = collection.insert_many(with_product_refs(db, [with_price_fields(doc) for doc in EXPANDED_OUTFITS]))
     print(f"✅ Inserted {len(result.inserted_ids)} outfits")
     
     # Count by category
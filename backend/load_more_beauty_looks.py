@@ -6,6 +6,8 @@ Load additional beauty looks into MongoDB
 import os
 from pymongo import MongoClient
 from dotenv import load_dotenv
+from pricing import with_price_fields
+from products import with_product_refs
 
 load_dotenv()
 
@@ -184,7 +186,7 @@ def load_additional_looks():
     try:
         # Insert new beauty looks (don't clear existing ones)
         print(f"Adding {len(additional_looks_data)} new beauty looks...")
-        result = beauty_collection.insert_many(additional_looks_data)
+        result = beauty_collection.insert_many(with_product_refs(db, [with_price_fields(doc) for doc in additional_looks_data]))
         
         print(f"✅ Successfully added {len(result.inserted_ids)} new beauty looks!")
         
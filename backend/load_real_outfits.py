@@ -6,6 +6,8 @@ Load real outfit data into MongoDB
 import os
 from pymongo import MongoClient
 from dotenv import load_dotenv
+from pricing import with_price_fields
+from products import with_product_refs
 
 load_dotenv()
 
@@ -208,7 +210,7 @@ def load_outfits():
         
         # Insert new outfits
         print(f"Inserting {len(outfits_data)} real outfits...")
-        result = outfits_collection.insert_many(outfits_data)
+        result = outfits_collection.insert_many(with_product_refs(db, [with_price_fields(doc) for doc in outfits_data]))
         
         print(f"✅ Successfully loaded {len(result.inserted_ids)} outfits!")
         
@@ -0,0 +1,49 @@
+"""
+Keyset pagination helpers
+
+Listings page on the document id (ObjectIds sort by creation time) and ranked
+search results on (score, id), so fetching page 50 costs the same as page 1.
+The position is handed to clients as an opaque, URL-safe continuation token.
+"""
+
+import base64
+import binascii
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def page_size(limit: int = None, default: int = DEFAULT_PAGE_SIZE, maximum: int = MAX_PAGE_SIZE) -> int:
+    if not limit or limit < 1:
+        return default
+    return min(limit, maximum)
+
+
+def listing_size(limit: int = None, cursor: str = None, maximum: int = MAX_PAGE_SIZE):
+    """
+    Page size for the category listings, or None for the whole listing: clients
+    that pass neither `limit` nor `cursor` predate paging and expect every item
+    """
+    if limit is None and not cursor:
+        return None
+    return page_size(limit, maximum=maximum)
+
+
+def encode_cursor(position: dict) -> str:
+    raw = json.dumps(position, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: str, required=('i',)) -> dict:
+    """Position encoded in `token`; ValueError if it is malformed or lacks a required key"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        position = json.loads(raw)
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(position, dict) or any(key not in position for key in required):
+        raise ValueError("Invalid cursor")
+    return position
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Locally cached TMDB people index
+
+Classifies Vision entities as people or titles in-process so actor and
+director names are no longer searched as movie titles. Verdicts (both "is a
+person" and "is not a person") are written to MongoDB in the background and
+reloaded at startup; unknown name-like entities are resolved once through
+TMDB `/search/person`. Two capitalized words are as often a title ("Pulp
+Fiction") as a name, so that call is only made when the first word is a given
+name of a person already in the index and the text is not a title TMDB has
+already returned.
+
+The index can be seeded in bulk from TMDB's daily people export
+(person_ids_MM_DD_YYYY.json.gz, one JSON object per line):
+
+    python people_index.py import person_ids_10_19_2026.json.gz --min-popularity 5
+"""
+
+import gzip
+import json
+import logging
+import re
+import sys
+import time
+from collections import OrderedDict
+
+from query_normalize import fold
+
+logger = logging.getLogger(__name__)
+
+# "Leonardo DiCaprio", "Samuel L. Jackson", "Lupita Nyong'o"
+_NAME_TOKEN = re.compile(r"^[A-Z][\w.'’-]*$", re.UNICODE)
+
+
+def looks_like_person_name(text: str) -> bool:
+    """Cheap pre-filter: 2-4 capitalized alphabetic tokens, no digits"""
+    tokens = (text or '').split()
+    if not 2 <= len(tokens) <= 4 or any(ch.isdigit() for ch in text):
+        return False
+    return all(_NAME_TOKEN.match(token) for token in tokens)
+
+
+# Below this many known given names (an unseeded index) the name shape alone gates the TMDB call
+MIN_GIVEN_NAMES = 200
+MAX_KNOWN_TITLES = 20_000
+
+
+class PeopleIndex:
+    """normalized name -> TMDB person, plus remembered non-person names"""
+
+    def __init__(self, collection=None, search_person=None):
+        self.collection = collection
+        # Callable(name) -> list of TMDB /search/person results, or None when unavailable
+        self.search_person = search_person
+        self._people = {}
+        self._non_people = set()
+        # First words of known people's names, and folded titles of movies seen in TMDB results
+        self._given_names = set()
+        self._titles = OrderedDict()
+        # Verdicts not yet written to Mongo: key -> person or None
+        self._pending = {}
+        self.lookups = 0
+        self.skipped = 0
+
+    def __len__(self) -> int:
+        return len(self._people)
+
+    async def load(self):
+        if self.collection is None:
+            return
+        try:
+            cursor = self.collection.find({}, {"_id": 1, "is_person": 1, "person": 1})
+            async for doc in cursor:
+                if doc.get('is_person'):
+                    self._people[doc['_id']] = doc['person']
+                    self._given_names.add(doc['_id'].split()[0])
+                else:
+                    self._non_people.add(doc['_id'])
+            logger.info(f"People index loaded: {len(self._people)} people, {len(self._non_people)} non-people")
+        except Exception as e:
+            logger.warning(f"Could not load people index: {e}")
+
+    def _store(self, key: str, person: dict = None):
+        if person:
+            self._people[key] = person
+            self._given_names.add(key.split()[0])
+        else:
+            self._non_people.add(key)
+        self._pending[key] = person
+
+    async def flush(self):
+        """Write verdicts learned since the last flush"""
+        if self.collection is None or not self._pending:
+            return
+        from pymongo import ReplaceOne
+        pending, self._pending = self._pending, {}
+        ops = [
+            ReplaceOne({"_id": key},
+                       {"_id": key, "is_person": bool(person), "person": person, "updated_at": time.time()},
+                       upsert=True)
+            for key, person in pending.items()
+        ]
+        try:
+            await self.collection.bulk_write(ops, ordered=False)
+        except Exception as e:
+            logger.warning(f"Could not persist people index: {e}")
+            pending.update(self._pending)
+            self._pending = pending
+
+    def add_person(self, person: dict):
+        """Record a TMDB person result ({'id', 'name', ...})"""
+        slim = {
+            'id': person['id'],
+            'name': person.get('name'),
+            'known_for_department': person.get('known_for_department'),
+            'popularity': person.get('popularity', 0),
+        }
+        self._store(fold(slim['name']), slim)
+        return slim
+
+    def add_title(self, title: str):
+        """Remember a movie title from TMDB results, so it is never looked up as a person"""
+        key = fold(title)
+        if key:
+            self._titles[key] = True
+            self._titles.move_to_end(key)
+            while len(self._titles) > MAX_KNOWN_TITLES:
+                self._titles.popitem(last=False)
+
+    def _worth_asking(self, key: str) -> bool:
+        """Whether a name-shaped entity carries enough signal to spend a /search/person call"""
+        if key in self._titles:
+            return False
+        return len(self._given_names) < MIN_GIVEN_NAMES or key.split()[0] in self._given_names
+
+    def lookup(self, name: str):
+        """
+        The TMDB person `name` refers to, or None if it is (probably) a title.
+        Only name-like strings that were never seen before, start with a known
+        given name and are not a known title cost a TMDB call.
+        """
+        key = fold(name)
+        if not key:
+            return None
+        if key in self._people:
+            return self._people[key]
+        if key in self._non_people or not looks_like_person_name(name) or self.search_person is None:
+            return None
+        if not self._worth_asking(key):
+            self.skipped += 1
+            return None
+
+        results = self.search_person(name)
+        if results is None:
+            # Lookup unavailable (budget/network) - don't cache a verdict
+            return None
+        self.lookups += 1
+        exact = next((r for r in results if fold(r.get('name', '')) == key), None)
+        if exact:
+            return self.add_person(exact)
+        self._store(key, None)
+        return None
+
+    def stats(self) -> dict:
+        return {'people': len(self._people), 'non_people': len(self._non_people), 'lookups': self.lookups,
+                'skipped': self.skipped, 'given_names': len(self._given_names), 'known_titles': len(self._titles)}
+
+
+def import_people_export(collection, path: str, min_popularity: float = 5.0) -> int:
+    """Bulk-load a TMDB daily people export into the index collection"""
+    from pymongo import ReplaceOne
+
+    opener = gzip.open if path.endswith('.gz') else open
+    ops, imported = [], 0
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            try:
+                person = json.loads(line)
+            except ValueError:
+                continue
+            if person.get('adult') or person.get('popularity', 0) < min_popularity:
+                continue
+            key = fold(person.get('name', ''))
+            if not key:
+                continue
+            slim = {'id': person['id'], 'name': person['name'],
+                    'known_for_department': None, 'popularity': person.get('popularity', 0)}
+            ops.append(ReplaceOne({"_id": key},
+                                  {"_id": key, "is_person": True, "person": slim, "updated_at": time.time()},
+                                  upsert=True))
+            if len(ops) >= 1000:
+                collection.bulk_write(ops, ordered=False)
+                imported += len(ops)
+                ops = []
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+        imported += len(ops)
+    return imported
+
+
+if __name__ == '__main__':
+    import os
+    from pymongo import MongoClient
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    if len(sys.argv) < 3 or sys.argv[1] != 'import':
+        print("Usage: python people_index.py import <person_ids.json.gz> [--min-popularity N]")
+        sys.exit(1)
+    min_pop = 5.0
+    if '--min-popularity' in sys.argv:
+        min_pop = float(sys.argv[sys.argv.index('--min-popularity') + 1])
+    client = MongoClient(os.getenv('MONGO_URL', 'mongodb://localhost:27017/'))
+    db = client[os.getenv('DB_NAME', 'app_database')]
+    count = import_people_export(db['tmdb_people'], sys.argv[2], min_pop)
+    print(f"✅ Imported {count} people")
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Numeric prices for outfits and beauty looks
+
+Catalog prices are free-form strings ("$150 - $250", "$1,200-$2,000", "$39",
+"$$$$") in `priceRange`, `items[].price` and `products[].price`, which MongoDB
+cannot range-filter or sort. Every document therefore also carries
+`priceMinCents` / `priceMaxCents`: integer cents parsed from `priceRange`,
+or, without one, from the sum of its item prices or the spread of its product
+prices.
+
+The loaders set these fields as they write (`with_price_fields`), and
+`python pricing.py` backfills (or re-derives) them in bulk for documents that
+were written or edited without them.
+"""
+
+import os
+import re
+import sys
+
+from products import hydrate, load_products
+
+PRICE_FIELDS = ('priceMinCents', 'priceMaxCents')
+
+# "$" ... "$$$$" tiers, in cents
+PRICE_TIERS = {
+    1: (0, 10000),
+    2: (10000, 30000),
+    3: (30000, 100000),
+    4: (100000, 500000),
+}
+
+AMOUNT_PATTERN = re.compile(r'(\d[\d,]*(?:\.\d+)?)\s*(k\b)?', re.IGNORECASE)
+# An amount after a currency sign, optionally followed by the upper end of a range ("$50-100", "$1k to $2k")
+CURRENCY_PATTERN = re.compile(r'[$£€]\s*(\d[\d,]*(?:\.\d+)?)\s*(k\b)?'
+                              r'(?:\s*(?:-|–|to)\s*[$£€]?\s*(\d[\d,]*(?:\.\d+)?)\s*(k\b)?)?', re.IGNORECASE)
+TIER_PATTERN = re.compile(r'^\s*(\$+)\s*$')
+UPPER_BOUND_WORDS = ('under', 'below', 'less than', 'up to')
+
+
+def to_cents(amount: str, thousands: bool = False) -> int:
+    value = float(amount.replace(',', ''))
+    return int(round(value * (1000 if thousands else 1) * 100))
+
+
+def parse_price(text) -> tuple:
+    """
+    (min_cents, max_cents) for a price string, or None if it holds no price.
+    A single amount is its own range, "under $50" is (0, 5000) and "$$"
+    style tiers map through PRICE_TIERS. When the text has currency amounts,
+    other numbers are quantities, not prices ("2 for $30" is (3000, 3000)).
+    """
+    if isinstance(text, (int, float)) and not isinstance(text, bool):
+        cents = int(round(text * 100))
+        return cents, cents
+    if not isinstance(text, str) or not text.strip():
+        return None
+    tier = TIER_PATTERN.match(text)
+    if tier:
+        return PRICE_TIERS.get(min(len(tier.group(1)), max(PRICE_TIERS)))
+    if text.strip().lower() == 'free':
+        return 0, 0
+    amounts = [to_cents(amount, bool(k)) for low, low_k, high, high_k in CURRENCY_PATTERN.findall(text)
+               for amount, k in ((low, low_k), (high, high_k)) if amount]
+    if not amounts:
+        amounts = [to_cents(amount, bool(k)) for amount, k in AMOUNT_PATTERN.findall(text)]
+    if not amounts:
+        return None
+    if len(amounts) == 1 and any(word in text.lower() for word in UPPER_BOUND_WORDS):
+        return 0, amounts[0]
+    return min(amounts), max(amounts)
+
+
+def price_bounds(doc: dict) -> tuple:
+    """(min_cents, max_cents) of a catalog document, or (None, None) if nothing parses"""
+    bounds = parse_price(doc.get('priceRange') or doc.get('price_range'))
+    if bounds:
+        return bounds
+    # The look bought as listed: every item, at its low and high price
+    items = [parse_price(item.get('price')) for item in doc.get('items') or [] if isinstance(item, dict)]
+    items = [b for b in items if b]
+    if items:
+        return sum(low for low, _ in items), sum(high for _, high in items)
+    products = [parse_price(p.get('price')) for p in doc.get('products') or [] if isinstance(p, dict)]
+    products = [b for b in products if b]
+    if products:
+        return min(low for low, _ in products), max(high for _, high in products)
+    return None, None
+
+
+def price_fields(doc: dict) -> dict:
+    low, high = price_bounds(doc)
+    return {'priceMinCents': low, 'priceMaxCents': high}
+
+
+def with_price_fields(doc: dict) -> dict:
+    """`doc` plus its derived price fields (loaders call this on everything they insert)"""
+    return {**doc, **price_fields(doc)}
+
+
+def dollars_to_cents(value: float) -> int:
+    return int(round(value * 100))
+
+
+def price_window(min_price: float = None, max_price: float = None) -> dict:
+    """
+    field -> (low, high) cent bounds (None = open) that a document's price
+    fields must satisfy for its range to overlap [min_price, max_price] dollars
+    """
+    window = {}
+    if min_price is not None:
+        window['priceMaxCents'] = (dollars_to_cents(min_price), None)
+    if max_price is not None:
+        window['priceMinCents'] = (None, dollars_to_cents(max_price))
+    return window
+
+
+def price_range_query(min_price: float = None, max_price: float = None) -> dict:
+    """MongoDB form of `price_window`, served by the priceMinCents compound indexes"""
+    return {field: {op: bound for op, bound in (('$gte', low), ('$lte', high)) if bound is not None}
+            for field, (low, high) in price_window(min_price, max_price).items()}
+
+
+# Price facet bands in dollars (None = open). Membership uses the same overlap
+# rule as `price_window`, so a band's count is what filtering by it returns.
+PRICE_BANDS = (
+    ('under-100', None, 100),
+    ('100-250', 100, 250),
+    ('250-500', 250, 500),
+    ('500-1000', 500, 1000),
+    ('1000-plus', 1000, None),
+)
+
+
+def price_bands(low_cents: int, high_cents: int) -> list:
+    """Names of the PRICE_BANDS a [low_cents, high_cents] price range overlaps"""
+    if low_cents is None or high_cents is None:
+        return []
+    return [name for name, low, high in PRICE_BANDS
+            if (low is None or high_cents >= dollars_to_cents(low))
+            and (high is None or low_cents <= dollars_to_cents(high))]
+
+
+def backfill(db, collections=('outfits', 'beauty_looks'), batch_size: int = 500, dry_run: bool = False) -> dict:
+    """Set the price fields wherever they are missing or stale; returns updated counts per collection"""
+    from pymongo import UpdateOne
+
+    updated = {}
+    # Item and product prices may live in the products collection
+    products = load_products(db)
+    for name in collections:
+        collection = db[name]
+        ops, count = [], 0
+        projection = {'priceRange': 1, 'price_range': 1, 'items': 1, 'products': 1,
+                      'priceMinCents': 1, 'priceMaxCents': 1}
+        for doc in collection.find({}, projection):
+            fields = price_fields(hydrate(doc, products.get))
+            if all(doc.get(field) == value for field, value in fields.items()) and \
+                    all(field in doc for field in PRICE_FIELDS):
+                continue
+            count += 1
+            ops.append(UpdateOne({'_id': doc['_id']}, {'$set': fields}))
+            if len(ops) >= batch_size:
+                if not dry_run:
+                    collection.bulk_write(ops, ordered=False)
+                ops = []
+        if ops and not dry_run:
+            collection.bulk_write(ops, ordered=False)
+        updated[name] = count
+    return updated
+
+
+def main():
+    from pymongo import MongoClient
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    dry_run = '--dry-run' in sys.argv
+    client = MongoClient(os.getenv('MONGO_URL', 'mongodb://localhost:27017/'))
+    db = client[os.getenv('DB_NAME', 'app_database')]
+    updated = backfill(db, dry_run=dry_run)
+    for name, count in updated.items():
+        print(f"{name}: {count} documents {'would be ' if dry_run else ''}updated")
+    unpriced = {name: db[name].count_documents({'priceMinCents': None}) for name in updated}
+    print(f"Documents without a parseable price: {unpriced}")
+    client.close()
+
+
+if __name__ == '__main__':
+    main()
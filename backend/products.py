@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Shared product records
+
+Outfits and beauty looks used to embed full product entries in `items`,
+`budgetAlternatives`, `products` and `budgetDupes`, and the loaders copied
+the same pool entries into many documents. Products now live once in the
+`products` collection under a stable id derived from their content (brand,
+name, price, links and image), and documents hold references:
+
+    {"products": [{"productId": "p3f9c0e1a2b4d5c6e"}, ...]}
+
+Only identical entries share a record: two looks listing the same product at
+different prices or links keep their own records, so migrating never changes
+what a document displays (or drifts from its `priceMinCents`). Read paths
+join the records back in (`hydrate`), from the in-memory product snapshot
+when the API is serving.
+Entries that are not references (documents written before the migration)
+pass through unchanged, so both shapes can coexist.
+
+    python products.py            # move embedded products into `products` (idempotent)
+    python products.py --dry-run  # report what would move
+"""
+
+import hashlib
+import os
+import sys
+import threading
+
+from query_normalize import fold
+
+PRODUCT_LIST_FIELDS = ('items', 'budgetAlternatives', 'products', 'budgetDupes')
+REF_FIELD = 'productId'
+# Fields besides brand and name that must match for two entries to be the same product
+IDENTITY_FIELDS = ('price', 'link', 'affiliate_url', 'image')
+
+
+def product_id(entry: dict):
+    """Stable id of a product entry (same brand, name, price, links and image -> same id), or None if it has no name"""
+    name = fold(entry.get('name') or '')
+    if not name:
+        return None
+    details = '|'.join(str(entry.get(field) or '').strip() for field in IDENTITY_FIELDS)
+    key = f"{fold(entry.get('brand') or '')}|{name}|{details}"
+    return 'p' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+def product_record(entry: dict) -> dict:
+    return {field: value for field, value in entry.items() if field not in (REF_FIELD, '_id', 'id')}
+
+
+def merge_record(existing: dict, record: dict) -> dict:
+    """`existing` with the fields it lacks (or has empty) filled in from `record`"""
+    merged = dict(existing)
+    for field, value in record.items():
+        if value not in (None, '') and merged.get(field) in (None, ''):
+            merged[field] = value
+    return merged
+
+
+def is_ref(entry) -> bool:
+    return isinstance(entry, dict) and REF_FIELD in entry and 'name' not in entry
+
+
+def split_products(doc: dict) -> tuple:
+    """
+    (doc with embedded product entries replaced by references,
+    {product id: record}). Entries without a name stay embedded.
+    """
+    records = {}
+    changes = {}
+    for field in PRODUCT_LIST_FIELDS:
+        entries = doc.get(field)
+        if not isinstance(entries, list):
+            continue
+        refs = []
+        for entry in entries:
+            pid = product_id(entry) if isinstance(entry, dict) and not is_ref(entry) else None
+            if pid is None:
+                refs.append(entry)
+                continue
+            record = product_record(entry)
+            records[pid] = merge_record(records[pid], record) if pid in records else record
+            refs.append({REF_FIELD: pid})
+        changes[field] = refs
+    return {**doc, **changes}, records
+
+
+def product_ids(doc: dict) -> set:
+    """Ids of every product a document references"""
+    return {entry[REF_FIELD] for field in PRODUCT_LIST_FIELDS for entry in doc.get(field) or []
+            if is_ref(entry)}
+
+
+def hydrate(doc: dict, lookup) -> dict:
+    """
+    `doc` with references replaced by `{**record, 'productId': id}`;
+    `lookup(id)` returns the record or None (unresolved references are dropped).
+    Documents without references are returned as they are.
+    """
+    if doc is None:
+        return None
+    joined = {}
+    for field in PRODUCT_LIST_FIELDS:
+        entries = doc.get(field)
+        if not isinstance(entries, list) or not any(is_ref(entry) for entry in entries):
+            continue
+        resolved = []
+        for entry in entries:
+            if is_ref(entry):
+                record = lookup(entry[REF_FIELD])
+                if record is None:
+                    continue
+                entry = {**product_record(record), REF_FIELD: entry[REF_FIELD]}
+            resolved.append(entry)
+        joined[field] = resolved
+    return {**doc, **joined} if joined else doc
+
+
+class ProductReferences:
+    """product id -> ids of the catalog documents that reference it; subscribe `update` to a snapshot"""
+
+    def __init__(self):
+        self._by_product = {}
+        self._by_doc = {}
+        self._lock = threading.Lock()
+
+    def update(self, doc_id: str, doc):
+        new = product_ids(doc) if doc is not None else set()
+        with self._lock:
+            old = self._by_doc.pop(doc_id, set())
+            for pid in old - new:
+                referrers = self._by_product.get(pid)
+                if referrers is not None:
+                    referrers.discard(doc_id)
+                    if not referrers:
+                        del self._by_product[pid]
+            for pid in new - old:
+                self._by_product.setdefault(pid, set()).add(doc_id)
+            if new:
+                self._by_doc[doc_id] = new
+
+    def referrers(self, pid: str) -> list:
+        with self._lock:
+            return list(self._by_product.get(pid, ()))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'products_referenced': len(self._by_product),
+                'documents_with_refs': len(self._by_doc),
+                'references': sum(len(pids) for pids in self._by_doc.values()),
+            }
+
+
+def load_products(db, ids=None) -> dict:
+    """id -> record from the products collection (all, or just `ids`)"""
+    query = {'_id': {'$in': list(ids)}} if ids is not None else {}
+    return {doc['_id']: doc for doc in db['products'].find(query)}
+
+
+def save_records(db, records: dict, dry_run: bool = False) -> int:
+    """Insert records whose id is new (existing records are the source of truth); returns how many were new"""
+    from pymongo import UpdateOne
+
+    if not records:
+        return 0
+    existing = {doc['_id'] for doc in db['products'].find({'_id': {'$in': list(records)}}, {'_id': 1})}
+    new = {pid: record for pid, record in records.items() if pid not in existing}
+    if new and not dry_run:
+        db['products'].bulk_write([UpdateOne({'_id': pid}, {'$setOnInsert': record}, upsert=True)
+                                   for pid, record in new.items()], ordered=False)
+    return len(new)
+
+
+def product_refs(db, entries: list) -> list:
+    """Store a list of product entries (new ones only) and return references to them"""
+    ref_doc, records = split_products({'products': entries})
+    save_records(db, records)
+    return ref_doc['products']
+
+
+def with_product_refs(db, docs: list) -> list:
+    """
+    Loaders call this on everything they insert (after `with_price_fields`,
+    which needs the embedded prices): products are stored once, deduplicated
+    across the batch and against what is already there, and the documents
+    come back holding references
+    """
+    records, converted = {}, []
+    for doc in docs:
+        ref_doc, doc_records = split_products(doc)
+        for pid, record in doc_records.items():
+            records[pid] = merge_record(records[pid], record) if pid in records else record
+        converted.append(ref_doc)
+    save_records(db, records)
+    return converted
+
+
+def migrate(db, collections=('outfits', 'beauty_looks'), batch_size: int = 500, dry_run: bool = False) -> dict:
+    """Move embedded product entries into `products` and leave references behind; returns counts"""
+    from pymongo import UpdateOne
+
+    counts = {'entries': 0, 'products_new': 0}
+    records = {}
+    updates = {}
+    for name in collections:
+        updates[name] = []
+        projection = {field: 1 for field in PRODUCT_LIST_FIELDS}
+        for doc in db[name].find({}, projection):
+            ref_doc, doc_records = split_products(doc)
+            if not doc_records:
+                continue
+            counts['entries'] += sum(1 for field in PRODUCT_LIST_FIELDS
+                                     for before, after in zip(doc.get(field) or [], ref_doc.get(field) or [])
+                                     if not is_ref(before) and is_ref(after))
+            for pid, record in doc_records.items():
+                records[pid] = merge_record(records[pid], record) if pid in records else record
+            updates[name].append(UpdateOne({'_id': doc['_id']}, {'$set': {
+                field: ref_doc[field] for field in PRODUCT_LIST_FIELDS if field in ref_doc}}))
+        counts[name] = len(updates[name])
+    # Records first, so no document ever references a missing product
+    counts['products_new'] = save_records(db, records, dry_run=dry_run)
+    counts['products_distinct'] = len(records)
+    if not dry_run:
+        for name, ops in updates.items():
+            for i in range(0, len(ops), batch_size):
+                db[name].bulk_write(ops[i:i + batch_size], ordered=False)
+    return counts
+
+
+def main():
+    from pymongo import MongoClient
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    dry_run = '--dry-run' in sys.argv
+    client = MongoClient(os.getenv('MONGO_URL', 'mongodb://localhost:27017/'))
+    db = client[os.getenv('DB_NAME', 'app_database')]
+    counts = migrate(db, dry_run=dry_run)
+    verb = 'would be' if dry_run else 'were'
+    print(f"{counts['entries']} embedded product entries {verb} replaced by references "
+          f"({counts['outfits']} outfits, {counts['beauty_looks']} beauty looks)")
+    print(f"{counts['products_distinct']} distinct products, {counts['products_new']} new in `products` "
+          f"(now {db['products'].count_documents({})})")
+    client.close()
+
+
+if __name__ == '__main__':
+    main()
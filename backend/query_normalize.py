@@ -0,0 +1,100 @@
+"""
+Query normalization for TMDB lookups
+
+Vision entities, best-guess labels and OCR windows often differ only in case,
+punctuation or diacritics. TMDB caches and per-request dedup are keyed on
+`search_key` (the folded form of the query actually sent), so those variants
+collapse to one lookup while distinct titles ("Bee Movie" / "Bee") never
+share results.
+
+`normalize_query` goes further - it also drops a leading article, trailing
+noise ("film poster", "movie") and a release year - and is only used to score
+candidates against titles, where "Inception film" should match "Inception".
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+
+LEADING_ARTICLES = ('the', 'a', 'an')
+
+# Trailing noise Vision likes to append to a title ("Inception film poster")
+TRAILING_STOP_TERMS = (
+    'official trailer', 'movie poster', 'film poster', 'teaser poster',
+    'trailer', 'poster', 'film', 'movie', 'soundtrack',
+)
+_TRAILING_SUFFIXES = tuple(' ' + term for term in TRAILING_STOP_TERMS)
+
+# Entities that describe the image rather than name a title
+GENERIC_TERMS = frozenset({
+    'video', 'film', 'movie', 'scene', 'poster', 'film poster', 'movie poster',
+    'illustration', 'artwork', 'cinema', 'hollywood', 'actor', 'actress',
+    'director', 'crime film', 'drama', 'thriller', 'action film', 'comedy',
+    'image', 'photograph', 'screenshot', 'album cover', 'font', 'text',
+})
+
+_PUNCTUATION = re.compile(r"[^\w\s]|_")
+_YEAR_SUFFIX = re.compile(r"\s*\((19|20)\d{2}\)\s*$")
+
+
+@lru_cache(maxsize=4096)
+def fold(text: str) -> str:
+    """Unicode-fold, lowercase, drop punctuation and collapse whitespace"""
+    if not text:
+        return ''
+    if text.isascii():
+        stripped = text
+    else:
+        decomposed = unicodedata.normalize('NFKD', text)
+        stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    # Apostrophes join words ("Schindler's" -> "schindlers"); other punctuation splits them
+    stripped = stripped.replace("'", '').replace('’', '')
+    return ' '.join(_PUNCTUATION.sub(' ', stripped.casefold()).split())
+
+
+def search_key(text: str) -> str:
+    """Cache/dedup key of a query sent to TMDB: folded, nothing stripped"""
+    return fold(text)
+
+
+@lru_cache(maxsize=4096)
+def normalize_query(text: str) -> str:
+    """
+    Canonical form of a title-like string, for comparing a query with titles.
+    Strips a leading article, trailing stop terms and a trailing release year.
+    Falls back to the folded text if stripping would leave nothing.
+    """
+    folded = fold(text)
+    key = fold(_YEAR_SUFFIX.sub('', text or ''))
+    changed = key.endswith(_TRAILING_SUFFIXES)
+    while changed and key:
+        changed = False
+        for term in TRAILING_STOP_TERMS:
+            if key.endswith(' ' + term):
+                key = key[:-len(term) - 1]
+                changed = True
+    words = key.split()
+    if len(words) > 1 and words[0] in LEADING_ARTICLES:
+        words = words[1:]
+    return ' '.join(words) or folded
+
+
+def is_generic(text: str) -> bool:
+    """True for entities like 'Film poster' that never name a title"""
+    return fold(text) in GENERIC_TERMS
+
+
+def dedupe_queries(queries, seen: set = None) -> list:
+    """
+    Drop queries whose search key was already seen (in this list or in
+    `seen`, which is updated in place). Order is preserved.
+    """
+    seen = seen if seen is not None else set()
+    unique = []
+    for query in queries:
+        key = search_key(query)
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        unique.append(query)
+    return unique
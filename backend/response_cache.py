@@ -0,0 +1,139 @@
+"""
+Pre-serialized JSON responses
+
+Catalog listings and item pages are the same bytes for every client until a
+document changes, yet each request used to re-walk the nested
+items/products/budgetAlternatives arrays through FastAPI's encoder. This cache
+keeps the encoded body (orjson) and a strong ETag per response key, so
+conditional GETs are answered with a string comparison.
+
+Entries declare what they depend on - document ids and listing tags such as
+"outfits:category:streetwear" - and a catalog change invalidates exactly the
+entries that depend on the changed document.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import orjson
+
+
+def encode_json(payload) -> bytes:
+    """orjson encoding; anything orjson does not know (ObjectId, Decimal) is stringified"""
+    return orjson.dumps(payload, default=str)
+
+
+def strong_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match evaluation (weak comparison, as RFC 9110 prescribes for GET)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    bare = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == bare:
+            return True
+    return False
+
+
+class CachedResponse:
+    __slots__ = ('body', 'etag', 'deps')
+
+    def __init__(self, body: bytes, deps: frozenset = frozenset()):
+        self.body = body
+        self.etag = strong_etag(body)
+        self.deps = deps
+
+    @classmethod
+    def from_payload(cls, payload, deps=()):
+        """Encode once; the ETag is computed here, never per request"""
+        return cls(encode_json(payload), frozenset(deps))
+
+
+class ResponseCache:
+    """Bounded LRU of encoded responses with dependency-based invalidation"""
+
+    def __init__(self, maxsize: int = 5000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        # dependency -> keys of entries built from it
+        self._dependents = {}
+        self._lock = threading.Lock()
+        # Bumped by every invalidation so a response built from pre-change data is never stored
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, payload, deps=(), generation: int = None) -> CachedResponse:
+        """
+        Encode and store `payload`. Pass the `generation` read before building
+        the payload: if anything was invalidated since, the response is
+        returned but not cached.
+        """
+        entry = CachedResponse.from_payload(payload, deps)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return entry
+            self._drop_locked(key)
+            self._entries[key] = entry
+            for dep in entry.deps:
+                self._dependents.setdefault(dep, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._drop_locked(next(iter(self._entries)))
+        return entry
+
+    def _drop_locked(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for dep in entry.deps:
+            keys = self._dependents.get(dep)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._dependents[dep]
+
+    def invalidate(self, *deps):
+        """Drop every entry that depends on any of `deps`"""
+        with self._lock:
+            self.generation += 1
+            for dep in deps:
+                for key in list(self._dependents.get(dep, ())):
+                    self._drop_locked(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._dependents.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': sum(len(e.body) for e in self._entries.values()),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            'invalidations': self.invalidations,
+        }
@@ -0,0 +1,551 @@
+"""
+In-process full-text search for outfits and beauty looks
+
+An inverted index with field-weighted BM25 ranking replaces the unanchored,
+case-insensitive `$regex` scans the search endpoints used to run. Queries are
+tokenized (never compiled as patterns), so user input cannot stall the
+database, and the last query term matches as a prefix for search-as-you-type.
+
+Documents are added/removed one at a time, so the index is kept current
+incrementally as the catalog changes. `SuggestIndex` serves keystroke
+typeahead over titles, celebrities, categories and movie titles.
+"""
+
+import bisect
+import hashlib
+import heapq
+import json
+import logging
+import math
+import threading
+
+from query_normalize import fold
+
+logger = logging.getLogger(__name__)
+
+# Guards against pathological input: terms beyond this are ignored
+MAX_QUERY_TERMS = 10
+MAX_QUERY_LENGTH = 200
+# A prefix term expands to at most this many vocabulary terms
+MAX_PREFIX_EXPANSIONS = 50
+# Expanded prefix matches rank a little below exact term matches
+PREFIX_WEIGHT = 0.8
+
+OUTFIT_FIELDS = {'title': 3.0, 'category': 2.0, 'description': 1.0}
+BEAUTY_FIELDS = {'title': 3.0, 'celebrity': 2.5, 'category': 2.0, 'description': 1.0}
+# Attributes kept per document so endpoint filters apply without a DB round trip
+OUTFIT_FILTERS = ('category', 'gender', 'priceMinCents', 'priceMaxCents')
+BEAUTY_FILTERS = ('category', 'celebrity', 'priceMinCents', 'priceMaxCents')
+
+
+def tokenize(text) -> list:
+    if not text:
+        return []
+    if not isinstance(text, str):
+        text = ' '.join(str(part) for part in text) if isinstance(text, (list, tuple)) else str(text)
+    return fold(text).split()
+
+
+def parse_query(q: str) -> list:
+    """Safe query parsing: folded tokens, bounded length and term count, no operators"""
+    return tokenize((q or '')[:MAX_QUERY_LENGTH])[:MAX_QUERY_TERMS]
+
+
+def doc_fingerprint(doc: dict, fields) -> str:
+    """Stable hash of the indexed fields, used to skip unchanged documents"""
+    payload = json.dumps([doc.get(f) for f in fields], sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=12).hexdigest()
+
+
+class SearchIndex:
+    """Field-weighted BM25 inverted index with prefix expansion"""
+
+    def __init__(self, fields: dict, filters: tuple = (), k1: float = 1.2, b: float = 0.75, sorts: tuple = ()):
+        self.fields = fields
+        self.filters = filters
+        self.k1 = k1
+        self.b = b
+        # term -> {doc_id: weighted term frequency}
+        self._postings = {}
+        # sorted vocabulary for prefix lookups
+        self._vocabulary = []
+        self._doc_len = {}
+        self._doc_terms = {}
+        self._fingerprints = {}
+        self._attributes = {}
+        # sort field (one of `filters`) -> sorted [(value, doc_id)] of documents with a numeric value
+        self._sorted = {field: [] for field in sorts}
+        self._total_len = 0.0
+        self._lock = threading.RLock()
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    def __contains__(self, doc_id) -> bool:
+        return doc_id in self._doc_len
+
+    # ---------- maintenance ----------
+
+    def upsert(self, doc_id: str, doc: dict) -> bool:
+        """Index (or re-index) one document; returns False if nothing changed"""
+        fingerprint = doc_fingerprint(doc, tuple(self.fields) + tuple(self.filters))
+        with self._lock:
+            if self._fingerprints.get(doc_id) == fingerprint:
+                return False
+            self._remove_locked(doc_id)
+            term_freqs = {}
+            length = 0.0
+            for field, weight in self.fields.items():
+                tokens = tokenize(doc.get(field))
+                length += weight * len(tokens)
+                for token in tokens:
+                    term_freqs[token] = term_freqs.get(token, 0.0) + weight
+            for term, tf in term_freqs.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    bisect.insort(self._vocabulary, term)
+                postings[doc_id] = tf
+            self._doc_len[doc_id] = length
+            self._doc_terms[doc_id] = tuple(term_freqs)
+            self._fingerprints[doc_id] = fingerprint
+            self._attributes[doc_id] = attrs = {f: doc.get(f) for f in self.filters}
+            for field, keys in self._sorted.items():
+                if isinstance(attrs.get(field), (int, float)):
+                    bisect.insort(keys, (attrs[field], doc_id))
+            self._total_len += length
+            return True
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            self._remove_locked(doc_id)
+
+    def _remove_locked(self, doc_id: str):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+                i = bisect.bisect_left(self._vocabulary, term)
+                if i < len(self._vocabulary) and self._vocabulary[i] == term:
+                    self._vocabulary.pop(i)
+        self._total_len -= self._doc_len.pop(doc_id, 0.0)
+        self._fingerprints.pop(doc_id, None)
+        attrs = self._attributes.pop(doc_id, None) or {}
+        for field, keys in self._sorted.items():
+            if isinstance(attrs.get(field), (int, float)):
+                key = (attrs[field], doc_id)
+                i = bisect.bisect_left(keys, key)
+                if i < len(keys) and keys[i] == key:
+                    keys.pop(i)
+
+    def rebuild(self, docs):
+        """
+        Sync the index with `docs` ((doc_id, doc) pairs): unchanged documents are
+        skipped, changed ones re-indexed, missing ones removed. The lock is taken
+        per document so searches keep being served during a long rebuild.
+        """
+        seen = set()
+        for doc_id, doc in docs:
+            seen.add(doc_id)
+            self.upsert(doc_id, doc)
+        with self._lock:
+            for doc_id in [d for d in self._doc_len if d not in seen]:
+                self._remove_locked(doc_id)
+        self.ready = True
+
+    # ---------- querying ----------
+
+    def expand_prefix(self, prefix: str, limit: int = MAX_PREFIX_EXPANSIONS) -> list:
+        i = bisect.bisect_left(self._vocabulary, prefix)
+        terms = []
+        while i < len(self._vocabulary) and len(terms) < limit and self._vocabulary[i].startswith(prefix):
+            terms.append(self._vocabulary[i])
+            i += 1
+        return terms
+
+    def _idf(self, df: int) -> float:
+        n = len(self._doc_len)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def _term_scores(self, terms_with_weight, restrict: set = None) -> dict:
+        """
+        BM25 contribution of a group of alternative terms (exact + prefix
+        expansions), optionally only for the documents in `restrict`
+        """
+        avgdl = (self._total_len / len(self._doc_len) if self._doc_len else 1.0) or 1.0
+        k1, b, doc_len = self.k1, self.b, self._doc_len
+        scores = {}
+        for term, boost in terms_with_weight:
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf(len(postings)) * boost
+            if restrict is not None and len(restrict) < len(postings):
+                items = ((doc_id, postings[doc_id]) for doc_id in restrict if doc_id in postings)
+            else:
+                items = postings.items()
+            for doc_id, tf in items:
+                if restrict is not None and doc_id not in restrict:
+                    continue
+                score = idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_len[doc_id] / avgdl))
+                if score > scores.get(doc_id, 0.0):
+                    scores[doc_id] = score
+        return scores
+
+    def _group_size(self, group) -> int:
+        return sum(len(self._postings.get(term, ())) for term, _ in group)
+
+    def attributes(self, doc_id: str) -> dict:
+        return self._attributes.get(doc_id, {})
+
+    def matches(self, doc_id: str, equals: dict = None, contains: dict = None, ranges: dict = None) -> bool:
+        """
+        Exact (`equals`), case-insensitive substring (`contains`) and numeric
+        `ranges` ({field: (low, high)}, None = open; documents without the
+        field never match) attribute filters
+        """
+        return self.attributes_match(self._attributes.get(doc_id, {}), equals, contains, ranges)
+
+    @staticmethod
+    def attributes_match(attrs: dict, equals: dict = None, contains: dict = None, ranges: dict = None) -> bool:
+        for field, (low, high) in (ranges or {}).items():
+            value = attrs.get(field)
+            if value is None or (low is not None and value < low) or (high is not None and value > high):
+                return False
+        for field, value in (equals or {}).items():
+            if value is not None and attrs.get(field) != value:
+                return False
+        for field, value in (contains or {}).items():
+            if value and fold(value) not in fold(str(attrs.get(field) or '')):
+                return False
+        return True
+
+    def search(self, q: str, limit: int = 50, prefix: bool = True,
+               equals: dict = None, contains: dict = None, ranges: dict = None, after: tuple = None) -> list:
+        """
+        Ranked [(doc_id, score)] for a free-text query. All terms must match
+        (falling back to any-term matching when that finds nothing); the last
+        term also matches as a prefix when `prefix` is set. `equals`,
+        `contains` and `ranges` restrict candidates by stored attributes (see `matches`).
+        `after` is the (score, doc_id) of the last result of the previous page.
+        """
+        candidates = self.hits(q, prefix, equals, contains, ranges).items()
+        if after is not None:
+            after_score, after_id = after
+            candidates = [(doc_id, score) for doc_id, score in candidates
+                          if (-score, doc_id) > (-after_score, after_id)]
+        key = lambda item: (-item[1], item[0])
+        return heapq.nsmallest(limit, candidates, key=key) if limit else sorted(candidates, key=key)
+
+    def hits(self, q: str, prefix: bool = True, equals: dict = None, contains: dict = None,
+             ranges: dict = None) -> dict:
+        """Unranked doc_id -> BM25 score for every document matching the query and the attribute filters"""
+        totals = self._scores(q, prefix)
+        if equals or contains or ranges:
+            return {doc_id: score for doc_id, score in totals.items()
+                    if self.matches(doc_id, equals, contains, ranges)}
+        return totals
+
+    def ordered(self, field: str, limit: int, descending: bool = False, after: tuple = None,
+                equals: dict = None, contains: dict = None, ranges: dict = None, among=None) -> list:
+        """
+        [(value, doc_id)] of the documents with a numeric `field` (one of the
+        index's `sorts`), ordered by (value, doc_id), descending if asked.
+        `after` is the (value, doc_id) of the last result of the previous page.
+        With `among` (e.g. the hits of a text search) the next `limit` of those
+        ids are picked; otherwise the sorted list is walked from the cursor, so
+        a page costs its size plus the filtered-out documents it skips.
+        """
+        filtered = equals or contains or ranges
+        with self._lock:
+            if among is not None:
+                keyed = ((self._attributes.get(doc_id, {}).get(field), doc_id) for doc_id in among)
+                keyed = [key for key in keyed if isinstance(key[0], (int, float))
+                         and (after is None or (key < after if descending else key > after))
+                         and (not filtered or self.matches(key[1], equals, contains, ranges))]
+                return heapq.nlargest(limit, keyed) if descending else heapq.nsmallest(limit, keyed)
+            keys = self._sorted[field]
+            if descending:
+                positions = range((bisect.bisect_left(keys, after) if after else len(keys)) - 1, -1, -1)
+            else:
+                positions = range(bisect.bisect_right(keys, after) if after else 0, len(keys))
+            page = []
+            for i in positions:
+                if not filtered or self.matches(keys[i][1], equals, contains, ranges):
+                    page.append(keys[i])
+                    if len(page) >= limit:
+                        break
+            return page
+
+    def _scores(self, q: str, prefix: bool = True) -> dict:
+        """Unfiltered doc_id -> BM25 score for every document matching the query"""
+        terms = parse_query(q)
+        if not terms:
+            return {}
+        with self._lock:
+            groups = []
+            for i, term in enumerate(terms):
+                group = [(term, 1.0)]
+                if prefix and i == len(terms) - 1 and len(term) >= 2:
+                    group += [(t, PREFIX_WEIGHT) for t in self.expand_prefix(term) if t != term]
+                groups.append(group)
+
+            # Conjunctive pass: rarest term first, later terms only score surviving documents
+            totals = None
+            for group in sorted(groups, key=self._group_size):
+                scores = self._term_scores(group, restrict=totals)
+                totals = {doc_id: totals[doc_id] + score for doc_id, score in scores.items()} \
+                    if totals is not None else scores
+                if not totals:
+                    break
+
+            if not totals and len(groups) > 1:
+                # Nothing matches every term - rank documents matching any of them
+                totals = {}
+                for group in groups:
+                    for doc_id, score in self._term_scores(group).items():
+                        totals[doc_id] = totals.get(doc_id, 0.0) + score
+        return totals
+
+    def facets(self, q: str, facets: dict, filters: dict) -> dict:
+        """
+        Bucket counts for every facet in one pass over the documents matching
+        `q` (all documents when it is empty). `facets` maps a facet name to
+        `buckets(attrs) -> keys`, `filters` maps facet names to the active
+        filter `keep(attrs) -> bool`. Each facet is counted with every filter
+        applied except its own, so picking one category still shows the
+        counts of the others.
+        """
+        with self._lock:
+            doc_ids = list(self._scores(q)) if parse_query(q) else list(self._attributes)
+        counts = {name: {} for name in facets}
+        for doc_id in doc_ids:
+            attrs = self._attributes.get(doc_id, {})
+            failed = None
+            for name, keep in filters.items():
+                if not keep(attrs):
+                    if failed is not None:
+                        break
+                    failed = name
+            else:
+                for name, buckets in facets.items():
+                    if failed is not None and failed != name:
+                        continue
+                    facet = counts[name]
+                    for key in buckets(attrs):
+                        facet[key] = facet.get(key, 0) + 1
+        return counts
+
+    def stats(self) -> dict:
+        return {'documents': len(self._doc_len), 'terms': len(self._postings), 'ready': self.ready}
+
+
+def catalog_suggestions(kind: str, doc: dict) -> list:
+    """(type, text) suggestion entries contributed by one outfit/beauty document"""
+    entries = [(kind, doc.get('title')), ('category', doc.get('category')), ('celebrity', doc.get('celebrity'))]
+    return [(t, text) for t, text in entries if isinstance(text, str) and text.strip()]
+
+
+def _rank(suggestion: tuple) -> tuple:
+    """Sort key of a (score, display, type) suggestion: best score, then shortest text"""
+    score, display, kind = suggestion
+    return -score, len(display), display, kind
+
+
+class SuggestIndex:
+    """
+    Typeahead over short phrases (titles, names, categories).
+
+    Every phrase is stored under each of its word suffixes in one sorted list,
+    so "glam" finds both "Glam Night Out" and "Soft Glam"; a lookup is a
+    bisect plus a scan of the keys under the prefix. Prefixes matching more
+    keys than are worth scanning per keystroke ("l", but also "line" or
+    "leather" in a large catalog) answer from ranked top lists cached on first
+    use and kept up to date as phrases change; any other prefix scans at most
+    SCAN_LIMIT keys. Phrases are contributed by sources (a catalog document, a
+    TMDB movie) and reference-counted, so updating or deleting one source only
+    touches the phrases it changed.
+    """
+
+    # Prefixes matching more keys than this answer from cached top lists
+    SCAN_LIMIT = 256
+    # Cached lists answer up to this many phrases per type, and hold as many
+    # again in reserve so phrases can leave them without a rescan
+    TOP_PER_KIND = 25
+
+    def __init__(self):
+        # sorted (suffix key, type, folded phrase)
+        self._keys = []
+        # (type, folded phrase) -> [display text, weight]
+        self._entries = {}
+        # source id -> tuple of (type, display text) it contributed
+        self._sources = {}
+        # prefix matching > SCAN_LIMIT keys -> (ranked [(score, display, type)], types with phrases below the list)
+        self._top = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _add(self, kind: str, text: str, weight: float):
+        folded = fold(text)
+        if not folded:
+            return
+        entry = self._entries.get((kind, folded))
+        if entry is not None:
+            entry[1] += weight
+            self._refresh(kind, folded, entry[0])
+            return
+        self._entries[(kind, folded)] = [text.strip(), weight]
+        words = folded.split()
+        for i in range(len(words)):
+            bisect.insort(self._keys, (' '.join(words[i:]), kind, folded))
+        self._refresh(kind, folded, text.strip())
+
+    def _discard(self, kind: str, text: str, weight: float):
+        folded = fold(text)
+        entry = self._entries.get((kind, folded))
+        if entry is None:
+            return
+        entry[1] -= weight
+        if entry[1] > 1e-9:
+            self._refresh(kind, folded, entry[0])
+            return
+        del self._entries[(kind, folded)]
+        words = folded.split()
+        for i in range(len(words)):
+            key = (' '.join(words[i:]), kind, folded)
+            j = bisect.bisect_left(self._keys, key)
+            if j < len(self._keys) and self._keys[j] == key:
+                self._keys.pop(j)
+        self._refresh(kind, folded, entry[0])
+
+    def _refresh(self, kind: str, folded: str, display: str):
+        """
+        Update the cached top lists of every prefix a phrase is listed under
+        after its weight changed (or it was added or removed). A list is only
+        dropped once phrases left it faster than its reserve can cover, since
+        the phrases below it are unknown.
+        """
+        if not self._top:
+            return
+        entry = self._entries.get((kind, folded))
+        seen = set()
+        for key in self._suffix_keys(folded):
+            for n in range(1, len(key) + 1):
+                prefix = key[:n]
+                if prefix in seen or prefix not in self._top:
+                    continue
+                seen.add(prefix)
+                ranked, cut = self._top[prefix]
+                same_kind = [s for s in ranked if s[2] == kind]
+                old = next((s for s in same_kind if s[1] == display), None)
+                if old is not None:
+                    ranked.remove(old)
+                    same_kind.remove(old)
+                new = (entry[1] * (2.0 if folded.startswith(prefix) else 1.0), display, kind) if entry else None
+                if new is not None and (kind not in cut or same_kind and _rank(new) < _rank(same_kind[-1])):
+                    bisect.insort(ranked, new, key=_rank)
+                    if kind in cut and old is None or len(same_kind) >= 2 * self.TOP_PER_KIND:
+                        # Ranked above the last phrase of its type, which drops below the list
+                        ranked.remove(max(same_kind + [new], key=_rank))
+                        cut.add(kind)
+                elif kind in cut and len(same_kind) < self.TOP_PER_KIND:
+                    del self._top[prefix]
+
+    def _top_list(self, prefix: str, lo: int, hi: int) -> list:
+        """Cached ranked list of a prefix matching the keys in [lo, hi), built on first use"""
+        cached = self._top.get(prefix)
+        if cached is None:
+            ranked, cut, counts = [], set(), {}
+            for suggestion in self._ranked(lo, hi):
+                counts[suggestion[2]] = counts.get(suggestion[2], 0) + 1
+                if counts[suggestion[2]] <= 2 * self.TOP_PER_KIND:
+                    ranked.append(suggestion)
+                else:
+                    cut.add(suggestion[2])
+            cached = self._top[prefix] = (ranked, cut)
+        return cached[0]
+
+    @staticmethod
+    def _suffix_keys(folded: str) -> list:
+        """The keys a phrase is listed under: its word suffixes"""
+        words = folded.split()
+        return [' '.join(words[i:]) for i in range(len(words))]
+
+    def _range(self, prefix: str) -> tuple:
+        """Positions [lo, hi) of the keys starting with `prefix`"""
+        return (bisect.bisect_left(self._keys, (prefix,)),
+                bisect.bisect_left(self._keys, (prefix + '\U0010ffff',)))
+
+    def _ranked(self, lo: int, hi: int) -> list:
+        """Phrases of the keys in [lo, hi), ranked"""
+        best = {}
+        for key, kind, folded in self._keys[lo:hi]:
+            display, weight = self._entries[(kind, folded)]
+            score = weight * (2.0 if key == folded else 1.0)
+            if score > best.get((kind, folded), (0.0,))[0]:
+                best[(kind, folded)] = (score, display, kind)
+        return sorted(best.values(), key=_rank)
+
+    def set_source(self, source_id: str, entries, weight: float = 1.0):
+        """Replace the phrases contributed by `source_id` with `entries` [(type, text)]"""
+        new = tuple(entries)
+        with self._lock:
+            old = self._sources.get(source_id)
+            if old == new:
+                return
+            for kind, text in old or ():
+                self._discard(kind, text, weight)
+            for kind, text in new:
+                self._add(kind, text, weight)
+            if new:
+                self._sources[source_id] = new
+            else:
+                self._sources.pop(source_id, None)
+
+    def remove_source(self, source_id: str):
+        self.set_source(source_id, ())
+
+    def sync(self, namespace: str, sources: dict):
+        """
+        Make the sources under `namespace` (ids prefixed "<namespace>:") equal
+        to `sources` {id: entries}; unchanged sources cost one comparison
+        """
+        prefix = f"{namespace}:"
+        for source_id, entries in sources.items():
+            self.set_source(prefix + source_id, entries)
+        with self._lock:
+            stale = [s for s in self._sources if s.startswith(prefix) and s[len(prefix):] not in sources]
+        for source_id in stale:
+            self.remove_source(source_id)
+
+    def suggest(self, q: str, limit: int = 8, kinds=None) -> list:
+        """
+        Ranked suggestions for a typed prefix. Phrases that start with the
+        prefix rank above ones where it only starts a later word; ties go to
+        phrases contributed by more sources, then shorter ones.
+        """
+        prefix = fold((q or '')[:MAX_QUERY_LENGTH])
+        if not prefix:
+            return []
+        with self._lock:
+            lo, hi = self._range(prefix)
+            if hi - lo > self.SCAN_LIMIT and limit <= self.TOP_PER_KIND:
+                ranked = self._top_list(prefix, lo, hi)
+            else:
+                ranked = self._ranked(lo, hi)
+        if kinds is not None:
+            ranked = [suggestion for suggestion in ranked if suggestion[2] in kinds]
+        return [{'text': display, 'type': kind, 'score': round(score, 3)} for score, display, kind in ranked[:limit]]
+
+    def stats(self) -> dict:
+        return {'phrases': len(self._entries), 'keys': len(self._keys), 'sources': len(self._sources),
+                'cached_prefixes': len(self._top)}
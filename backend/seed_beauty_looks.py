@@ -5,6 +5,8 @@ Seed trending beauty looks to MongoDB
 import os
 from pymongo import MongoClient
 from dotenv import load_dotenv
+from pricing import with_price_fields
+from products import with_product_refs
 
 # Load environment variables
 load_dotenv()
@@ -182,7 +184,7 @@ def seed_beauty_looks():
     # print("🗑️  Cleared existing beauty looks")
     
     # Insert new beauty looks
-    result = beauty_collection.insert_many(BEAUTY_LOOKS)
+    result = beauty_collection.insert_many(with_product_refs(db, [with_price_fields(doc) for doc in BEAUTY_LOOKS]))
     print(f"✅ Successfully seeded {len(result.inserted_ids)} beauty looks!")
     
     # Verify
@@ -1,5 +1,5 @@
-from fastapi import FastAPI, APIRouter, File, UploadFile, Request
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, File, UploadFile, Request, Depends, HTTPException
+from fastapi.responses import JSONResponse, Response
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 import os
@@ -7,10 +7,41 @@ import logging
 from pathlib import Path
 from pydantic import BaseModel
 import base64
+import hmac
 import requests
+import threading
 import time
-from pymongo import MongoClient
+import asyncio
+import re
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from bson import ObjectId
+from database import Database, to_api
+from indexes import ensure_indexes, index_report, explain_patterns
+from budget import BudgetManager, current_endpoint
+from tmdb_cache import NegativeCache, TTLCache
+from query_normalize import search_key, is_generic, dedupe_queries
+from title_scorer import best_match, rank_results, with_title_keys, MATCH_THRESHOLD, PERFECT_THRESHOLD, TOP_N as TITLE_SCORER_TOP_N
+from people_index import PeopleIndex
+from catalog import (
+    CatalogSnapshot, card_projection,
+    OUTFIT_INDEXED_FIELDS, BEAUTY_INDEXED_FIELDS, OUTFIT_CARD_FIELDS, BEAUTY_CARD_FIELDS
+)
+from response_cache import ResponseCache, CachedResponse, etag_matches
+from pagination import page_size, listing_size, encode_cursor, decode_cursor
+from search_index import (
+    SearchIndex, SuggestIndex, catalog_suggestions,
+    OUTFIT_FIELDS, BEAUTY_FIELDS, OUTFIT_FILTERS, BEAUTY_FILTERS, MAX_QUERY_LENGTH
+)
+from pricing import PRICE_FIELDS, PRICE_BANDS, with_price_fields, price_window, price_range_query, price_bands, \
+    dollars_to_cents
+from weather_tags import TEMP_CATEGORY_RULES, get_temp_category, weather_condition
+from weather_scoring import WeatherScorer
+from similar_items import SimilarIndex
+from products import ProductReferences, hydrate, product_ids
+from weather_cache import WeatherCache, geohash_center
+from trending import TrendingRanker, OUTFIT_EVENT_WEIGHTS, BEAUTY_EVENT_WEIGHTS
+from coengagement import CoEngagement
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -22,26 +53,385 @@ AUDD_API_KEY = os.environ.get('AUDD_API_KEY')
 OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
 GOOGLE_VISION_API_KEY = os.environ.get('GOOGLE_VISION_API_KEY')
 
+# How often in-memory provider state (budget counters, caches) is written to MongoDB
+STATE_FLUSH_INTERVAL = float(os.environ.get('STATE_FLUSH_INTERVAL', 30))
+# Catalog snapshot polling period when MongoDB has no change streams (standalone server)
+CATALOG_POLL_INTERVAL = float(os.environ.get('CATALOG_POLL_INTERVAL', 30))
+# Engagement half-life for trending scores, and how often the ranked trending lists are rebuilt
+TRENDING_HALF_LIFE_HOURS = float(os.environ.get('TRENDING_HALF_LIFE_HOURS', 72))
+TRENDING_REFRESH_INTERVAL = float(os.environ.get('TRENDING_REFRESH_INTERVAL', 60))
+# Weather cache: freshness per geohash cell, how long a stale value may stand in, and prefetching
+WEATHER_CACHE_TTL = float(os.environ.get('WEATHER_CACHE_TTL', 600))
+WEATHER_STALE_TTL = float(os.environ.get('WEATHER_STALE_TTL', 6 * 3600))
+WEATHER_GEOHASH_PRECISION = int(os.environ.get('WEATHER_GEOHASH_PRECISION', 5))
+WEATHER_FETCH_TIMEOUT = float(os.environ.get('WEATHER_FETCH_TIMEOUT', 3))
+WEATHER_PREFETCH_INTERVAL = float(os.environ.get('WEATHER_PREFETCH_INTERVAL', 120))
+WEATHER_PREFETCH_CELLS = int(os.environ.get('WEATHER_PREFETCH_CELLS', 50))
+WEATHER_PREFETCH_BATCH = int(os.environ.get('WEATHER_PREFETCH_BATCH', 10))
+# How often queued catalog changes are folded into the similar-items neighbor lists
+SIMILAR_REFRESH_INTERVAL = float(os.environ.get('SIMILAR_REFRESH_INTERVAL', 30))
+# Unified search: deadline per backend (seconds) - past it the response goes out without that backend
+SEARCH_CATALOG_TIMEOUT = float(os.environ.get('SEARCH_CATALOG_TIMEOUT', 0.5))
+SEARCH_TMDB_TIMEOUT = float(os.environ.get('SEARCH_TMDB_TIMEOUT', 2.5))
+
+async def persist_state():
+    """Write budget counters, the TMDB miss filter and people verdicts to MongoDB"""
+    await budget.flush()
+    await tmdb_misses.save()
+    await people_index.flush()
+
+def catalog_listener(index: SearchIndex, kind: str):
+    """Keep a search index and the typeahead entries in step with one catalog snapshot"""
+    def on_change(doc_id: str, doc):
+        if doc is None:
+            index.remove(doc_id)
+            suggest_index.remove_source(f"{kind}:{doc_id}")
+        else:
+            # Documents written before the price backfill get their price fields derived here
+            index.upsert(doc_id, doc if all(field in doc for field in PRICE_FIELDS) else with_price_fields(doc))
+            suggest_index.set_source(f"{kind}:{doc_id}", catalog_suggestions(kind, doc))
+    return on_change
+
+def with_products(listener):
+    """Wrap a snapshot listener so it sees documents with their product references joined in"""
+    def on_change(doc_id: str, doc):
+        listener(doc_id, hydrate(doc, product_catalog.get) if doc is not None else None)
+    return on_change
+
+def product_listener(product_id: str, record):
+    """A changed product re-derives (search, weather, similar items) the documents that reference it"""
+    for catalog, refs in ((outfit_catalog, outfit_product_refs), (beauty_catalog, beauty_product_refs)):
+        for doc_id in refs.referrers(product_id):
+            catalog.renotify(doc_id)
+
+async def join_products(docs: list) -> list:
+    """Full documents with product references resolved: from the product cache, or one $in query"""
+    if product_catalog.ready:
+        return [hydrate(doc, product_catalog.get) for doc in docs]
+    wanted = set().union(*(product_ids(doc) for doc in docs if doc is not None))
+    records = {}
+    if wanted:
+        records = {record['_id']: record
+                   for record in await products_collection.find({"_id": {"$in": list(wanted)}}).to_list(length=None)}
+    return [hydrate(doc, records.get) for doc in docs]
+
+def response_invalidator(catalog: CatalogSnapshot):
+    """Drop cached responses that contain a changed document or list its (new) field values"""
+    def on_change(doc_id: str, doc):
+        deps = [f"{catalog.name}:{doc_id}"]
+        if doc is not None:
+            deps += [f"{catalog.name}:{field}:{doc.get(field)}" for field in catalog.indexed_fields]
+        response_cache.invalidate(*deps)
+    return on_change
+
+def refresh_trending():
+    """Re-rank both trending feeds from the current scores and snapshots, and the changed also-viewed lists"""
+    if outfit_catalog.ready:
+        # Celebrity looks have their own feed
+        outfit_trending.rebuild(outfit_catalog.all(), eligible=lambda doc: doc.get('isCelebrity') is False)
+    if beauty_catalog.ready:
+        beauty_trending.rebuild(beauty_catalog.all())
+    outfit_also_viewed.publish()
+    beauty_also_viewed.publish()
+
+async def trending_refresh_loop():
+    while True:
+        await asyncio.sleep(TRENDING_REFRESH_INTERVAL)
+        try:
+            await asyncio.to_thread(refresh_trending)
+        except Exception as e:
+            logger.warning(f"Trending refresh error: {e}")
+
+def refresh_similar():
+    """Fold catalog changes into the similar-items lists (a full build the first time)"""
+    for index, catalog in ((outfit_similar, outfit_catalog), (beauty_similar, beauty_catalog)):
+        if catalog.ready:
+            index.refresh(catalog.all)
+
+async def similar_refresh_loop():
+    while True:
+        try:
+            await asyncio.to_thread(refresh_similar)
+        except Exception as e:
+            logger.warning(f"Similar items refresh error: {e}")
+        await asyncio.sleep(SIMILAR_REFRESH_INTERVAL)
+
+async def weather_prefetch_loop():
+    """Refresh the busiest weather cells shortly before they expire, a batch at a time"""
+    while True:
+        await asyncio.sleep(WEATHER_PREFETCH_INTERVAL)
+        if not OPENWEATHER_API_KEY or budget.is_degraded('openweather'):
+            continue
+        cells = weather_cache.hot_cells(WEATHER_PREFETCH_CELLS, refresh_within=WEATHER_PREFETCH_INTERVAL * 1.5)
+        for i in range(0, len(cells), WEATHER_PREFETCH_BATCH):
+            await asyncio.gather(*(asyncio.to_thread(fetch_cell_weather, cell, True)
+                                   for cell in cells[i:i + WEATHER_PREFETCH_BATCH]), return_exceptions=True)
+
+async def persist_state_loop():
+    while True:
+        await asyncio.sleep(STATE_FLUSH_INTERVAL)
+        try:
+            await persist_state()
+        except Exception as e:
+            logger.warning(f"State flush error: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Check MongoDB, restore persisted provider state, load the catalog
+    snapshots, then keep state flushed and snapshots fresh in the background
+    """
+    if await mongo.ping():
+        logger.info(f"MongoDB connected: Database: {mongo.name}")
+        if os.environ.get('ENSURE_INDEXES', 'true').lower() != 'false':
+            await ensure_indexes(mongo.db)
+        for catalog in (product_catalog, outfit_catalog, beauty_catalog):
+            try:
+                await catalog.load()
+                logger.info(f"{catalog.name} snapshot loaded: {len(catalog)} documents")
+            except Exception as e:
+                logger.warning(f"Could not load {catalog.name} snapshot, serving from MongoDB: {e}")
+        for ranker in (outfit_trending, beauty_trending):
+            await ranker.load(analytics_collection)
+        for co, catalog in ((outfit_also_viewed, outfit_catalog), (beauty_also_viewed, beauty_catalog)):
+            await co.load(analytics_collection,
+                          keep=lambda item_id, catalog=catalog: not catalog.ready or catalog.get(item_id) is not None)
+        await asyncio.to_thread(refresh_trending)
+    await budget.load()
+    await tmdb_misses.load()
+    await people_index.load()
+    background = [asyncio.create_task(persist_state_loop()),
+                  asyncio.create_task(product_catalog.run()),
+                  asyncio.create_task(outfit_catalog.run()),
+                  asyncio.create_task(beauty_catalog.run()),
+                  asyncio.create_task(trending_refresh_loop()),
+                  asyncio.create_task(similar_refresh_loop()),
+                  asyncio.create_task(weather_prefetch_loop())]
+    try:
+        yield
+    finally:
+        for task in background:
+            task.cancel()
+        await persist_state()
+        mongo.close()
+
 # Create the main app
-app = FastAPI(title="CINESCAN API", version="1.0.0")
+app = FastAPI(title="CINESCAN API", version="1.0.0", lifespan=lifespan)
+
+async def tag_current_endpoint(request: Request):
+    """Attribute provider calls made while serving this request to its route"""
+    route = request.scope.get('route')
+    current_endpoint.set(getattr(route, 'path', request.url.path))
 
 # Create API router
-api_router = APIRouter(prefix="/api")
+api_router = APIRouter(prefix="/api", dependencies=[Depends(tag_current_endpoint)])
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# MongoDB connection
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017/')
-DB_NAME = os.environ.get('DB_NAME', 'app_database')
-mongo_client = MongoClient(MONGO_URL)
-db = mongo_client[DB_NAME]
-outfits_collection = db['outfits']
-beauty_collection = db['beauty_looks']
-analytics_collection = db['analytics']
+# MongoDB connection (async Motor client - pool/timeouts/read preference from env)
+mongo = Database()
+outfits_collection = mongo['outfits']
+beauty_collection = mongo['beauty_looks']
+analytics_collection = mongo['analytics']
+# Neighbor lists stored by `python similar_items.py` (fallback while the snapshots load)
+similar_items_collection = mongo['similar_items']
+# Shared product records referenced by outfits and looks (see products.py)
+products_collection = mongo['products']
+
+# In-process BM25 search over the catalog, fed by the catalog snapshots
+outfit_search = SearchIndex(OUTFIT_FIELDS, OUTFIT_FILTERS, sorts=('priceMinCents',))
+beauty_search = SearchIndex(BEAUTY_FIELDS, BEAUTY_FILTERS, sorts=('priceMinCents',))
+# Keystroke typeahead: catalog titles, celebrities, categories and TMDB titles we have seen
+suggest_index = SuggestIndex()
+
+# Read-mostly catalogs served from memory (change streams, polling fallback)
+outfit_catalog = CatalogSnapshot(outfits_collection, 'outfits', OUTFIT_INDEXED_FIELDS, CATALOG_POLL_INTERVAL,
+                                 card_fields=OUTFIT_CARD_FIELDS)
+beauty_catalog = CatalogSnapshot(beauty_collection, 'beauty_looks', BEAUTY_INDEXED_FIELDS, CATALOG_POLL_INTERVAL,
+                                 card_fields=BEAUTY_CARD_FIELDS)
+# Product cache: every product record in memory, loaded before the catalogs that reference it
+product_catalog = CatalogSnapshot(products_collection, 'products', (), CATALOG_POLL_INTERVAL)
+# Which documents reference each product, so a product change re-derives just those
+outfit_product_refs = ProductReferences()
+beauty_product_refs = ProductReferences()
+outfit_catalog.subscribe(outfit_product_refs.update)
+beauty_catalog.subscribe(beauty_product_refs.update)
+product_catalog.subscribe(product_listener)
+# Card projections for the MongoDB fallback paths
+OUTFIT_CARD_PROJECTION = card_projection(OUTFIT_CARD_FIELDS)
+BEAUTY_CARD_PROJECTION = card_projection(BEAUTY_CARD_FIELDS)
+outfit_catalog.subscribe(with_products(catalog_listener(outfit_search, 'outfit')))
+beauty_catalog.subscribe(with_products(catalog_listener(beauty_search, 'beauty')))
+# Content-based neighbors (TF-IDF cosine), precomputed per document and updated as documents change
+outfit_similar = SimilarIndex()
+beauty_similar = SimilarIndex()
+outfit_catalog.subscribe(with_products(outfit_similar.update))
+beauty_catalog.subscribe(with_products(beauty_similar.update))
+# Weather feature matrix (one row per outfit), re-featurized on every change
+weather_scorer = WeatherScorer()
+outfit_catalog.subscribe(with_products(weather_scorer.update))
+# Locations per /admin/weather/batch call
+WEATHER_BATCH_MAX_LOCATIONS = int(os.environ.get('WEATHER_BATCH_MAX_LOCATIONS', 1000))
+
+# Encoded (orjson) catalog responses with strong ETags, invalidated per changed document
+response_cache = ResponseCache(maxsize=int(os.environ.get('RESPONSE_CACHE_SIZE', 5000)))
+outfit_catalog.subscribe(response_invalidator(outfit_catalog))
+beauty_catalog.subscribe(response_invalidator(beauty_catalog))
+product_catalog.subscribe(response_invalidator(product_catalog))
+
+# Time-decayed engagement per catalog item (views, favorites, product clicks), ranked in the background
+outfit_trending = TrendingRanker(OUTFIT_EVENT_WEIGHTS, half_life=TRENDING_HALF_LIFE_HOURS * 3600)
+beauty_trending = TrendingRanker(BEAUTY_EVENT_WEIGHTS, half_life=TRENDING_HALF_LIFE_HOURS * 3600)
+# Session co-engagement ("also viewed"), folded in per tracked event, lists republished in the background
+outfit_also_viewed = CoEngagement(OUTFIT_EVENT_WEIGHTS)
+beauty_also_viewed = CoEngagement(BEAUTY_EVENT_WEIGHTS)
+
+# Cache-Control per route family: clients reuse a response for max-age seconds, then may show
+# it while revalidating (If-None-Match -> 304) for up to stale-while-revalidate seconds more
+CACHE_CONTROL = {
+    'catalog': "public, max-age=60, stale-while-revalidate=600",
+    'catalog_item': "public, max-age=300, stale-while-revalidate=3600",
+    'trending': "public, max-age=60",
+    'discover': "public, max-age=900, stale-while-revalidate=3600",
+    'movie': "public, max-age=3600, stale-while-revalidate=86400",
+}
+
+def encoded_response(entry: CachedResponse, request: Request = None, policy: str = None) -> Response:
+    """Cached bytes with their ETag; 304 with no body when the client already has them"""
+    headers = {"ETag": entry.etag}
+    if policy:
+        headers["Cache-Control"] = CACHE_CONTROL[policy]
+    if request is not None and etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+def cursor_position(cursor: str, ranked: bool = False, by_price: bool = False) -> dict:
+    """Keyset position in a continuation token (None for the first page); 400 if it is not one of ours"""
+    required = ('p', 'i') if by_price else ('s', 'i') if ranked else ('i',)
+    try:
+        position = decode_cursor(cursor, required=required)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if position and not ObjectId.is_valid(str(position['i'])):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if position and by_price and not isinstance(position['p'], int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return position
+
+async def mongo_page(collection, query: dict, size: int, position: dict = None, projection: dict = None):
+    """One keyset page (by _id) of a MongoDB query in API form, plus the next cursor (`size` None: everything)"""
+    if position:
+        query = {**query, "_id": {"$gt": ObjectId(position['i'])}}
+    cursor = collection.find(query, projection).sort("_id", 1)
+    if size is not None:
+        cursor = cursor.limit(size + 1)
+    docs = await cursor.to_list(length=None)
+    page = [to_api(doc) for doc in docs[:size]]
+    next_cursor = encode_cursor({"i": page[-1]['id']}) if size is not None and len(docs) > size else None
+    return page, next_cursor
+
+async def mongo_price_page(collection, query: dict, size: int, position: dict, direction: int,
+                           projection: dict = None):
+    """One keyset page ordered by (priceMinCents, _id), ascending or descending, over priced documents"""
+    query = {**query, "priceMinCents": {**query.get("priceMinCents", {}), "$type": "number"}}
+    if position:
+        op = "$gt" if direction > 0 else "$lt"
+        query = {"$and": [query, {"$or": [
+            {"priceMinCents": {op: position['p']}},
+            {"priceMinCents": position['p'], "_id": {op: ObjectId(position['i'])}},
+        ]}]}
+    if projection is not None:
+        projection = {**projection, "priceMinCents": 1}
+    docs = await collection.find(query, projection).sort(
+        [("priceMinCents", direction), ("_id", direction)]).limit(size + 1).to_list(length=None)
+    page = [to_api(doc) for doc in docs[:size]]
+    next_cursor = encode_cursor({"p": page[-1]['priceMinCents'], "i": page[-1]['id']}) if len(docs) > size else None
+    return page, next_cursor
+
+def catalog_listing(request: Request, catalog: CatalogSnapshot, list_key: str, filters: dict,
+                    extra: dict = None, size: int = None, position: dict = None) -> Response:
+    """Cached encoded page of snapshot cards matching `filters`, with its next cursor (`size` None: everything)"""
+    after = position['i'] if position else None
+    tags = [f"{catalog.name}:{field}:{value}" for field, value in filters.items()]
+    key = f"list|{'|'.join(tags)}|{after or ''}|{size or 'all'}"
+    entry = response_cache.get(key)
+    if entry is None:
+        generation = response_cache.generation
+        docs = catalog.find(limit=size + 1 if size is not None else None, after=after, cards=True, **filters)
+        page = docs[:size]
+        next_cursor = encode_cursor({"i": page[-1]['id']}) if size is not None and len(docs) > size else None
+        deps = tags + [f"{catalog.name}:{doc['id']}" for doc in docs]
+        payload = {list_key: page, **(extra or {}), "next_cursor": next_cursor}
+        entry = response_cache.put(key, payload, deps, generation)
+    return encoded_response(entry, request, 'catalog')
+
+def catalog_item(request: Request, catalog: CatalogSnapshot, item_key: str, doc_id: str):
+    """Cached encoded item response, or None if the snapshot has no such document"""
+    key = f"item|{catalog.name}:{doc_id}"
+    entry = response_cache.get(key)
+    if entry is None:
+        generation = response_cache.generation
+        doc = catalog.get(doc_id)
+        if doc is None:
+            return None
+        deps = [f"{catalog.name}:{doc_id}"] + [f"{product_catalog.name}:{pid}" for pid in product_ids(doc)]
+        entry = response_cache.put(key, {"success": True, item_key: hydrate(doc, product_catalog.get)}, deps,
+                                   generation)
+    return encoded_response(entry, request, 'catalog_item')
+
+def trending_feed(request: Request, catalog: CatalogSnapshot, ranker: TrendingRanker, list_key: str,
+                  category: str = None, size: int = 10, randomize: bool = False) -> Response:
+    """
+    Cards of the top trending items. The ranked order is cached per ranking
+    version; a randomized draw is encoded fresh for every request.
+    """
+    if randomize:
+        ids = ranker.top(size, category, randomize=True)
+        payload = {list_key: [card for card in map(catalog.card, ids) if card is not None]}
+        return encoded_response(CachedResponse.from_payload(payload), policy='trending')
+    key = f"trending|{catalog.name}|{category or ''}|{size}|{ranker.version}"
+    entry = response_cache.get(key)
+    if entry is None:
+        generation = response_cache.generation
+        ids = ranker.top(size, category)
+        payload = {list_key: [card for card in map(catalog.card, ids) if card is not None]}
+        entry = response_cache.put(key, payload, [f"{catalog.name}:{doc_id}" for doc_id in ids], generation)
+    return encoded_response(entry, request, 'trending')
+
+def record_engagement(event: dict):
+    """Fold a tracked event into the trending scores and session co-engagement of whichever catalog holds the item"""
+    item_id = event.get('item_id')
+    if not item_id:
+        return
+    for ranker, co, catalog in ((outfit_trending, outfit_also_viewed, outfit_catalog),
+                                (beauty_trending, beauty_also_viewed, beauty_catalog)):
+        if event['event_type'] in ranker.weights and (not catalog.ready or catalog.get(item_id) is not None):
+            ranker.record(item_id, event['event_type'], event['timestamp'])
+            co.record(event.get('session_id'), item_id, event['event_type'], event['timestamp'])
+
+logger.info(f"MongoDB client configured: Database: {mongo.name}, pool size: {mongo.options['maxPoolSize']}")
+
+# Provider quota tracking (Vision, AudD, Whisper, TMDB, OpenWeather)
+budget = BudgetManager(mongo['provider_usage'])
+
+# Known-miss cache for TMDB searches (Bloom filter persisted across restarts)
+tmdb_misses = NegativeCache(mongo['cache_state'], ttl=float(os.environ.get('TMDB_MISS_TTL', 600)))
 
-logger.info(f"MongoDB connected: {MONGO_URL}, Database: {DB_NAME}")
+# Positive TMDB caches: normalized query -> top results, movie id -> details
+tmdb_search_cache = TTLCache(maxsize=5000, ttl=6 * 3600)
+tmdb_details_cache = TTLCache(maxsize=256, ttl=6 * 3600)
+
+ADMIN_API_KEY = os.environ.get('ADMIN_API_KEY')
+# Local development only: open the admin endpoints when no ADMIN_API_KEY is set
+ADMIN_OPEN = os.environ.get('ADMIN_OPEN', '').lower() in ('1', 'true', 'yes')
+
+def is_admin_request(request: Request) -> bool:
+    """Admin endpoints require X-Admin-Key; with no ADMIN_API_KEY they stay closed unless ADMIN_OPEN is set"""
+    if not ADMIN_API_KEY:
+        return ADMIN_OPEN
+    return hmac.compare_digest(request.headers.get('x-admin-key', ''), ADMIN_API_KEY)
 
 # Pydantic Models
 class AudioRecognitionRequest(BaseModel):
@@ -56,6 +446,19 @@ class VideoRecognitionRequest(BaseModel):
 class SearchRequest(BaseModel):
     query: str
 
+class BatchRequest(BaseModel):
+    ids: list[str]
+    cards: bool = False  # card projections instead of full documents
+
+class WeatherLocation(BaseModel):
+    temp: float  # Fahrenheit
+    condition: str = None  # OpenWeatherMap condition ("Rain", "Clear", ...)
+    key: str = None  # caller's id for the location (user, cell, ...), echoed back
+
+class WeatherBatchRequest(BaseModel):
+    locations: list[WeatherLocation]
+    limit: int = 6
+
 # Analytics Models
 class AnalyticsEvent(BaseModel):
     event_type: str  # product_click, outfit_view, beauty_view, category_view
@@ -70,8 +473,34 @@ class AnalyticsEvent(BaseModel):
     timestamp: float = None
 
 # Helper Functions
-def search_tmdb_movie(query: str):
-    """Search for a movie in TMDB database"""
+
+# Movie titles offered as typeahead suggestions, oldest evicted first
+MAX_SUGGESTED_MOVIES = 5000
+suggested_movies = OrderedDict()
+# TMDB searches run both on the event loop and in worker threads (unified search)
+suggested_movies_lock = threading.Lock()
+
+def remember_movie_title(movie: dict):
+    """Offer a TMDB movie we have already fetched as a typeahead suggestion (and known title)"""
+    if not movie.get('id') or not movie.get('title'):
+        return
+    with suggested_movies_lock:
+        suggested_movies[movie['id']] = True
+        suggested_movies.move_to_end(movie['id'])
+        suggest_index.set_source(f"movie:{movie['id']}", [('movie', movie['title'])])
+        # A title TMDB returned is never worth a /search/person call
+        people_index.add_title(movie['title'])
+        while len(suggested_movies) > MAX_SUGGESTED_MOVIES:
+            evicted, _ = suggested_movies.popitem(last=False)
+            suggest_index.remove_source(f"movie:{evicted}")
+
+TMDB_RESULT_FIELDS = ('id', 'title', 'original_title', 'popularity', 'release_date', 'poster_path')
+
+def search_tmdb_results(query: str) -> list:
+    """
+    Top TMDB search results for a query (slim: id, titles, popularity, release
+    date, poster), cached by normalized query. Empty list on a miss or error.
+    """
     try:
         # Clean up the query - remove newlines and limit length
         clean_query = query.replace('\n', ' ').strip()
@@ -83,6 +512,21 @@ def search_tmdb_movie(query: str):
             # Look for common movie title patterns or just use first few words
             clean_query = ' '.join(words[:10])
         
+        # Case/punctuation variants of the query sent share one cache entry
+        cache_key = search_key(clean_query)
+        if not cache_key:
+            return []
+        cached = tmdb_search_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        # Junk OCR/dialogue phrases that already came back empty skip the round trip
+        if tmdb_misses.is_known_miss(cache_key):
+            return []
+        
+        if not budget.acquire('tmdb'):
+            return []
+        
         url = "https://api.themoviedb.org/3/search/movie"
         params = {
             'api_key': TMDB_API_KEY,
@@ -93,17 +537,39 @@ def search_tmdb_movie(query: str):
         response.raise_for_status()
         data = response.json()
         
-        if data.get('results') and len(data['results']) > 0:
-            movie = data['results'][0]
-            return get_movie_details(movie['id'])
-        return None
+        # Titles are normalized here, once, rather than on every scoring pass over the cached results
+        results = with_title_keys([
+            {field: movie.get(field) for field in TMDB_RESULT_FIELDS}
+            for movie in data.get('results', [])[:TITLE_SCORER_TOP_N]
+        ])
+        if results:
+            tmdb_search_cache.set(cache_key, results)
+            for movie in results:
+                remember_movie_title(movie)
+        else:
+            tmdb_misses.add(cache_key)
+        return results
     except Exception as e:
         logger.error(f"TMDB search error: {e}")
-        return None
+        return []
+
+def search_tmdb_movie(query: str):
+    """Search for a movie in TMDB database (details of the top result)"""
+    results = search_tmdb_results(query)
+    if results:
+        return get_movie_details(results[0]['id'])
+    return None
 
 def get_movie_details(movie_id: int):
     """Get detailed movie information from TMDB including watch providers"""
     try:
+        cached = tmdb_details_cache.get(movie_id)
+        if cached is not None:
+            return cached
+        
+        if not budget.acquire('tmdb'):
+            return None
+        
         url = f"https://api.themoviedb.org/3/movie/{movie_id}"
         params = {
             'api_key': TMDB_API_KEY,
@@ -112,7 +578,10 @@ def get_movie_details(movie_id: int):
         }
         response = requests.get(url, params=params, timeout=10)
         response.raise_for_status()
-        return response.json()
+        details = response.json()
+        tmdb_details_cache.set(movie_id, details)
+        remember_movie_title(details)
+        return details
     except Exception as e:
         logger.error(f"TMDB details error: {e}")
         return None
@@ -120,6 +589,9 @@ def get_movie_details(movie_id: int):
 def recognize_image_with_google_vision(image_content: bytes):
     """Use Google Vision API with WEB DETECTION for movie recognition"""
     try:
+        if not budget.acquire('vision'):
+            return {'web_entities': [], 'best_guess': [], 'text': []}
+        
         url = f"https://vision.googleapis.com/v1/images:annotate?key={GOOGLE_VISION_API_KEY}"
         image_base64 = base64.b64encode(image_content).decode('utf-8')
         
@@ -184,6 +656,9 @@ def recognize_audio_with_audd(audio_base64: str):
         if 'base64,' in audio_base64:
             audio_base64 = audio_base64.split('base64,')[1]
         
+        if not budget.acquire('audd'):
+            return None
+        
         url = "https://api.audd.io/"
         data = {
             'api_token': AUDD_API_KEY,
@@ -205,6 +680,146 @@ def recognize_audio_with_audd(audio_base64: str):
         logger.error(f"AudD error: {e}")
         return None
 
+def search_tmdb_person(name: str):
+    """TMDB /search/person results for a name, or None if the lookup is unavailable"""
+    try:
+        if not budget.acquire('tmdb'):
+            return None
+        url = "https://api.themoviedb.org/3/search/person"
+        params = {'api_key': TMDB_API_KEY, 'query': name, 'language': 'en-US'}
+        response = requests.get(url, params=params, timeout=10)
+        response.raise_for_status()
+        return response.json().get('results', [])[:5]
+    except Exception as e:
+        logger.error(f"TMDB person search error: {e}")
+        return None
+
+def get_person_movie_credits(person_id: int) -> list:
+    """Slim movies a person acted in or crewed on, most popular first (cached)"""
+    cached = person_credits_cache.get(person_id)
+    if cached is not None:
+        return cached
+    try:
+        if not budget.acquire('tmdb'):
+            return []
+        url = f"https://api.themoviedb.org/3/person/{person_id}/movie_credits"
+        params = {'api_key': TMDB_API_KEY, 'language': 'en-US'}
+        response = requests.get(url, params=params, timeout=10)
+        response.raise_for_status()
+        data = response.json()
+        movies = {}
+        for credit in data.get('cast', []) + data.get('crew', []):
+            if credit.get('id') not in movies:
+                movies[credit['id']] = {field: credit.get(field) for field in TMDB_RESULT_FIELDS}
+        credits = with_title_keys(sorted(movies.values(), key=lambda m: m.get('popularity') or 0, reverse=True))
+        person_credits_cache.set(person_id, credits)
+        return credits
+    except Exception as e:
+        logger.error(f"TMDB person credits error: {e}")
+        return []
+
+# Person vs title classification for Vision entities (persisted verdicts)
+person_credits_cache = TTLCache(maxsize=1000, ttl=24 * 3600)
+people_index = PeopleIndex(mongo['tmdb_people'], search_person=search_tmdb_person)
+
+# At most this many recognized people are expanded into their credits per image
+MAX_PEOPLE_PER_IMAGE = 3
+
+def match_web_entities(web_entities: list, seen_queries: set, limit: int = 25,
+                       single_person_fallback: bool = False):
+    """
+    Find the movie a set of Vision entities describes. Returns
+    {'movie_id', 'title', 'query', 'similarity', 'score'} or None.
+    
+    People (actors, directors) are recognized through the people index and
+    expanded with one /person/{id}/movie_credits call each; title entities are
+    first matched against those credits in-process, then people are
+    intersected with each other. Only if that fails is each title entity sent
+    to TMDB search. With `single_person_fallback`, a lone recognized person
+    yields their most popular film.
+    """
+    people, titles = [], []
+    for entity in web_entities[:limit]:
+        query = entity['text']
+        
+        # Skip generic movie-related terms
+        if is_generic(query):
+            logger.info(f"Skipping generic term: '{query}'")
+            continue
+        
+        # Skip case/punctuation variants of a query already tried ("Inception" / "inception.")
+        if not dedupe_queries([query], seen_queries):
+            continue
+        
+        person = people_index.lookup(query)
+        if person:
+            logger.info(f"  👤 PERSON: '{query}' (TMDB person {person['id']})")
+            people.append((entity, person))
+        else:
+            titles.append(entity)
+    
+    # Person evidence: one credits call per recognized person
+    credit_lists = [get_person_movie_credits(person['id']) for _, person in people[:MAX_PEOPLE_PER_IMAGE]]
+    credit_lists = [credits for credits in credit_lists if credits]
+    if credit_lists:
+        shared_counts = {}
+        credited = {}
+        for credits in credit_lists:
+            for movie in credits:
+                credited.setdefault(movie['id'], movie)
+                shared_counts[movie['id']] = shared_counts.get(movie['id'], 0) + 1
+        # Movies shared by more people first, then by popularity
+        credited_movies = sorted(credited.values(),
+                                 key=lambda m: (shared_counts[m['id']], m.get('popularity') or 0),
+                                 reverse=True)
+        
+        for entity in titles:
+            match = best_match(entity['text'], credited_movies, entity.get('score', 0), top_n=len(credited_movies))
+            if match and match[1] >= MATCH_THRESHOLD:
+                score, similarity, result = match
+                logger.info(f"  ✅ CREDITS MATCH: '{entity['text']}' → '{result.get('title')}' (similarity {similarity:.2f})")
+                return {'movie_id': result['id'], 'title': result.get('title'), 'query': entity['text'],
+                        'similarity': similarity, 'score': score}
+        
+        top = credited_movies[0]
+        if shared_counts[top['id']] >= 2 or (single_person_fallback and not titles):
+            names = ', '.join(entity['text'] for entity, _ in people)
+            logger.info(f"  ✅ PEOPLE MATCH: {names} → '{top.get('title')}'")
+            return {'movie_id': top['id'], 'title': top.get('title'), 'query': names,
+                    'similarity': shared_counts[top['id']] / len(credit_lists), 'score': 0.0}
+    
+    best = None
+    for entity in titles:
+        query = entity['text']
+        match = best_match(query, search_tmdb_results(query), entity.get('score', 0))
+        if not match:
+            continue
+        score, similarity, result = match
+        
+        # Low similarity means the entity hit a different title - usually an actor/director name
+        if similarity < MATCH_THRESHOLD:
+            logger.info(f"  ❌ WEAK: '{query}' → '{result.get('title')}' (similarity {similarity:.2f})")
+            continue
+        
+        logger.info(f"  ✅ MATCH: '{query}' → '{result.get('title')}' (similarity {similarity:.2f}, score {score:.3f})")
+        if best is None or score > best['score']:
+            best = {
+                'movie_id': result['id'],
+                'title': result.get('title'),
+                'query': query,
+                'similarity': similarity,
+                'score': score
+            }
+        if similarity >= PERFECT_THRESHOLD:
+            break
+    
+    if best is None and single_person_fallback and credit_lists:
+        top = credit_lists[0][0]
+        logger.info(f"  ✅ PERSON FALLBACK: '{people[0][0]['text']}' → '{top.get('title')}'")
+        best = {'movie_id': top['id'], 'title': top.get('title'), 'query': people[0][0]['text'],
+                'similarity': 0.0, 'score': 0.0}
+    return best
+
 # API Endpoints
 @api_router.get("/")
 async def root():
@@ -232,9 +847,12 @@ async def recognize_image(file: UploadFile = File(...)):
         logger.info(f"Web entities: {web_entities[:5]}")
         logger.info(f"Best guess: {best_guess}")
         
+        # Normalized queries already sent to TMDB during this request
+        seen_queries = set()
+        
         # STRATEGY 1: Try best guess labels first (most accurate for posters)
         if best_guess:
-            for guess in best_guess[:3]:
+            for guess in dedupe_queries(best_guess[:3], seen_queries):
                 logger.info(f"Trying best guess: '{guess}'")
                 movie = search_tmdb_movie(guess)
                 if movie:
@@ -246,84 +864,22 @@ async def recognize_image(file: UploadFile = File(...)):
                     }
         
         # STRATEGY 2: SMART entity matching - key insight: entity name should match movie title
+        # Each entity costs one TMDB search; details are fetched only for the winner
         if web_entities:
-            movie_candidates = []
-            
-            # Filter out generic terms that shouldn't be searched
-            generic_terms = ['video', 'film', 'movie', 'scene', 'poster', 'film poster', 'movie poster', 
-                            'illustration', 'artwork', 'cinema', 'hollywood', 'actor', 'actress',
-                            'director', 'crime film', 'drama', 'thriller', 'action film', 'comedy']
-            
-            for entity in web_entities[:25]:
-                query = entity['text']
-                entity_lower = query.lower().strip()
-                
-                # Skip generic movie-related terms
-                if entity_lower in generic_terms:
-                    logger.info(f"Skipping generic term: '{query}'")
-                    continue
-                
-                logger.info(f"Checking: '{query}'")
-                movie = search_tmdb_movie(query)
-                
+            best = match_web_entities(web_entities, seen_queries)
+            if best:
+                movie = get_movie_details(best['movie_id'])
                 if movie:
-                    movie_title = movie.get('title', '').lower().strip()
-                    
-                    # CRITICAL: Check if entity name matches the movie title
-                    # If entity="Inception" and movie="Inception" → REAL MATCH
-                    # If entity="Leonardo DiCaprio" and movie="Leonardo" → ACTOR, NOT THE MOVIE
-                    
-                    # Remove common words for matching
-                    entity_clean = entity_lower.replace('the ', '').replace('a ', '').strip()
-                    title_clean = movie_title.replace('the ', '').replace('a ', '').strip()
-                    
-                    match_score = 0
-                    
-                    # Perfect match: entity and title are the same
-                    if entity_clean == title_clean or entity_lower == movie_title:
-                        match_score = 10000  # HIGHEST PRIORITY
-                        logger.info(f"  ✅ PERFECT: '{query}' = '{movie.get('title')}'")
-                    
-                    # Very close match: one contains the other fully
-                    elif entity_clean in title_clean and len(entity_clean) > 5:
-                        match_score = 5000
-                        logger.info(f"  ✅ STRONG: '{query}' in '{movie.get('title')}'")
-                    
-                    elif title_clean in entity_clean and len(title_clean) > 5:
-                        match_score = 4000
-                        logger.info(f"  ✅ STRONG: '{movie.get('title')}' in '{query}'")
-                    
-                    # Weak match - likely actor/director
-                    else:
-                        match_score = 1  # Very low score
-                        logger.info(f"  ❌ WEAK: '{query}' → '{movie.get('title')}' (probably actor)")
-                    
-                    movie_candidates.append({
-                        'movie': movie,
-                        'query': query,
-                        'match_score': match_score,
-                        'entity_score': entity['score']
-                    })
-            
-            # Sort by match_score first (perfect matches win), then entity_score
-            if movie_candidates:
-                movie_candidates.sort(key=lambda x: x['match_score'], reverse=True)
-                best = movie_candidates[0]
-                
-                # Only return if match_score is high enough (avoid actor names)
-                if best['match_score'] >= 4000:
-                    logger.info(f"🎯 SELECTED: '{best['movie'].get('title')}' (match_score: {best['match_score']})")
+                    logger.info(f"🎯 SELECTED: '{movie.get('title')}' (similarity: {best['similarity']:.2f})")
                     return {
                         "success": True,
                         "source": "Web Detection",
-                        "movie": best['movie']
+                        "movie": movie
                     }
-                else:
-                    logger.info(f"⚠️  Best match score too low: {best['match_score']} for '{best['query']}'")
-
         
         # STRATEGY 3: Fall back to text detection (old method)
-        if detected_texts and len(detected_texts) > 0:
+        # Skipped when the TMDB budget is nearly used up - it costs up to 40 searches
+        if detected_texts and len(detected_texts) > 0 and not budget.is_degraded('tmdb'):
             logger.info("Falling back to text detection")
             
             # Get all text, extract words
@@ -338,7 +894,7 @@ async def recognize_image(file: UploadFile = File(...)):
                 if words[i].lower() not in skip_words:
                     # Try 2-word combo
                     query = f"{words[i]} {words[i+1]}"
-                    movie = search_tmdb_movie(query)
+                    movie = search_tmdb_movie(query) if dedupe_queries([query], seen_queries) else None
                     if movie:
                         logger.info(f"✅ FOUND via text: '{movie.get('title')}'")
                         return {
@@ -350,7 +906,7 @@ async def recognize_image(file: UploadFile = File(...)):
                     # Try 3-word combo
                     if i < len(words) - 2:
                         query = f"{words[i]} {words[i+1]} {words[i+2]}"
-                        movie = search_tmdb_movie(query)
+                        movie = search_tmdb_movie(query) if dedupe_queries([query], seen_queries) else None
                         if movie:
                             logger.info(f"✅ FOUND via text: '{movie.get('title')}'")
                             return {
@@ -414,9 +970,12 @@ async def recognize_image_base64(request: Request):
         logger.info(f"Web entities: {web_entities[:5]}")
         logger.info(f"Best guess: {best_guess}")
         
+        # Normalized queries already sent to TMDB during this request
+        seen_queries = set()
+        
         # STRATEGY 1: Try best guess labels first
         if best_guess:
-            for guess in best_guess[:3]:
+            for guess in dedupe_queries(best_guess[:3], seen_queries):
                 logger.info(f"Trying best guess: '{guess}'")
                 movie = search_tmdb_movie(guess)
                 if movie:
@@ -429,67 +988,26 @@ async def recognize_image_base64(request: Request):
         
         # STRATEGY 2: SMART entity matching
         if web_entities:
-            movie_candidates = []
-            generic_terms = ['video', 'film', 'movie', 'scene', 'poster', 'film poster', 'movie poster', 
-                            'illustration', 'artwork', 'cinema', 'hollywood', 'actor', 'actress',
-                            'director', 'crime film', 'drama', 'thriller', 'action film', 'comedy']
-            
-            for entity in web_entities[:25]:
-                query = entity['text']
-                entity_lower = query.lower().strip()
-                
-                if entity_lower in generic_terms:
-                    logger.info(f"Skipping generic term: '{query}'")
-                    continue
-                
-                logger.info(f"Checking: '{query}'")
-                movie = search_tmdb_movie(query)
-                
+            best_match_entity = match_web_entities(web_entities, seen_queries)
+            if best_match_entity:
+                movie = get_movie_details(best_match_entity['movie_id'])
                 if movie:
-                    movie_title = movie.get('title', '').lower().strip()
-                    entity_clean = entity_lower.replace('the ', '').replace('a ', '').strip()
-                    title_clean = movie_title.replace('the ', '').replace('a ', '').strip()
-                    
-                    match_score = 0
-                    
-                    if entity_clean == title_clean or entity_lower == movie_title:
-                        match_score = 10000
-                        logger.info(f"  ✅ PERFECT: '{query}' = '{movie.get('title')}'")
-                    elif entity_clean in title_clean and len(entity_clean) > 5:
-                        match_score = 5000
-                        logger.info(f"  ✅ STRONG: '{query}' in '{movie.get('title')}'")
-                    elif title_clean in entity_clean and len(title_clean) > 5:
-                        match_score = 4000
-                        logger.info(f"  ✅ STRONG: '{movie.get('title')}' in '{query}'")
-                    else:
-                        match_score = 100
-                        logger.info(f"  ⚠️ WEAK: '{query}' -> '{movie.get('title')}'")
-                    
-                    movie_candidates.append({
-                        'movie': movie,
-                        'score': match_score,
-                        'query': query
-                    })
-            
-            if movie_candidates:
-                movie_candidates.sort(key=lambda x: x['score'], reverse=True)
-                best_match = movie_candidates[0]
-                
-                if best_match['score'] >= 4000:
-                    logger.info(f"✅ BEST MATCH: '{best_match['query']}' -> '{best_match['movie'].get('title')}' (score: {best_match['score']})")
+                    logger.info(f"✅ BEST MATCH: '{best_match_entity['query']}' -> '{movie.get('title')}' (similarity: {best_match_entity['similarity']:.2f})")
                     return {
                         "success": True,
                         "source": "Google Web Detection (Entity Match)",
-                        "movie": best_match['movie']
+                        "movie": movie
                     }
         
-        # STRATEGY 3: Text detection fallback
-        if detected_texts:
+        # STRATEGY 3: Text detection fallback (skipped when TMDB budget is nearly used up)
+        if detected_texts and not budget.is_degraded('tmdb'):
             words = detected_texts[0].split()
             
             for i in range(len(words)):
                 if i < len(words) - 1:
                     query = f"{words[i]} {words[i+1]}"
+                    if not dedupe_queries([query], seen_queries):
+                        continue
                     movie = search_tmdb_movie(query)
                     if movie:
                         logger.info(f"✅ FOUND via text: '{movie.get('title')}'")
@@ -527,6 +1045,13 @@ async def recognize_music_base64(request: dict):
         logger.info(f"Received base64 audio, length: {len(audio_base64)}")
         
         # Use AudD to identify the song (including lyrics)
+        if not budget.acquire('audd'):
+            return {
+                "success": False,
+                "error": "Music recognition is temporarily unavailable. Please try again later.",
+                "song": None
+            }
+        
         try:
             audd_url = "https://api.audd.io/"
             audd_data = {
@@ -595,6 +1120,13 @@ async def recognize_music(file: UploadFile = File(...)):
         
         # Use AudD to identify the song
         logger.info("🎵 Identifying song with AudD...")
+        if not budget.acquire('audd'):
+            return {
+                "success": False,
+                "error": "Music recognition is temporarily unavailable. Please try again later.",
+                "song": None
+            }
+        
         try:
             audd_url = "https://api.audd.io/"
             audd_data = {
@@ -683,7 +1215,7 @@ async def recognize_audio(file: UploadFile = File(...)):
                 f.write(base64.b64decode(audio_base64))
             
             # Use OpenAI Whisper to transcribe
-            if OPENAI_API_KEY:
+            if OPENAI_API_KEY and budget.acquire('whisper'):
                 with open(temp_audio_path, 'rb') as f:
                     whisper_response = requests.post(
                         'https://api.openai.com/v1/audio/transcriptions',
@@ -697,16 +1229,19 @@ async def recognize_audio(file: UploadFile = File(...)):
                     transcription = whisper_response.json().get('text', '')
                     logger.info(f"Transcribed: {transcription[:100]}...")
                     
-                    if transcription and len(transcription) > 10:
+                    if transcription and len(transcription) > 10 and not budget.is_degraded('tmdb'):
                         # Try searching TMDB with the dialogue/transcription
                         # Look for famous quotes or movie titles in the text
                         words = transcription.split()
                         
-                        # Try different combinations
+                        # Try different combinations (skipping windows that normalize the same)
+                        seen_queries = set()
                         for i in range(min(len(words), 10)):
                             for length in [5, 4, 3, 2]:
                                 if i + length <= len(words):
                                     query = ' '.join(words[i:i+length])
+                                    if not dedupe_queries([query], seen_queries):
+                                        continue
                                     movie = search_tmdb_movie(query)
                                     if movie:
                                         logger.info(f"✅ Found movie from dialogue: {movie.get('title')}")
@@ -780,61 +1315,27 @@ async def recognize_video(file: UploadFile = File(...)):
                 
                 logger.info(f"Video frame best guess: {best_guess}")
                 
+                # Normalized queries already sent to TMDB for this frame
+                seen_queries = set()
+                
                 # Try best guess
                 if best_guess:
-                    for guess in best_guess[:3]:
+                    for guess in dedupe_queries(best_guess[:3], seen_queries):
                         movie = search_tmdb_movie(guess)
                         if movie:
                             logger.info(f"✅ VISUAL: Found '{movie.get('title')}' from frame")
                             visual_movie = movie
                             break
                 
-                # Try web entities if no best guess match
+                # Try web entities if no best guess match - actors in a scene are
+                # recognized through the people index and resolved via their credits
                 if not visual_movie and web_entities:
-                    # Common actor names that might appear in movie scenes
-                    actor_keywords = ['will smith', 'tom hanks', 'leonardo dicaprio', 'brad pitt', 
-                                     'morgan freeman', 'samuel jackson', 'denzel washington',
-                                     'robert downey', 'chris evans', 'scarlett johansson']
-                    
-                    # Filter out generic terms
-                    generic_terms = ['video', 'film', 'movie', 'scene', 'poster', 'film poster', 'movie poster',
-                                    'illustration', 'artwork', 'cinema', 'hollywood', 'actor', 'actress',
-                                    'director', 'crime film', 'drama', 'thriller', 'action film', 'comedy']
-                    
-                    # Try entities that look like movie titles first
-                    for entity in web_entities[:20]:
-                        query = entity['text']
-                        entity_lower = query.lower().strip()
-                        
-                        if entity_lower in generic_terms:
-                            continue
-                        
-                        # If it's an actor name, search for their recent movies
-                        is_actor = any(actor in entity_lower for actor in actor_keywords)
-                        
-                        if is_actor:
-                            # For actor names, search TMDB for their movies and pick most popular
-                            logger.info(f"Detected actor: '{query}' - searching their movies")
-                            movie = search_tmdb_movie(query + " movie")
-                        else:
-                            movie = search_tmdb_movie(query)
-                        
+                    best = match_web_entities(web_entities, seen_queries, limit=20, single_person_fallback=True)
+                    if best:
+                        movie = get_movie_details(best['movie_id'])
                         if movie:
-                            movie_title = movie.get('title', '').lower().strip()
-                            entity_clean = entity_lower.replace('the ', '').replace('a ', '').strip()
-                            title_clean = movie_title.replace('the ', '').replace('a ', '').strip()
-                            
-                            # For non-actor entities, require better match
-                            if not is_actor:
-                                if entity_clean == title_clean or entity_clean in title_clean:
-                                    logger.info(f"✅ VISUAL: Found '{movie.get('title')}' from entity")
-                                    visual_movie = movie
-                                    break
-                            else:
-                                # For actor searches, take the result
-                                logger.info(f"✅ VISUAL: Found '{movie.get('title')}' from actor")
-                                visual_movie = movie
-                                break
+                            logger.info(f"✅ VISUAL: Found '{movie.get('title')}' from '{best['query']}'")
+                            visual_movie = movie
             
             # METHOD 2: Extract audio for soundtrack recognition
             logger.info("🎵 Attempting audio recognition from video soundtrack...")
@@ -925,87 +1426,97 @@ async def search_movie(request: SearchRequest):
             "movie": None
         }
 
-@api_router.get("/discover/trending")
-async def get_trending():
-    """Get trending movies"""
+# TMDB discover feeds: feed -> {"entry": encoded response, "fetched_at": unix time}
+discover_feed_cache = {}
+
+DISCOVER_FEEDS = {
+    'trending': "https://api.themoviedb.org/3/trending/movie/week",
+    'popular': "https://api.themoviedb.org/3/movie/popular",
+    'upcoming': "https://api.themoviedb.org/3/movie/upcoming",
+}
+
+# How long a fetched discover feed is served before TMDB is asked again
+DISCOVER_FEED_TTL = float(os.environ.get('DISCOVER_FEED_TTL', 900))
+
+def discover_feed(feed: str, request: Request):
+    """
+    One TMDB discover feed, encoded once per fetch. Served from memory for
+    DISCOVER_FEED_TTL seconds, and past that whenever the TMDB budget runs
+    low or TMDB fails.
+    """
+    if not TMDB_API_KEY:
+        logger.error("TMDB_API_KEY is missing or empty!")
+        return {"results": [], "error": "TMDB API key not configured"}
+    
+    cached = discover_feed_cache.get(feed)
+    if cached and (time.time() - cached['fetched_at'] < DISCOVER_FEED_TTL or budget.is_degraded('tmdb')):
+        return encoded_response(cached['entry'], request, 'discover')
+    
     try:
-        if not TMDB_API_KEY:
-            logger.error("TMDB_API_KEY is missing or empty!")
-            return {"results": [], "error": "TMDB API key not configured"}
-        
-        url = f"https://api.themoviedb.org/3/trending/movie/week"
-        params = {'api_key': TMDB_API_KEY}
+        if not budget.acquire('tmdb'):
+            if cached:
+                return encoded_response(cached['entry'], request, 'discover')
+            return {"results": [], "error": "TMDB budget exhausted"}
         
-        response = requests.get(url, params=params, timeout=10)
+        response = requests.get(DISCOVER_FEEDS[feed], params={'api_key': TMDB_API_KEY}, timeout=10)
         response.raise_for_status()
         
-        logger.info(f"Successfully fetched trending movies (status: {response.status_code})")
-        return response.json()
+        logger.info(f"Successfully fetched {feed} movies (status: {response.status_code})")
+        entry = CachedResponse.from_payload(response.json())
+        discover_feed_cache[feed] = {'entry': entry, 'fetched_at': time.time()}
+        return encoded_response(entry, request, 'discover')
     except requests.exceptions.HTTPError as e:
         logger.error(f"TMDB API HTTP error: {e.response.status_code} - {e.response.text}")
+        if cached:
+            return encoded_response(cached['entry'], request, 'discover')
         return {"results": [], "error": f"TMDB API error: {e.response.status_code}"}
     except Exception as e:
-        logger.error(f"Trending error: {e}")
+        logger.error(f"{feed.capitalize()} error: {e}")
+        if cached:
+            return encoded_response(cached['entry'], request, 'discover')
         return {"results": [], "error": str(e)}
 
+@api_router.get("/discover/trending")
+async def get_trending(request: Request):
+    """Get trending movies"""
+    return discover_feed('trending', request)
+
 @api_router.get("/discover/popular")
-async def get_popular():
+async def get_popular(request: Request):
     """Get popular movies"""
-    try:
-        if not TMDB_API_KEY:
-            logger.error("TMDB_API_KEY is missing or empty!")
-            return {"results": [], "error": "TMDB API key not configured"}
-        
-        url = f"https://api.themoviedb.org/3/movie/popular"
-        params = {'api_key': TMDB_API_KEY}
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        
-        logger.info(f"Successfully fetched popular movies (status: {response.status_code})")
-        return response.json()
-    except requests.exceptions.HTTPError as e:
-        logger.error(f"TMDB API HTTP error: {e.response.status_code}")
-        return {"results": [], "error": f"TMDB API error: {e.response.status_code}"}
-    except Exception as e:
-        logger.error(f"Popular error: {e}")
-        return {"results": [], "error": str(e)}
+    return discover_feed('popular', request)
 
 @api_router.get("/discover/upcoming")
-async def get_upcoming():
+async def get_upcoming(request: Request):
     """Get upcoming movies"""
-    try:
-        if not TMDB_API_KEY:
-            logger.error("TMDB_API_KEY is missing or empty!")
-            return {"results": [], "error": "TMDB API key not configured"}
-        
-        url = f"https://api.themoviedb.org/3/movie/upcoming"
-        params = {'api_key': TMDB_API_KEY}
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        
-        logger.info(f"Successfully fetched upcoming movies (status: {response.status_code})")
-        return response.json()
-    except requests.exceptions.HTTPError as e:
-        logger.error(f"TMDB API HTTP error: {e.response.status_code}")
-        return {"results": [], "error": f"TMDB API error: {e.response.status_code}"}
-    except Exception as e:
-        logger.error(f"Upcoming error: {e}")
-        return {"results": [], "error": str(e)}
+    return discover_feed('upcoming', request)
+
+# Encoded TMDB movie responses: movie id -> CachedResponse
+movie_responses = TTLCache(maxsize=512, ttl=6 * 3600)
+similar_responses = TTLCache(maxsize=512, ttl=6 * 3600)
 
 @api_router.get("/movie/{movie_id}")
-async def get_movie_detail(movie_id: int):
+async def get_movie_detail(movie_id: int, request: Request):
     """Get full movie details including cast and crew"""
     try:
-        details = get_movie_details(movie_id)
-        return details
+        entry = movie_responses.get(movie_id)
+        if entry is None:
+            details = get_movie_details(movie_id)
+            if details is None:
+                return None
+            entry = CachedResponse.from_payload(details)
+            movie_responses.set(movie_id, entry)
+        return encoded_response(entry, request, 'movie')
     except Exception as e:
         logger.error(f"Error fetching movie details for {movie_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@api_router.get("/movie/{movie_id}/similar")
-async def get_similar_movies(movie_id: int):
-    """Get similar movies for a given movie ID with fallback to recommendations"""
+def fetch_similar_movies(movie_id: int) -> dict:
+    """Similar movies for a given movie ID with fallback to recommendations"""
     try:
+        if not budget.acquire('tmdb'):
+            return {"results": [], "error": "TMDB budget exhausted"}
+        
         # Try similar movies first
         url = f"https://api.themoviedb.org/3/movie/{movie_id}/similar"
         params = {'api_key': TMDB_API_KEY, 'language': 'en-US', 'page': 1}
@@ -1018,6 +1529,8 @@ async def get_similar_movies(movie_id: int):
             logger.warning(f"TMDB returned empty similar movies for movie_id: {movie_id}")
             
             # Try recommendations endpoint as fallback
+            if not budget.acquire('tmdb'):
+                return {"results": [], "fallback_message": "No similar movies available. Try browsing trending movies!"}
             logger.info(f"Attempting recommendations fallback for movie_id: {movie_id}")
             rec_url = f"https://api.themoviedb.org/3/movie/{movie_id}/recommendations"
             rec_response = requests.get(rec_url, params=params, timeout=10)
@@ -1036,22 +1549,43 @@ async def get_similar_movies(movie_id: int):
         logger.error(f"Similar movies error for movie_id {movie_id}: {e}")
         return {"results": [], "error": str(e)}
 
+@api_router.get("/movie/{movie_id}/similar")
+async def get_similar_movies(movie_id: int, request: Request):
+    """Get similar movies for a given movie ID with fallback to recommendations"""
+    entry = similar_responses.get(movie_id)
+    if entry is None:
+        data = fetch_similar_movies(movie_id)
+        if not data.get('results'):
+            return data
+        entry = CachedResponse.from_payload(data)
+        similar_responses.set(movie_id, entry)
+    return encoded_response(entry, request, 'movie')
+
 @api_router.get("/outfits/trending")
-async def get_trending_outfits():
-    """Get trending outfits across all categories"""
+async def get_trending_outfits(request: Request, response: Response, category: str = None, limit: int = 10,
+                               randomize: bool = False):
+    """
+    Trending outfits (optionally within one category), ranked by time-decayed
+    engagement. `randomize` draws a score-weighted sample of the top instead.
+    """
     try:
         logger.info("Fetching trending outfits")
-        
-        # Get random outfits from all categories
-        outfits = list(outfits_collection.aggregate([
-            {"$match": {"isCelebrity": False}},
-            {"$sample": {"size": 10}}
-        ]))
+        size = page_size(limit, default=10, maximum=50)
+        if outfit_catalog.ready and outfit_trending.version:
+            return trending_feed(request, outfit_catalog, outfit_trending, "outfits", category, size, randomize)
+        response.headers["Cache-Control"] = CACHE_CONTROL['trending']
+        
+        # No ranking yet: random outfits from MongoDB
+        match = {"isCelebrity": False, **({"category": category} if category else {})}
+        outfits = await outfits_collection.aggregate([
+            {"$match": match},
+            {"$sample": {"size": size}},
+            {"$project": OUTFIT_CARD_PROJECTION}
+        ]).to_list(length=None)
         
         # Convert ObjectId to string
         for outfit in outfits:
-            outfit['id'] = str(outfit['_id'])
-            del outfit['_id']
+            to_api(outfit)
         
         logger.info(f"Found {len(outfits)} trending outfits")
         return {"outfits": outfits}
@@ -1060,41 +1594,44 @@ async def get_trending_outfits():
         return {"outfits": []}
 
 @api_router.get("/outfits/celebrity")
-async def get_celebrity_outfits():
-    """Get celebrity outfits (Dress Like Your Icon)"""
+async def get_celebrity_outfits(request: Request, limit: int = None, cursor: str = None):
+    """Get celebrity outfits (Dress Like Your Icon), one keyset page at a time when `limit` or `cursor` is given"""
+    size, position = listing_size(limit, cursor), cursor_position(cursor)
     try:
         logger.info("Fetching celebrity outfits")
         
-        # Get all celebrity outfits
-        outfits = list(outfits_collection.find({"isCelebrity": True}))
+        # Pre-encoded listing from the catalog snapshot
+        if outfit_catalog.ready:
+            return catalog_listing(request, outfit_catalog, "outfits", {"isCelebrity": True},
+                                   size=size, position=position)
         
-        # Convert ObjectId to string
-        for outfit in outfits:
-            outfit['id'] = str(outfit['_id'])
-            del outfit['_id']
+        # Get celebrity outfits
+        outfits, next_cursor = await mongo_page(outfits_collection, {"isCelebrity": True}, size, position,
+                                                OUTFIT_CARD_PROJECTION)
         
         logger.info(f"Found {len(outfits)} celebrity outfits")
-        return {"outfits": outfits}
+        return {"outfits": outfits, "next_cursor": next_cursor}
     except Exception as e:
         logger.error(f"Celebrity outfits error: {e}")
         return {"outfits": []}
 
 @api_router.get("/outfits/{category}")
-async def get_outfits(category: str):
-    """Get outfits by category"""
+async def get_outfits(category: str, request: Request, limit: int = None, cursor: str = None):
+    """Get outfits by category, one keyset page at a time when `limit` or `cursor` is given"""
+    size, position = listing_size(limit, cursor), cursor_position(cursor)
     try:
         logger.info(f"Fetching outfits for category: {category}")
         
-        # Fetch from MongoDB
-        outfits = list(outfits_collection.find({"category": category}))
+        # Pre-encoded listing from the catalog snapshot; MongoDB only if it is not loaded
+        if outfit_catalog.ready:
+            return catalog_listing(request, outfit_catalog, "outfits", {"category": category},
+                                   {"category": category}, size=size, position=position)
         
-        # Convert ObjectId to string for JSON serialization
-        for outfit in outfits:
-            outfit['id'] = str(outfit['_id'])
-            del outfit['_id']
+        outfits, next_cursor = await mongo_page(outfits_collection, {"category": category}, size, position,
+                                                OUTFIT_CARD_PROJECTION)
         
         logger.info(f"Found {len(outfits)} outfits for category: {category}")
-        return {"outfits": outfits, "category": category}
+        return {"outfits": outfits, "category": category, "next_cursor": next_cursor}
     except Exception as e:
         logger.error(f"Outfits error: {e}")
         return {"outfits": [], "category": category}
@@ -1114,10 +1651,9 @@ async def create_outfit(outfit: dict):
 # ========== OUTFIT ID ENDPOINT (for deep linking) ==========
 
 @api_router.get("/outfits/id/{outfit_id}")
-async def get_outfit_by_id(outfit_id: str):
+async def get_outfit_by_id(outfit_id: str, request: Request):
     """Get a specific outfit by ID (for deep linking)"""
     try:
-        from bson import ObjectId
         logger.info(f"Fetching outfit by ID: {outfit_id}")
         
         # Convert string ID to ObjectId
@@ -1128,39 +1664,213 @@ async def get_outfit_by_id(outfit_id: str):
             return {"success": False, "error": "Invalid ID format"}
         
         # Find the outfit
-        outfit = outfits_collection.find_one({"_id": object_id})
+        if outfit_catalog.ready:
+            response = catalog_item(request, outfit_catalog, "outfit", str(object_id))
+            if response is not None:
+                return response
+            outfit = None
+        else:
+            outfit = to_api(await outfits_collection.find_one({"_id": object_id}))
+            if outfit:
+                outfit = (await join_products([outfit]))[0]
         
         if not outfit:
             logger.warning(f"Outfit not found: {outfit_id}")
             return {"success": False, "error": "Outfit not found"}
         
-        # Convert ObjectId to string
-        outfit['id'] = str(outfit['_id'])
-        del outfit['_id']
-        
         logger.info(f"Found outfit: {outfit.get('title')}")
         return {"success": True, "outfit": outfit}
     except Exception as e:
         logger.error(f"Get outfit by ID error: {e}")
         return {"success": False, "error": str(e)}
 
+# ========== SIMILAR ITEMS ==========
+
+async def scored_cards(catalog: CatalogSnapshot, collection, projection: dict, scored: list, score_key: str) -> list:
+    """Cards for [(id, score)] in order, each with its score under `score_key` (missing ids dropped)"""
+    if catalog.ready:
+        cards = {doc_id: catalog.card(doc_id) for doc_id, _ in scored}
+    else:
+        docs = await collection.find({"_id": {"$in": [ObjectId(doc_id) for doc_id, _ in scored
+                                                       if ObjectId.is_valid(doc_id)]}},
+                                     projection).to_list(length=None)
+        cards = {doc['id']: doc for doc in map(to_api, docs)}
+    return [{**cards[doc_id], score_key: score} for doc_id, score in scored if cards.get(doc_id) is not None]
+
+async def similar_neighbors(catalog: CatalogSnapshot, index: SimilarIndex, doc_id: str, limit: int) -> list:
+    """
+    A document's precomputed content neighbors [(id, score)], best first:
+    from memory, or from `similar_items` until the in-memory lists are built
+    """
+    if catalog.ready and index.built:
+        return list(index.neighbors(doc_id, limit))
+    stored = await similar_items_collection.find_one({"_id": f"{catalog.name}:{doc_id}"})
+    return [(n['id'], n['score']) for n in (stored or {}).get('neighbors', [])[:limit]]
+
+async def similar_cards(catalog: CatalogSnapshot, index: SimilarIndex, collection, projection: dict,
+                        doc_id: str, limit: int) -> list:
+    """Cards of a document's content neighbors, best first, each with its `similarity`"""
+    neighbors = await similar_neighbors(catalog, index, doc_id, limit)
+    return await scored_cards(catalog, collection, projection, neighbors, 'similarity')
+
+async def also_viewed_cards(catalog: CatalogSnapshot, co: CoEngagement, index: SimilarIndex, collection,
+                            projection: dict, doc_id: str, limit: int) -> list:
+    """
+    Cards of the items most engaged with in the same sessions as `doc_id`
+    (`coScore`), topped up with content neighbors (`similarity`) while an item
+    has too little session history
+    """
+    co_viewed = [(other, score) for other, score in co.also_viewed(doc_id, limit)
+                 if not catalog.ready or catalog.get(other) is not None]
+    cards = await scored_cards(catalog, collection, projection, co_viewed, 'coScore')
+    if len(cards) < limit:
+        seen = {doc_id, *(other for other, _ in co_viewed)}
+        neighbors = [(other, score) for other, score in await similar_neighbors(catalog, index, doc_id, limit)
+                     if other not in seen]
+        cards += await scored_cards(catalog, collection, projection, neighbors[:limit - len(cards)], 'similarity')
+    return cards
+
+@api_router.get("/outfits/id/{outfit_id}/similar")
+async def get_similar_outfits(outfit_id: str, limit: int = None):
+    """Outfits most similar in content (title, category, description, items) to one outfit"""
+    if not ObjectId.is_valid(outfit_id):
+        return {"success": False, "error": "Invalid ID format", "outfits": []}
+    try:
+        size = page_size(limit, default=outfit_similar.k, maximum=outfit_similar.k)
+        outfits = await similar_cards(outfit_catalog, outfit_similar, outfits_collection, OUTFIT_CARD_PROJECTION,
+                                      str(ObjectId(outfit_id)), size)
+        return {"success": True, "outfits": outfits}
+    except Exception as e:
+        logger.error(f"Similar outfits error: {e}")
+        return {"success": False, "error": str(e), "outfits": []}
+
+@api_router.get("/beauty/id/{beauty_id}/similar")
+async def get_similar_beauty(beauty_id: str, limit: int = None):
+    """Beauty looks most similar in content (title, celebrity, category, products) to one look"""
+    if not ObjectId.is_valid(beauty_id):
+        return {"success": False, "error": "Invalid ID format", "looks": []}
+    try:
+        size = page_size(limit, default=beauty_similar.k, maximum=beauty_similar.k)
+        looks = await similar_cards(beauty_catalog, beauty_similar, beauty_collection, BEAUTY_CARD_PROJECTION,
+                                    str(ObjectId(beauty_id)), size)
+        return {"success": True, "looks": looks}
+    except Exception as e:
+        logger.error(f"Similar beauty looks error: {e}")
+        return {"success": False, "error": str(e), "looks": []}
+
+@api_router.get("/outfits/id/{outfit_id}/also-viewed")
+async def get_also_viewed_outfits(outfit_id: str, limit: int = None):
+    """Outfits people engaged with in the same sessions as this one ("people who viewed this also viewed")"""
+    if not ObjectId.is_valid(outfit_id):
+        return {"success": False, "error": "Invalid ID format", "outfits": []}
+    try:
+        size = page_size(limit, default=outfit_also_viewed.k, maximum=outfit_also_viewed.k)
+        outfits = await also_viewed_cards(outfit_catalog, outfit_also_viewed, outfit_similar, outfits_collection,
+                                          OUTFIT_CARD_PROJECTION, str(ObjectId(outfit_id)), size)
+        return {"success": True, "outfits": outfits}
+    except Exception as e:
+        logger.error(f"Also-viewed outfits error: {e}")
+        return {"success": False, "error": str(e), "outfits": []}
+
+@api_router.get("/beauty/id/{beauty_id}/also-viewed")
+async def get_also_viewed_beauty(beauty_id: str, limit: int = None):
+    """Beauty looks people engaged with in the same sessions as this one"""
+    if not ObjectId.is_valid(beauty_id):
+        return {"success": False, "error": "Invalid ID format", "looks": []}
+    try:
+        size = page_size(limit, default=beauty_also_viewed.k, maximum=beauty_also_viewed.k)
+        looks = await also_viewed_cards(beauty_catalog, beauty_also_viewed, beauty_similar, beauty_collection,
+                                        BEAUTY_CARD_PROJECTION, str(ObjectId(beauty_id)), size)
+        return {"success": True, "looks": looks}
+    except Exception as e:
+        logger.error(f"Also-viewed beauty error: {e}")
+        return {"success": False, "error": str(e), "looks": []}
+
+# ========== BATCH ID ENDPOINTS (favorites, deep-link lists) ==========
+
+MAX_BATCH_IDS = 300
+
+async def fetch_batch(catalog: CatalogSnapshot, collection, ids: list, cards: bool, projection: dict) -> dict:
+    """
+    Resolve many ids at once - snapshot lookups, or one $in query - keeping
+    input order (duplicates dropped) and reporting ids that are malformed or
+    not found
+    """
+    wanted, invalid = [], []
+    for doc_id in dict.fromkeys(ids):
+        (wanted if ObjectId.is_valid(doc_id) else invalid).append(doc_id)
+    if catalog.ready:
+        lookup = catalog.card if cards else catalog.get
+        found = {doc_id: lookup(str(ObjectId(doc_id))) for doc_id in wanted}
+    else:
+        docs = await collection.find({"_id": {"$in": [ObjectId(doc_id) for doc_id in wanted]}},
+                                     projection if cards else None).to_list(length=None)
+        by_id = {doc['id']: doc for doc in map(to_api, docs)}
+        found = {doc_id: by_id.get(str(ObjectId(doc_id))) for doc_id in wanted}
+    if not cards:
+        found = dict(zip(found, await join_products(list(found.values()))))
+    return {
+        "items": [doc for doc in found.values() if doc is not None],
+        "missing": [doc_id for doc_id, doc in found.items() if doc is None],
+        "invalid": invalid,
+    }
+
+@api_router.post("/outfits/batch")
+async def get_outfits_batch(request: BatchRequest):
+    """Get many outfits by ID in one call (input order preserved, missing IDs reported)"""
+    if len(request.ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} ids per request")
+    try:
+        result = await fetch_batch(outfit_catalog, outfits_collection, request.ids, request.cards,
+                                   OUTFIT_CARD_PROJECTION)
+        logger.info(f"Batch outfits: {len(result['items'])} found, {len(result['missing'])} missing")
+        return {"success": True, "outfits": result["items"], "missing": result["missing"],
+                "invalid": result["invalid"]}
+    except Exception as e:
+        logger.error(f"Batch outfits error: {e}")
+        return {"success": False, "error": str(e), "outfits": []}
+
+@api_router.post("/beauty/batch")
+async def get_beauty_batch(request: BatchRequest):
+    """Get many beauty looks by ID in one call (input order preserved, missing IDs reported)"""
+    if len(request.ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} ids per request")
+    try:
+        result = await fetch_batch(beauty_catalog, beauty_collection, request.ids, request.cards,
+                                   BEAUTY_CARD_PROJECTION)
+        logger.info(f"Batch beauty looks: {len(result['items'])} found, {len(result['missing'])} missing")
+        return {"success": True, "looks": result["items"], "missing": result["missing"],
+                "invalid": result["invalid"]}
+    except Exception as e:
+        logger.error(f"Batch beauty error: {e}")
+        return {"success": False, "error": str(e), "looks": []}
+
 # ========== BEAUTY ENDPOINTS ==========
 
 @api_router.get("/beauty/trending")
-async def get_trending_beauty():
-    """Get trending beauty looks"""
+async def get_trending_beauty(request: Request, response: Response, category: str = None, limit: int = 10,
+                              randomize: bool = False):
+    """
+    Trending beauty looks (optionally within one category), ranked by
+    time-decayed engagement. `randomize` draws a score-weighted sample of the top.
+    """
     try:
         logger.info("Fetching trending beauty looks")
-        
-        # Get random trending looks
-        looks = list(beauty_collection.aggregate([
-            {"$sample": {"size": 10}}
-        ]))
+        size = page_size(limit, default=10, maximum=50)
+        if beauty_catalog.ready and beauty_trending.version:
+            return trending_feed(request, beauty_catalog, beauty_trending, "looks", category, size, randomize)
+        response.headers["Cache-Control"] = CACHE_CONTROL['trending']
+        
+        # No ranking yet: random looks from MongoDB
+        looks = await beauty_collection.aggregate([
+            {"$match": {"category": category} if category else {}},
+            {"$sample": {"size": size}},
+            {"$project": BEAUTY_CARD_PROJECTION}
+        ]).to_list(length=None)
         
         # Convert ObjectId to string
         for look in looks:
-            look['id'] = str(look['_id'])
-            del look['_id']
+            to_api(look)
         
         logger.info(f"Found {len(looks)} trending beauty looks")
         return {"looks": looks}
@@ -1169,21 +1879,23 @@ async def get_trending_beauty():
         return {"looks": []}
 
 @api_router.get("/beauty/{category}")
-async def get_beauty_looks(category: str):
-    """Get beauty looks by category"""
+async def get_beauty_looks(category: str, request: Request, limit: int = None, cursor: str = None):
+    """Get beauty looks by category, one keyset page at a time when `limit` or `cursor` is given"""
+    size, position = listing_size(limit, cursor), cursor_position(cursor)
     try:
         logger.info(f"Fetching beauty looks for category: {category}")
         
-        # Get beauty looks for the specified category
-        looks = list(beauty_collection.find({"category": category}))
+        # Pre-encoded listing from the catalog snapshot
+        if beauty_catalog.ready:
+            return catalog_listing(request, beauty_catalog, "looks", {"category": category},
+                                   size=size, position=position)
         
-        # Convert ObjectId to string
-        for look in looks:
-            look['id'] = str(look['_id'])
-            del look['_id']
+        # Get beauty looks for the specified category
+        looks, next_cursor = await mongo_page(beauty_collection, {"category": category}, size, position,
+                                              BEAUTY_CARD_PROJECTION)
         
         logger.info(f"Found {len(looks)} beauty looks for category: {category}")
-        return {"looks": looks}
+        return {"looks": looks, "next_cursor": next_cursor}
     except Exception as e:
         logger.error(f"Beauty looks error: {e}")
         return {"looks": []}
@@ -1191,10 +1903,9 @@ async def get_beauty_looks(category: str):
 # ========== BEAUTY ID ENDPOINT (for deep linking) ==========
 
 @api_router.get("/beauty/id/{beauty_id}")
-async def get_beauty_by_id(beauty_id: str):
+async def get_beauty_by_id(beauty_id: str, request: Request):
     """Get a specific beauty look by ID (for deep linking)"""
     try:
-        from bson import ObjectId
         logger.info(f"Fetching beauty look by ID: {beauty_id}")
         
         # Convert string ID to ObjectId
@@ -1205,16 +1916,20 @@ async def get_beauty_by_id(beauty_id: str):
             return {"success": False, "error": "Invalid ID format"}
         
         # Find the beauty look
-        look = beauty_collection.find_one({"_id": object_id})
+        if beauty_catalog.ready:
+            response = catalog_item(request, beauty_catalog, "look", str(object_id))
+            if response is not None:
+                return response
+            look = None
+        else:
+            look = to_api(await beauty_collection.find_one({"_id": object_id}))
+            if look:
+                look = (await join_products([look]))[0]
         
         if not look:
             logger.warning(f"Beauty look not found: {beauty_id}")
             return {"success": False, "error": "Beauty look not found"}
         
-        # Convert ObjectId to string
-        look['id'] = str(look['_id'])
-        del look['_id']
-        
         logger.info(f"Found beauty look: {look.get('title')}")
         return {"success": True, "look": look}
     except Exception as e:
@@ -1223,51 +1938,196 @@ async def get_beauty_by_id(beauty_id: str):
 
 # ========== SEARCH ENDPOINTS ==========
 
+PRICE_SORTS = {'price_asc': 1, 'price_desc': -1}
+
+def catalog_search_page(catalog: CatalogSnapshot, index: SearchIndex, q: str, size: int, position: dict,
+                        equals: dict, contains: dict, ranges: dict = None, sort: str = None):
+    """
+    One page of search results from memory, plus the next cursor. With a text
+    query, results are BM25-ranked and paged on (score, id); without one, the
+    filtered snapshot is paged on id. A price `sort` pages on (minimum price,
+    id) instead, over priced matches only.
+    """
+    if sort:
+        # The index keeps documents sorted by (priceMinCents, id): a page starts at the cursor
+        # instead of sorting every match
+        after = (position['p'], position['i']) if position else None
+        descending = PRICE_SORTS[sort] < 0
+        if q:
+            keyed = index.ordered('priceMinCents', size + 1, descending, after,
+                                  among=index.hits(q, equals=equals, contains=contains, ranges=ranges))
+        else:
+            keyed = index.ordered('priceMinCents', size + 1, descending, after,
+                                  equals=equals, contains=contains, ranges=ranges)
+        page = keyed[:size]
+        next_cursor = encode_cursor({"p": page[-1][0], "i": page[-1][1]}) if len(keyed) > size else None
+        return [card for card in (catalog.card(doc_id) for _, doc_id in page) if card is not None], next_cursor
+    if q:
+        after = (position['s'], position['i']) if position else None
+        ranked = index.search(q, limit=size + 1, equals=equals, contains=contains, ranges=ranges, after=after)
+        page = ranked[:size]
+        next_cursor = encode_cursor({"s": page[-1][1], "i": page[-1][0]}) if len(ranked) > size else None
+        return ranked_docs(catalog, page), next_cursor
+    docs = catalog.find(limit=size + 1, after=position['i'] if position else None, cards=True,
+                        predicate=lambda doc: index.matches(doc['id'], contains=contains, ranges=ranges),
+                        **{field: value for field, value in equals.items() if value is not None})
+    page = docs[:size]
+    next_cursor = encode_cursor({"i": page[-1]['id']}) if len(docs) > size else None
+    return page, next_cursor
+
+def ranked_docs(catalog: CatalogSnapshot, ranked: list) -> list:
+    """Snapshot cards for ranked (id, score) pairs, in rank order, with their score"""
+    results = []
+    for doc_id, score in ranked:
+        card = catalog.card(doc_id)
+        if card is not None:
+            results.append({**card, 'score': round(score, 4)})
+    return results
+
+FACET_VALUE_TYPES = (str, int, float, bool)
+
+def format_facets(counts: dict) -> dict:
+    """Facet counts as API lists: values by descending count, price bands in band order"""
+    result = {}
+    for name, buckets in counts.items():
+        if name == 'price':
+            result[name] = [{"value": band, "min_price": low, "max_price": high, "count": buckets.get(band, 0)}
+                            for band, low, high in PRICE_BANDS]
+        else:
+            result[name] = [{"value": value, "count": count}
+                            for value, count in sorted(buckets.items(), key=lambda item: (-item[1], str(item[0])))]
+    return result
+
+def facet_counts(index: SearchIndex, q: str, equals: dict, contains: dict, ranges: dict) -> dict:
+    """
+    Counts per value of every filterable field, and per price band, for a
+    search - one pass over the in-memory index. Each facet is counted with
+    all the other filters applied, but not its own.
+    """
+    facets = {field: (lambda attrs, field=field: [attrs[field]]
+                      if isinstance(attrs.get(field), FACET_VALUE_TYPES) and attrs[field] != '' else [])
+              for field in (*equals, *contains)}
+    facets['price'] = lambda attrs: price_bands(attrs.get('priceMinCents'), attrs.get('priceMaxCents'))
+    filters = {}
+    for field, value in equals.items():
+        if value is not None:
+            filters[field] = lambda attrs, only={field: value}: SearchIndex.attributes_match(attrs, equals=only)
+    for field, value in contains.items():
+        if value:
+            filters[field] = lambda attrs, only={field: value}: SearchIndex.attributes_match(attrs, contains=only)
+    if ranges:
+        filters['price'] = lambda attrs: SearchIndex.attributes_match(attrs, ranges=ranges)
+    return format_facets(index.facets(q, facets, filters))
+
+async def mongo_facet_counts(collection, base: dict, filters: dict, fields: tuple) -> dict:
+    """
+    `facet_counts` from MongoDB in one round trip: a single $facet stage
+    whose sub-pipelines each apply every filter except their own
+    """
+    def others(name):
+        return {key: value for other, fragment in filters.items() if other != name for key, value in fragment.items()}
+    stages = {field: [{"$match": others(field)}, {"$group": {"_id": f"${field}", "count": {"$sum": 1}}}]
+              for field in fields}
+    bands = {}
+    for band, low, high in PRICE_BANDS:
+        overlap = [{"$isNumber": "$priceMinCents"}, {"$isNumber": "$priceMaxCents"}]
+        if low is not None:
+            overlap.append({"$gte": ["$priceMaxCents", dollars_to_cents(low)]})
+        if high is not None:
+            overlap.append({"$lte": ["$priceMinCents", dollars_to_cents(high)]})
+        bands[band] = {"$sum": {"$cond": [{"$and": overlap}, 1, 0]}}
+    stages['price'] = [{"$match": others('price')}, {"$group": {"_id": None, **bands}}]
+    rows = await collection.aggregate([{"$match": base}, {"$facet": stages}]).to_list(length=1)
+    result = rows[0] if rows else {}
+    counts = {field: {row['_id']: row['count'] for row in result.get(field, [])
+                      if isinstance(row['_id'], FACET_VALUE_TYPES) and row['_id'] != ''}
+              for field in fields}
+    counts['price'] = (result.get('price') or [{}])[0]
+    return format_facets(counts)
+
 @api_router.get("/search/outfits")
 async def search_outfits(
     q: str = "",
     category: str = None,
     gender: str = None,
-    min_price: int = None,
-    max_price: int = None
+    min_price: float = None,
+    max_price: float = None,
+    sort: str = None,
+    facets: bool = False,
+    limit: int = None,
+    cursor: str = None
 ):
-    """Search outfits with filters"""
+    """
+    Search outfits with filters (BM25-ranked, last term matches as a prefix), paged by cursor.
+    `min_price`/`max_price` (dollars) keep outfits whose price range overlaps them;
+    `sort=price_asc|price_desc` orders by minimum price instead of relevance.
+    `facets` adds category, gender and price band counts for the same search.
+    """
+    if sort is not None and sort not in PRICE_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(PRICE_SORTS)}")
+    size = page_size(limit)
+    position = cursor_position(cursor, ranked=bool(q) and outfit_catalog.ready, by_price=bool(sort))
     try:
-        logger.info(f"Searching outfits: q='{q}', category={category}, gender={gender}")
-        
-        # Build query
-        query = {}
-        
-        # Text search across multiple fields
-        if q:
-            query["$or"] = [
-                {"title": {"$regex": q, "$options": "i"}},
-                {"description": {"$regex": q, "$options": "i"}},
-                {"category": {"$regex": q, "$options": "i"}}
-            ]
-        
-        # Category filter
-        if category:
-            query["category"] = category
-        
-        # Gender filter
-        if gender:
-            query["gender"] = {"$regex": gender, "$options": "i"}
-        
-        # Fetch results
-        outfits = list(outfits_collection.find(query).limit(50))
-        
-        # Convert ObjectId to string
-        for outfit in outfits:
-            outfit['id'] = str(outfit['_id'])
-            del outfit['_id']
+        logger.info(f"Searching outfits: q='{q}', category={category}, gender={gender}, "
+                    f"price={min_price}-{max_price}, sort={sort}")
+
+        facet_result = None
+        if outfit_catalog.ready:
+            equals, contains = {"category": category}, {"gender": gender}
+            ranges = price_window(min_price, max_price)
+            outfits, next_cursor = catalog_search_page(outfit_catalog, outfit_search, q, size, position,
+                                                       equals=equals, contains=contains, ranges=ranges, sort=sort)
+            if facets:
+                facet_result = await asyncio.to_thread(facet_counts, outfit_search, q, equals, contains, ranges)
+        else:
+            # Build query
+            base, filters = {}, {}
+
+            # Fallback while the catalog snapshot is unavailable - input is escaped, never a pattern
+            if q:
+                pattern = re.escape(q[:MAX_QUERY_LENGTH])
+                base["$or"] = [
+                    {"title": {"$regex": pattern, "$options": "i"}},
+                    {"description": {"$regex": pattern, "$options": "i"}},
+                    {"category": {"$regex": pattern, "$options": "i"}}
+                ]
+
+            # Category filter
+            if category:
+                filters["category"] = {"category": category}
+
+            # Gender filter
+            if gender:
+                filters["gender"] = {"gender": {"$regex": re.escape(gender), "$options": "i"}}
+
+            # Price range overlap (priceMinCents index range scan)
+            if min_price is not None or max_price is not None:
+                filters["price"] = price_range_query(min_price, max_price)
+
+            query = {**base}
+            for fragment in filters.values():
+                query.update(fragment)
+            if facets:
+                facet_result = await mongo_facet_counts(outfits_collection, base, filters, ("category", "gender"))
+
+            # Fetch results
+            if sort:
+                outfits, next_cursor = await mongo_price_page(outfits_collection, query, size, position,
+                                                              PRICE_SORTS[sort], OUTFIT_CARD_PROJECTION)
+            else:
+                outfits, next_cursor = await mongo_page(outfits_collection, query, size, position,
+                                                        OUTFIT_CARD_PROJECTION)
         
         logger.info(f"Found {len(outfits)} outfits matching search")
-        return {
+        result = {
             "results": outfits,
             "count": len(outfits),
-            "query": q
+            "query": q,
+            "next_cursor": next_cursor
         }
+        if facet_result is not None:
+            result["facets"] = facet_result
+        return result
     except Exception as e:
         logger.error(f"Outfit search error: {e}")
         return {"results": [], "count": 0, "error": str(e)}
@@ -1276,50 +2136,198 @@ async def search_outfits(
 async def search_beauty(
     q: str = "",
     category: str = None,
-    celebrity: str = None
+    celebrity: str = None,
+    min_price: float = None,
+    max_price: float = None,
+    facets: bool = False,
+    limit: int = None,
+    cursor: str = None
 ):
-    """Search beauty looks with filters"""
+    """
+    Search beauty looks with filters (BM25-ranked, last term matches as a prefix), paged by cursor.
+    `facets` adds category, celebrity and price band counts for the same search.
+    """
+    size = page_size(limit)
+    position = cursor_position(cursor, ranked=bool(q) and beauty_catalog.ready)
     try:
-        logger.info(f"Searching beauty: q='{q}', category={category}, celebrity={celebrity}")
-        
-        # Build query
-        query = {}
-        
-        # Text search
-        if q:
-            query["$or"] = [
-                {"title": {"$regex": q, "$options": "i"}},
-                {"description": {"$regex": q, "$options": "i"}},
-                {"celebrity": {"$regex": q, "$options": "i"}},
-                {"category": {"$regex": q, "$options": "i"}}
-            ]
-        
-        # Category filter
-        if category:
-            query["category"] = category
-        
-        # Celebrity filter
-        if celebrity:
-            query["celebrity"] = {"$regex": celebrity, "$options": "i"}
-        
-        # Fetch results
-        looks = list(beauty_collection.find(query).limit(50))
-        
-        # Convert ObjectId to string
-        for look in looks:
-            look['id'] = str(look['_id'])
-            del look['_id']
+        logger.info(f"Searching beauty: q='{q}', category={category}, celebrity={celebrity}, "
+                    f"price={min_price}-{max_price}")
+
+        facet_result = None
+        if beauty_catalog.ready:
+            equals, contains = {"category": category}, {"celebrity": celebrity}
+            ranges = price_window(min_price, max_price)
+            looks, next_cursor = catalog_search_page(beauty_catalog, beauty_search, q, size, position,
+                                                     equals=equals, contains=contains, ranges=ranges)
+            if facets:
+                facet_result = await asyncio.to_thread(facet_counts, beauty_search, q, equals, contains, ranges)
+        else:
+            # Build query
+            base, filters = {}, {}
+
+            # Fallback while the catalog snapshot is unavailable - input is escaped, never a pattern
+            if q:
+                pattern = re.escape(q[:MAX_QUERY_LENGTH])
+                base["$or"] = [
+                    {"title": {"$regex": pattern, "$options": "i"}},
+                    {"description": {"$regex": pattern, "$options": "i"}},
+                    {"celebrity": {"$regex": pattern, "$options": "i"}},
+                    {"category": {"$regex": pattern, "$options": "i"}}
+                ]
+
+            # Category filter
+            if category:
+                filters["category"] = {"category": category}
+
+            # Celebrity filter
+            if celebrity:
+                filters["celebrity"] = {"celebrity": {"$regex": re.escape(celebrity), "$options": "i"}}
+
+            # Price range overlap
+            if min_price is not None or max_price is not None:
+                filters["price"] = price_range_query(min_price, max_price)
+
+            query = {**base}
+            for fragment in filters.values():
+                query.update(fragment)
+            if facets:
+                facet_result = await mongo_facet_counts(beauty_collection, base, filters, ("category", "celebrity"))
+
+            # Fetch results
+            looks, next_cursor = await mongo_page(beauty_collection, query, size, position,
+                                                  BEAUTY_CARD_PROJECTION)
         
         logger.info(f"Found {len(looks)} beauty looks matching search")
-        return {
+        result = {
             "results": looks,
             "count": len(looks),
-            "query": q
+            "query": q,
+            "next_cursor": next_cursor
         }
+        if facet_result is not None:
+            result["facets"] = facet_result
+        return result
     except Exception as e:
         logger.error(f"Beauty search error: {e}")
         return {"results": [], "count": 0, "error": str(e)}
 
+SEARCH_TYPES = ('outfit', 'beauty', 'movie')
+
+def catalog_search_hits(catalog: CatalogSnapshot, index: SearchIndex, q: str, limit: int) -> list:
+    """[(card, relevance)] from memory, relevance being BM25 relative to the best match (best = 1.0)"""
+    ranked = index.search(q, limit=limit)
+    best = ranked[0][1] if ranked else 0.0
+    hits = []
+    for doc_id, score in ranked:
+        card = catalog.card(doc_id)
+        if card is not None:
+            hits.append((card, score / best if best > 0 else 0.0))
+    return hits
+
+async def mongo_search_hits(collection, projection: dict, fields: tuple, q: str, limit: int) -> list:
+    """[(card, relevance)] while the catalog snapshot is unavailable: escaped regex match, relevance by rank"""
+    pattern = re.escape(q[:MAX_QUERY_LENGTH])
+    query = {"$or": [{field: {"$regex": pattern, "$options": "i"}} for field in fields]}
+    docs = await collection.find(query, projection).limit(limit).to_list(length=None)
+    return [(to_api(doc), 1.0 / (rank + 1)) for rank, doc in enumerate(docs)]
+
+async def outfit_search_hits(q: str, limit: int) -> list:
+    if outfit_catalog.ready:
+        return await asyncio.to_thread(catalog_search_hits, outfit_catalog, outfit_search, q, limit)
+    return await mongo_search_hits(outfits_collection, OUTFIT_CARD_PROJECTION,
+                                   ("title", "description", "category"), q, limit)
+
+async def beauty_search_hits(q: str, limit: int) -> list:
+    if beauty_catalog.ready:
+        return await asyncio.to_thread(catalog_search_hits, beauty_catalog, beauty_search, q, limit)
+    return await mongo_search_hits(beauty_collection, BEAUTY_CARD_PROJECTION,
+                                   ("title", "description", "celebrity", "category"), q, limit)
+
+async def movie_search_hits(q: str, limit: int) -> list:
+    """
+    [(movie, relevance)] from the TMDB search cache or a live search, relevance
+    being the fuzzy title score. A live search that misses its deadline keeps
+    running in its thread and fills the cache for the next request.
+    """
+    results = await asyncio.to_thread(search_tmdb_results, q)
+    return [({field: movie.get(field) for field in TMDB_RESULT_FIELDS}, score)
+            for score, _, movie in rank_results(q, results, top_n=limit)]
+
+async def timed_backend(search, q: str, limit: int, timeout: float) -> tuple:
+    """(status, hits, ms) of one backend: ok, timeout or error"""
+    start = time.perf_counter()
+    try:
+        hits, status = await asyncio.wait_for(search(q, limit), timeout), "ok"
+    except asyncio.TimeoutError:
+        hits, status = [], "timeout"
+    except Exception as e:
+        logger.error(f"Unified search backend {search.__name__} failed: {e}")
+        hits, status = [], "error"
+    return status, hits, round((time.perf_counter() - start) * 1000, 1)
+
+@api_router.get("/search")
+async def search_all(q: str = "", types: str = None, limit: int = 10):
+    """
+    One search across outfits, beauty looks and movies. The backends run
+    concurrently, each with its own deadline (SEARCH_CATALOG_TIMEOUT,
+    SEARCH_TMDB_TIMEOUT), so the response takes as long as the slowest backend
+    that answers in time; a backend past its deadline is left out and the
+    response is marked `partial`. Results are merged into one list ranked by
+    per-backend relevance in [0, 1], each tagged with its `type`, and
+    `backends` reports every backend's status, count and time.
+    `types` is an optional comma-separated subset of outfit, beauty and movie;
+    `limit` applies per type.
+    """
+    kinds = [t for t in SEARCH_TYPES if t in {k.strip() for k in types.split(',')}] if types else list(SEARCH_TYPES)
+    limit = max(1, min(limit, 25))
+    q = q.strip()
+    if not q or not kinds:
+        return {"query": q, "results": [], "count": 0, "partial": False, "backends": {}}
+
+    backends = {
+        'outfit': (outfit_search_hits, SEARCH_CATALOG_TIMEOUT),
+        'beauty': (beauty_search_hits, SEARCH_CATALOG_TIMEOUT),
+        'movie': (movie_search_hits, SEARCH_TMDB_TIMEOUT),
+    }
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*(timed_backend(backends[kind][0], q, limit, backends[kind][1])
+                                      for kind in kinds))
+
+    merged = []
+    for order, (kind, (_, hits, _)) in enumerate(zip(kinds, outcomes)):
+        merged.extend((-score, order, rank, kind, item) for rank, (item, score) in enumerate(hits))
+    merged.sort(key=lambda hit: hit[:3])
+    results = [{"type": kind, "score": round(-neg_score, 4), "item": item}
+               for neg_score, _, _, kind, item in merged]
+    logger.info(f"Unified search: q='{q}', {len(results)} results in {(time.perf_counter() - start) * 1000:.0f}ms")
+    return {
+        "query": q,
+        "results": results,
+        "count": len(results),
+        "partial": any(status != "ok" for status, _, _ in outcomes),
+        "backends": {kind: {"status": status, "count": len(hits), "timing_ms": ms}
+                     for kind, (status, hits, ms) in zip(kinds, outcomes)},
+        "timing_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+SUGGEST_TYPES = ('outfit', 'beauty', 'celebrity', 'category', 'movie')
+
+@api_router.get("/suggest")
+async def suggest(q: str = "", limit: int = 8, types: str = None):
+    """
+    Typeahead suggestions for the search screens, answered from memory.
+    `types` is an optional comma-separated subset of outfit, beauty,
+    celebrity, category and movie.
+    """
+    kinds = {t.strip() for t in types.split(',') if t.strip() in SUGGEST_TYPES} if types else None
+    if kinds is not None and not kinds:
+        raise HTTPException(status_code=400, detail=f"types must be among {', '.join(SUGGEST_TYPES)}")
+    limit = max(1, min(limit, 25))
+    return {"query": q, "suggestions": suggest_index.suggest(q, limit=limit, kinds=kinds)}
+
+# TMDB genre id -> name, filled on first movie search
+tmdb_genre_map = {}
+
 @api_router.get("/search/movies")
 async def search_movies(
     q: str = "",
@@ -1334,6 +2342,9 @@ async def search_movies(
         if not q:
             return {"results": [], "count": 0, "message": "Search query required"}
         
+        if not budget.acquire('tmdb'):
+            return {"results": [], "count": 0, "error": "Movie search is temporarily unavailable"}
+        
         # TMDB search
         url = f"https://api.themoviedb.org/3/search/movie"
         params = {
@@ -1357,11 +2368,13 @@ async def search_movies(
         if min_rating:
             results = [m for m in results if m.get('vote_average', 0) >= min_rating]
         
-        # Get genre mapping
-        genres_url = f"https://api.themoviedb.org/3/genre/movie/list"
-        genres_params = {'api_key': TMDB_API_KEY, 'language': 'en-US'}
-        genres_response = requests.get(genres_url, params=genres_params, timeout=10)
-        genre_map = {g['id']: g['name'] for g in genres_response.json().get('genres', [])}
+        # Get genre mapping (static list - fetched once per process)
+        if not tmdb_genre_map and budget.acquire('tmdb'):
+            genres_url = f"https://api.themoviedb.org/3/genre/movie/list"
+            genres_params = {'api_key': TMDB_API_KEY, 'language': 'en-US'}
+            genres_response = requests.get(genres_url, params=genres_params, timeout=10)
+            tmdb_genre_map.update({g['id']: g['name'] for g in genres_response.json().get('genres', [])})
+        genre_map = tmdb_genre_map
         
         # Add genre names
         for movie in results:
@@ -1393,6 +2406,13 @@ async def search_music(request: Request):
         
         logger.info(f"Searching for song: {title} by {artist}")
         
+        if not budget.acquire('audd'):
+            return {
+                "success": False,
+                "error": "Song search is temporarily unavailable",
+                "song": None
+            }
+        
         # Use AudD search endpoint
         audd_url = "https://api.audd.io/findLyrics/"
         params = {
@@ -1479,7 +2499,8 @@ async def track_analytics_event(event: AnalyticsEvent):
         }
         
         # Store in analytics collection
-        result = analytics_collection.insert_one(event_data)
+        result = await analytics_collection.insert_one(event_data)
+        record_engagement(event_data)
         
         logger.info(f"Analytics tracked: {event.event_type} - {event.item_title or event.product_name}")
         
@@ -1507,8 +2528,10 @@ async def get_analytics_dashboard():
         # Get stats for last 30 days
         thirty_days_ago = (datetime.utcnow() - timedelta(days=30)).timestamp()
         
+        # Queries are started here and awaited together below so they run concurrently
+        
         # Top Product Clicks
-        product_clicks = list(analytics_collection.aggregate([
+        product_clicks = analytics_collection.aggregate([
             {"$match": {"event_type": "product_click", "timestamp": {"$gte": thirty_days_ago}}},
             {"$group": {
                 "_id": "$product_name",
@@ -1517,10 +2540,10 @@ async def get_analytics_dashboard():
             }},
             {"$sort": {"clicks": -1}},
             {"$limit": 10}
-        ]))
+        ]).to_list(length=None)
         
         # Top Outfits Viewed
-        outfit_views = list(analytics_collection.aggregate([
+        outfit_views = analytics_collection.aggregate([
             {"$match": {"event_type": "outfit_view", "timestamp": {"$gte": thirty_days_ago}}},
             {"$group": {
                 "_id": "$item_id",
@@ -1529,10 +2552,10 @@ async def get_analytics_dashboard():
             }},
             {"$sort": {"views": -1}},
             {"$limit": 10}
-        ]))
+        ]).to_list(length=None)
         
         # Top Beauty Looks Viewed
-        beauty_views = list(analytics_collection.aggregate([
+        beauty_views = analytics_collection.aggregate([
             {"$match": {"event_type": "beauty_view", "timestamp": {"$gte": thirty_days_ago}}},
             {"$group": {
                 "_id": "$item_id",
@@ -1541,20 +2564,20 @@ async def get_analytics_dashboard():
             }},
             {"$sort": {"views": -1}},
             {"$limit": 10}
-        ]))
+        ]).to_list(length=None)
         
         # Category Popularity
-        category_stats = list(analytics_collection.aggregate([
+        category_stats = analytics_collection.aggregate([
             {"$match": {"event_type": "category_view", "timestamp": {"$gte": thirty_days_ago}}},
             {"$group": {
                 "_id": "$category",
                 "views": {"$sum": 1}
             }},
             {"$sort": {"views": -1}}
-        ]))
+        ]).to_list(length=None)
         
         # Most Favorited Outfits
-        most_favorited_outfits = list(analytics_collection.aggregate([
+        most_favorited_outfits = analytics_collection.aggregate([
             {"$match": {"event_type": "outfit_favorited", "timestamp": {"$gte": thirty_days_ago}}},
             {"$group": {
                 "_id": "$item_id",
@@ -1563,10 +2586,10 @@ async def get_analytics_dashboard():
             }},
             {"$sort": {"favorites": -1}},
             {"$limit": 10}
-        ]))
+        ]).to_list(length=None)
         
         # Most Favorited Beauty Looks
-        most_favorited_beauty = list(analytics_collection.aggregate([
+        most_favorited_beauty = analytics_collection.aggregate([
             {"$match": {"event_type": "beauty_favorited", "timestamp": {"$gte": thirty_days_ago}}},
             {"$group": {
                 "_id": "$item_id",
@@ -1575,7 +2598,7 @@ async def get_analytics_dashboard():
             }},
             {"$sort": {"favorites": -1}},
             {"$limit": 10}
-        ]))
+        ]).to_list(length=None)
         
         # Total Events Count
         total_events = analytics_collection.count_documents({"timestamp": {"$gte": thirty_days_ago}})
@@ -1596,6 +2619,16 @@ async def get_analytics_dashboard():
             "timestamp": {"$gte": thirty_days_ago}
         })
         
+        (product_clicks, outfit_views, beauty_views, category_stats,
+         most_favorited_outfits, most_favorited_beauty, total_events,
+         total_product_clicks, total_outfit_views, total_beauty_views,
+         total_favorites) = await asyncio.gather(
+            product_clicks, outfit_views, beauty_views, category_stats,
+            most_favorited_outfits, most_favorited_beauty, total_events,
+            total_product_clicks, total_outfit_views, total_beauty_views,
+            total_favorites
+        )
+        
         return {
             "success": True,
             "period": "Last 30 Days",
@@ -1620,6 +2653,75 @@ async def get_analytics_dashboard():
             "message": str(e)
         }
 
+# ============================================================================
+# ADMIN ENDPOINTS
+# ============================================================================
+
+@api_router.get("/admin/budget")
+async def get_provider_budget(request: Request):
+    """
+    Report provider spend (calls and denials) per provider, endpoint and window
+    along with configured ceilings and degradation state
+    """
+    if not is_admin_request(request):
+        raise HTTPException(status_code=403, detail="Admin key required")
+    try:
+        await budget.flush()
+        return {
+            "success": True,
+            **budget.report(),
+            "tmdb_miss_cache": tmdb_misses.stats(),
+            "weather_cache": weather_cache.stats(),
+            "people_index": people_index.stats()
+        }
+    except Exception as e:
+        logger.error(f"Budget report error: {e}")
+        return {"success": False, "message": str(e)}
+
+@api_router.get("/admin/indexes")
+async def get_index_report(request: Request, explain: bool = False):
+    """
+    Report missing, unused and undeclared indexes per collection; with
+    explain=true also the winning plan for each declared query pattern
+    """
+    if not is_admin_request(request):
+        raise HTTPException(status_code=403, detail="Admin key required")
+    try:
+        result = {
+            "success": True,
+            "indexes": await index_report(mongo.db),
+            "search_indexes": {
+                "outfits": outfit_search.stats(),
+                "beauty": beauty_search.stats(),
+                "suggest": suggest_index.stats()
+            }
+        }
+        if explain:
+            result["query_plans"] = await explain_patterns(mongo.db)
+        return result
+    except Exception as e:
+        logger.error(f"Index report error: {e}")
+        return {"success": False, "message": str(e)}
+
+@api_router.get("/admin/catalog")
+async def get_catalog_status(request: Request):
+    """Catalog snapshot size, freshness mode (change stream / polling) and refresh latency"""
+    if not is_admin_request(request):
+        raise HTTPException(status_code=403, detail="Admin key required")
+    return {
+        "success": True,
+        "outfits": outfit_catalog.stats(),
+        "beauty_looks": beauty_catalog.stats(),
+        "response_cache": response_cache.stats(),
+        "trending": {"outfits": outfit_trending.stats(), "beauty_looks": beauty_trending.stats()},
+        "products": {**product_catalog.stats(),
+                     "references": {"outfits": outfit_product_refs.stats(),
+                                    "beauty_looks": beauty_product_refs.stats()}},
+        "similar": {"outfits": outfit_similar.stats(), "beauty_looks": beauty_similar.stats()},
+        "also_viewed": {"outfits": outfit_also_viewed.stats(), "beauty_looks": beauty_also_viewed.stats()},
+        "weather_scoring": weather_scorer.stats()
+    }
+
 # ============================================================================
 # WEATHER-BASED OUTFIT RECOMMENDATIONS
 # ============================================================================
@@ -1628,26 +2730,62 @@ async def get_analytics_dashboard():
 OPENWEATHER_API_KEY = os.environ.get('OPENWEATHER_API_KEY')
 logger.info(f"OpenWeather API key loaded: {'Yes' if OPENWEATHER_API_KEY else 'No'}")
 
-# Temperature to outfit category mapping
-TEMP_CATEGORY_RULES = {
-    'hot': {'min_temp': 85, 'styles': ['light', 'summer', 'casual'], 'keywords': ['tank', 'shorts', 'sandals', 'linen', 'breathable']},
-    'warm': {'min_temp': 70, 'styles': ['casual', 'streetwear', 'summer'], 'keywords': ['t-shirt', 'light', 'sneakers', 'casual']},
-    'mild': {'min_temp': 55, 'styles': ['casual', 'smart-casual', 'minimal'], 'keywords': ['long sleeve', 'jeans', 'jacket', 'layers']},
-    'cool': {'min_temp': 40, 'styles': ['layered', 'elegant', 'autumn'], 'keywords': ['sweater', 'coat', 'boots', 'scarf']},
-    'cold': {'min_temp': -100, 'styles': ['winter', 'warm', 'layered'], 'keywords': ['heavy coat', 'layers', 'beanie', 'warm boots']},
-}
+# Current weather per ~5 km geohash cell, shared by everyone in the cell
+weather_cache = WeatherCache(ttl=WEATHER_CACHE_TTL, stale_ttl=WEATHER_STALE_TTL, precision=WEATHER_GEOHASH_PRECISION)
+# cell -> fetch in progress, so concurrent misses for one cell make a single upstream call
+weather_fetches = {}
+
+def fetch_cell_weather(cell: str, prefetch: bool = False):
+    """
+    Fetch current weather at the centre of a geohash cell and cache it.
+    Returns None when over budget or on any provider error.
+    """
+    if not budget.acquire('openweather', endpoint='weather_prefetch' if prefetch else None):
+        return None
+    lat, lon = geohash_center(cell)
+    try:
+        weather_url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={OPENWEATHER_API_KEY}&units=imperial"
+        weather_response = requests.get(weather_url, timeout=5)
+        weather_response.raise_for_status()
+        weather_json = weather_response.json()
+        weather_data = {
+            'temp': weather_json['main']['temp'],
+            'condition': weather_json['weather'][0]['main'] if weather_json.get('weather') else 'Clear',
+            'location': weather_json.get('name') or 'Your Location',
+            'humidity': weather_json['main'].get('humidity', 50),
+            'icon': weather_json['weather'][0].get('icon', '01d') if weather_json.get('weather') else '01d'
+        }
+    except Exception as e:
+        logger.warning(f"Weather API error for cell {cell}: {e}")
+        weather_cache.failed()
+        return None
+    weather_cache.put(cell, weather_data, prefetch=prefetch)
+    return weather_data
 
-def get_temp_category(temp_f: float) -> str:
-    """Get temperature category from Fahrenheit temperature"""
-    if temp_f >= 85:
-        return 'hot'
-    elif temp_f >= 70:
-        return 'warm'
-    elif temp_f >= 55:
-        return 'mild'
-    elif temp_f >= 40:
-        return 'cool'
-    return 'cold'
+async def cell_weather(lat: float, lon: float):
+    """
+    Weather for a location: the cell's cached value while fresh, otherwise
+    one upstream call per cell; the last known value when the provider is
+    slow, failing or over budget. None if there is nothing to serve.
+    """
+    cell = weather_cache.cell(lat, lon)
+    weather_cache.touch(cell)
+    weather_data = weather_cache.get(cell)
+    if weather_data is not None:
+        return weather_data
+    if OPENWEATHER_API_KEY and not budget.is_degraded('openweather'):
+        fetch = weather_fetches.get(cell)
+        if fetch is None:
+            fetch = weather_fetches[cell] = asyncio.ensure_future(asyncio.to_thread(fetch_cell_weather, cell))
+            fetch.add_done_callback(lambda _: weather_fetches.pop(cell, None))
+        try:
+            # A late answer still lands in the cache for the next request
+            weather_data = await asyncio.wait_for(asyncio.shield(fetch), WEATHER_FETCH_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Weather provider slow for cell {cell}, serving last known value")
+        if weather_data is not None:
+            return weather_data
+    return weather_cache.last_known(cell)
 
 def get_weather_style_recommendation(temp_f: float, condition: str) -> dict:
     """Rule-based outfit style recommendation based on weather"""
@@ -1681,7 +2819,8 @@ async def get_weather_outfit_recommendations(
     lat: float = None,
     lon: float = None,
     temp: float = None,
-    condition: str = None
+    condition: str = None,
+    limit: int = 6
 ):
     """
     Get outfit recommendations based on weather.
@@ -1692,24 +2831,12 @@ async def get_weather_outfit_recommendations(
     try:
         weather_data = None
         
-        # Step 1: Get real weather if coordinates provided
-        if lat is not None and lon is not None and OPENWEATHER_API_KEY:
-            try:
-                weather_url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={OPENWEATHER_API_KEY}&units=imperial"
-                weather_response = requests.get(weather_url, timeout=5)
-                
-                if weather_response.status_code == 200:
-                    weather_json = weather_response.json()
-                    weather_data = {
-                        'temp': weather_json['main']['temp'],
-                        'condition': weather_json['weather'][0]['main'] if weather_json.get('weather') else 'Clear',
-                        'location': weather_json.get('name', 'Your Location'),
-                        'humidity': weather_json['main'].get('humidity', 50),
-                        'icon': weather_json['weather'][0].get('icon', '01d') if weather_json.get('weather') else '01d'
-                    }
-                    logger.info(f"Weather fetched: {weather_data['temp']}°F, {weather_data['condition']} in {weather_data['location']}")
-            except Exception as e:
-                logger.warning(f"Weather API error: {e}")
+        # Step 1: Get real weather if coordinates provided - cached per geohash cell
+        # (falls back to client-provided values when there is nothing fresh or last known)
+        if lat is not None and lon is not None:
+            weather_data = await cell_weather(lat, lon)
+            if weather_data:
+                logger.info(f"Weather: {weather_data['temp']}°F, {weather_data['condition']} in {weather_data['location']}")
         
         # Fallback to provided values or defaults
         if not weather_data:
@@ -1728,46 +2855,47 @@ async def get_weather_outfit_recommendations(
         
         logger.info(f"Weather category: {temp_category}, styles: {preferred_styles}")
         
-        # Step 3: Try to get outfits from user's wardrobe first
-        # For v1, we'll check the outfits collection and prioritize based on style match
+        # Step 3: Outfits scored against this weather (see weather_scoring.py)
+        limit = max(1, min(limit, 50))
         recommended_outfits = []
+        condition_tag = weather_condition(weather_data['condition'])
         
-        # Query outfits matching the weather-appropriate styles
-        for style in preferred_styles:
-            style_outfits = list(outfits_collection.find({
-                "$or": [
-                    {"category": {"$regex": style, "$options": "i"}},
-                    {"title": {"$regex": style, "$options": "i"}},
-                    {"description": {"$regex": style, "$options": "i"}}
-                ]
-            }).limit(4))
-            
-            for outfit in style_outfits:
-                outfit['id'] = str(outfit['_id'])
-                del outfit['_id']
+        if outfit_catalog.ready and len(weather_scorer):
+            for doc_id, score in weather_scorer.top(weather_data['temp'], weather_data['condition'], limit):
+                card = outfit_catalog.card(doc_id)
+                if card is None:
+                    continue
+                reason = f"Perfect for {temp_category} weather"
+                if condition_tag and weather_scorer.ready_for(doc_id, condition_tag):
+                    reason += f", ready for {condition_tag}"
+                recommended_outfits.append({**card, 'weather_match_reason': reason, 'weather_score': round(score, 3)})
+        else:
+            # One query on the stored tags (weatherTemps index)
+            tagged_outfits = await outfits_collection.find(
+                {"weatherTemps": temp_category}, OUTFIT_CARD_PROJECTION
+            ).limit(limit).to_list(length=None)
+            for outfit in tagged_outfits:
+                to_api(outfit)
                 outfit['weather_match_reason'] = f"Perfect for {temp_category} weather"
                 recommended_outfits.append(outfit)
         
         # If no style matches, get trending outfits as fallback
         if len(recommended_outfits) == 0:
-            fallback_outfits = list(outfits_collection.aggregate([
-                {"$sample": {"size": 6}}
-            ]))
+            if outfit_catalog.ready and outfit_trending.version:
+                fallback_outfits = [dict(card) for card in map(outfit_catalog.card, outfit_trending.top(limit))
+                                    if card is not None]
+            else:
+                fallback_outfits = await outfits_collection.aggregate([
+                    {"$sample": {"size": limit}},
+                    {"$project": OUTFIT_CARD_PROJECTION}
+                ]).to_list(length=None)
+                for outfit in fallback_outfits:
+                    to_api(outfit)
             for outfit in fallback_outfits:
-                outfit['id'] = str(outfit['_id'])
-                del outfit['_id']
                 outfit['weather_match_reason'] = "Trending pick"
                 recommended_outfits.append(outfit)
         
-        # Remove duplicates and limit to 6
-        seen_ids = set()
-        unique_outfits = []
-        for outfit in recommended_outfits:
-            if outfit['id'] not in seen_ids:
-                seen_ids.add(outfit['id'])
-                unique_outfits.append(outfit)
-            if len(unique_outfits) >= 6:
-                break
+        unique_outfits = recommended_outfits[:limit]
         
         logger.info(f"Returning {len(unique_outfits)} weather-based outfit recommendations")
         
@@ -1800,6 +2928,38 @@ async def get_weather_outfit_recommendations(
             "outfits": []
         }
 
+@api_router.post("/admin/weather/batch")
+async def weather_batch_recommendations(body: WeatherBatchRequest, request: Request):
+    """
+    Top outfit ids for many locations' weather in one pass (push campaigns,
+    precomputed feeds): the whole batch is one matrix product over the
+    outfit feature matrix
+    """
+    if not is_admin_request(request):
+        raise HTTPException(status_code=403, detail="Admin key required")
+    if len(body.locations) > WEATHER_BATCH_MAX_LOCATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {WEATHER_BATCH_MAX_LOCATIONS} locations per request")
+    if not outfit_catalog.ready:
+        raise HTTPException(status_code=503, detail="Outfit catalog is still loading")
+    limit = max(1, min(body.limit, 50))
+    start = time.perf_counter()
+    ranked = await asyncio.to_thread(
+        weather_scorer.top_batch, [(loc.temp, loc.condition) for loc in body.locations], limit
+    )
+    return {
+        "success": True,
+        "results": [
+            {
+                "key": loc.key,
+                "category": get_temp_category(loc.temp),
+                "outfits": [{"id": doc_id, "score": round(score, 3)} for doc_id, score in top],
+            }
+            for loc, top in zip(body.locations, ranked)
+        ],
+        "count": len(ranked),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2)
+    }
+
 # Include router
 app.include_router(api_router)
 
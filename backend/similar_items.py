@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""
+Content-based "similar outfits / looks"
+
+Every document is a TF-IDF vector over its title, category, celebrity,
+description and item/product names and brands (L2-normalized, sublinear tf),
+and its neighbors are the `k` documents with the highest cosine similarity.
+All neighbor lists are computed up front, so serving one is a dict lookup.
+
+Without SciPy the sparse matrix is split in two: the few hundred terms that
+appear in many documents (categories, colors, garment words) form a dense
+float32 block, so their share of every score is one BLAS product; the long
+tail of rarer terms stays in posting lists, whose pairwise contributions are
+cheap because each term touches few documents.
+
+Changes are queued by the snapshot listener and folded in by `refresh()`:
+the changed document's list is recomputed, and it is inserted into (or
+dropped from) only the lists it now qualifies for. IDF weights stay fixed
+between full builds; once enough documents have changed, `refresh()`
+rebuilds everything.
+
+`python similar_items.py` runs the same build against MongoDB and stores the
+lists in the `similar_items` collection, which the endpoints fall back to
+while the catalog snapshot is loading.
+"""
+
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+from search_index import tokenize
+from products import hydrate, load_products
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_K = 10
+# Field weights (a term's tf is the weighted count over these)
+TEXT_WEIGHTS = {'title': 2.0, 'celebrity': 2.0, 'description': 1.0}
+CATEGORY_WEIGHT = 3.0
+ITEM_WEIGHT = 1.0
+BRAND_WEIGHT = 1.5
+STOPWORDS = frozenset('a an and for in of on or the to with your you is are at by from this that it its'.split())
+# Terms in at least this many documents (and at most MAX_HEAD_TERMS of them) go in the dense block
+HEAD_MIN_DF = 32
+MAX_HEAD_TERMS = 512
+# Bound the per-block score matrix (rows x documents) during a full build
+BLOCK_CELLS = 4_000_000
+# Full rebuild (fresh IDF) once this share of documents has changed since the last one
+REBUILD_FRACTION = 0.2
+
+
+def document_terms(doc: dict) -> Counter:
+    """term -> weighted count"""
+    counts = Counter()
+    for field, weight in TEXT_WEIGHTS.items():
+        for token in tokenize(doc.get(field)):
+            if token not in STOPWORDS and len(token) > 1:
+                counts[token] += weight
+    category = doc.get('category')
+    if isinstance(category, str) and category:
+        counts[f"category:{category.lower()}"] += CATEGORY_WEIGHT
+    for field in ('items', 'products'):
+        for entry in doc.get(field) or []:
+            if not isinstance(entry, dict):
+                continue
+            for token in tokenize([entry.get('name') or '', entry.get('type') or '']):
+                if token not in STOPWORDS and len(token) > 1:
+                    counts[token] += ITEM_WEIGHT
+            if entry.get('brand'):
+                counts[f"brand:{' '.join(tokenize(entry['brand']))}"] += BRAND_WEIGHT
+    if doc.get('brand'):
+        counts[f"brand:{' '.join(tokenize(doc['brand']))}"] += BRAND_WEIGHT
+    return counts
+
+
+class SimilarIndex:
+    """Top-k cosine neighbors of every catalog document, kept current incrementally"""
+
+    def __init__(self, k: int = DEFAULT_K, head_min_df: int = HEAD_MIN_DF, max_head_terms: int = MAX_HEAD_TERMS):
+        self.k = k
+        self.head_min_df = head_min_df
+        self.max_head_terms = max_head_terms
+        self._lock = threading.Lock()
+        # Documents changed since they were last folded in: id -> doc (None = removed)
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._reset(0, {}, np.zeros(0))
+        # id -> ((neighbor id, score), ...), best first; replaced wholesale, never mutated
+        self._published = {}
+        self.built = False
+        self.version = 0
+        self.metrics = {'builds': 0, 'last_build_ms': None, 'updates': 0, 'lists_recomputed': 0,
+                        'last_update_ms': None}
+
+    def _reset(self, n: int, vocab: dict, idf: np.ndarray):
+        self._vocab = vocab
+        self._idf = list(idf)
+        self._head_cols = {}
+        capacity = max(n, 64)
+        self._head = np.zeros((capacity, 0), dtype=np.float32)
+        self._active = np.zeros(capacity, dtype=bool)
+        # Smallest score on each row's list, or 0 while the list is short
+        self._kth = np.zeros(capacity, dtype=np.float32)
+        # tail term id -> {row: weight}; row -> (tail term ids, weights)
+        self._tail = {}
+        self._row_tail = []
+        self._ids = []
+        self._rows = {}
+        self._free = []
+        # row -> [(neighbor row, score)], and row -> rows whose lists contain it
+        self._lists = []
+        self._reverse = []
+        self._changed_since_build = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    # ---------- changes ----------
+
+    def update(self, doc_id: str, doc):
+        """Snapshot listener: queue a changed (or deleted, doc None) document for the next refresh"""
+        with self._pending_lock:
+            self._pending[doc_id] = doc
+
+    def refresh(self, all_docs) -> str:
+        """
+        Fold queued changes in, or rebuild from `all_docs()` when nothing is
+        built yet or IDF has drifted; returns what was done
+        """
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        if not self.built or self._changed_since_build + len(pending) > REBUILD_FRACTION * max(len(self), 1):
+            self.rebuild(all_docs())
+            return 'rebuilt'
+        if pending:
+            self.apply(pending)
+            return 'updated'
+        return 'unchanged'
+
+    def apply(self, changes: dict):
+        """Upsert / remove documents (id -> doc or None) and repair the affected neighbor lists"""
+        start = time.perf_counter()
+        with self._lock:
+            recomputed = set()
+            for doc_id, doc in changes.items():
+                if doc is None:
+                    recomputed |= self._remove_locked(doc_id)
+                else:
+                    recomputed |= self._upsert_locked(doc_id, doc)
+            self._changed_since_build += len(changes)
+            self._publish_locked(recomputed)
+            self.version += 1
+        self.metrics['updates'] += len(changes)
+        self.metrics['lists_recomputed'] += len(recomputed)
+        self.metrics['last_update_ms'] = round((time.perf_counter() - start) * 1000, 3)
+
+    # ---------- vectors ----------
+
+    def _vector(self, counts: Counter) -> dict:
+        """term id -> TF-IDF weight (unit length); unseen terms get the rarest-term IDF"""
+        rare_idf = math.log((1 + max(len(self._rows), 1)) / 2) + 1
+        vector = {}
+        for term, tf in counts.items():
+            tid = self._vocab.get(term)
+            if tid is None:
+                tid = self._vocab[term] = len(self._idf)
+                self._idf.append(rare_idf)
+            vector[tid] = (1 + math.log(tf)) * self._idf[tid]
+        norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+        return {tid: w / norm for tid, w in vector.items()}
+
+    def _ensure_capacity_locked(self, rows: int):
+        if rows <= len(self._head):
+            return
+        capacity = max(rows, 2 * len(self._head))
+        head = np.zeros((capacity, self._head.shape[1]), dtype=np.float32)
+        head[:len(self._head)] = self._head
+        self._head = head
+        for name in ('_active', '_kth'):
+            old = getattr(self, name)
+            grown = np.zeros(capacity, dtype=old.dtype)
+            grown[:len(old)] = old
+            setattr(self, name, grown)
+
+    def _store_locked(self, row: int, vector: dict):
+        self._head[row] = 0.0
+        tail_ids, tail_weights = [], []
+        for tid, weight in vector.items():
+            col = self._head_cols.get(tid)
+            if col is not None:
+                self._head[row, col] = weight
+            else:
+                self._tail.setdefault(tid, {})[row] = weight
+                tail_ids.append(tid)
+                tail_weights.append(weight)
+        self._row_tail[row] = (tail_ids, tail_weights)
+        self._active[row] = True
+
+    def _clear_locked(self, row: int):
+        self._head[row] = 0.0
+        for tid in self._row_tail[row][0]:
+            postings = self._tail.get(tid)
+            if postings is not None:
+                postings.pop(row, None)
+                if not postings:
+                    del self._tail[tid]
+        self._row_tail[row] = ((), ())
+        self._active[row] = False
+
+    def _scores_locked(self, row: int) -> np.ndarray:
+        """Cosine similarity of one row against every row (itself and free rows at -inf)"""
+        n = len(self._ids)
+        scores = self._head[:n] @ self._head[row] if self._head.shape[1] else np.zeros(n, dtype=np.float32)
+        for tid, weight in zip(*self._row_tail[row]):
+            postings = self._tail[tid]
+            rows = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+            weights = np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+            scores[rows] += weight * weights
+        scores[~self._active[:n]] = -np.inf
+        scores[row] = -np.inf
+        return scores
+
+    def _top_k(self, scores: np.ndarray) -> list:
+        k = min(self.k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(r), float(scores[r])) for r in top if scores[r] > 0]
+
+    # ---------- neighbor lists ----------
+
+    def _set_list_locked(self, row: int, neighbors: list):
+        for other, _ in self._lists[row]:
+            self._reverse[other].discard(row)
+        self._lists[row] = neighbors
+        for other, _ in neighbors:
+            self._reverse[other].add(row)
+        self._kth[row] = neighbors[-1][1] if len(neighbors) >= self.k else 0.0
+
+    def _recompute_locked(self, row: int):
+        self._set_list_locked(row, self._top_k(self._scores_locked(row)))
+
+    def _upsert_locked(self, doc_id: str, doc: dict) -> set:
+        vector = self._vector(document_terms(doc))
+        row = self._rows.get(doc_id)
+        if row is None:
+            row = self._free.pop() if self._free else len(self._ids)
+            if row == len(self._ids):
+                self._ensure_capacity_locked(row + 1)
+                self._ids.append(None)
+                self._row_tail.append(((), ()))
+                self._lists.append([])
+                self._reverse.append(set())
+            self._rows[doc_id] = row
+            self._ids[row] = doc_id
+        else:
+            self._clear_locked(row)
+        self._store_locked(row, vector)
+        scores = self._scores_locked(row)
+        self._set_list_locked(row, self._top_k(scores))
+        touched = {row}
+        # Lists that held this document: rescore it, or recompute if it fell below their tail
+        for other in list(self._reverse[row]):
+            if scores[other] >= self._kth[other] and scores[other] > 0:
+                neighbors = sorted(((r, float(scores[other]) if r == row else s) for r, s in self._lists[other]),
+                                   key=lambda item: -item[1])
+                self._set_list_locked(other, neighbors)
+            else:
+                self._recompute_locked(other)
+            touched.add(other)
+        # Lists it now qualifies for: insert it, dropping their last entry when full
+        n = len(self._ids)
+        for other in np.nonzero(scores > self._kth[:n])[0].tolist():
+            if other in touched or not self._active[other]:
+                continue
+            neighbors = sorted(self._lists[other] + [(row, float(scores[other]))], key=lambda item: -item[1])
+            self._set_list_locked(other, neighbors[:self.k])
+            touched.add(other)
+        return touched
+
+    def _remove_locked(self, doc_id: str) -> set:
+        row = self._rows.pop(doc_id, None)
+        if row is None:
+            return set()
+        self._clear_locked(row)
+        self._set_list_locked(row, [])
+        holders = list(self._reverse[row])
+        for other in holders:
+            self._recompute_locked(other)
+        self._ids[row] = None
+        self._free.append(row)
+        self._published.pop(doc_id, None)
+        return set(holders)
+
+    def _publish_locked(self, rows, published: dict = None):
+        """Publish the lists of `rows` into `published` (default: the live lists)"""
+        published = self._published if published is None else published
+        for row in rows:
+            doc_id = self._ids[row]
+            if doc_id is not None:
+                published[doc_id] = tuple((self._ids[r], round(s, 4)) for r, s in self._lists[row])
+
+    # ---------- full build ----------
+
+    def rebuild(self, docs):
+        """Recompute vocabulary, IDF and every neighbor list from scratch (API-form docs with 'id')"""
+        start = time.perf_counter()
+        docs = [doc for doc in docs if doc.get('id')]
+        term_counts = [document_terms(doc) for doc in docs]
+        df = Counter(term for counts in term_counts for term in counts)
+        n = len(docs)
+        vocab = {term: i for i, term in enumerate(df)}
+        idf = np.array([math.log((1 + n) / (1 + df[term])) + 1 for term in vocab], dtype=np.float64)
+        head_terms = [term for term, count in df.most_common(self.max_head_terms) if count >= self.head_min_df]
+
+        with self._lock:
+            self._reset(n, vocab, idf)
+            self._head_cols = {vocab[term]: col for col, term in enumerate(head_terms)}
+            self._head = np.zeros((max(n, 64), len(head_terms)), dtype=np.float32)
+            for row, doc in enumerate(docs):
+                self._ids.append(doc['id'])
+                self._rows[doc['id']] = row
+                self._row_tail.append(((), ()))
+                self._lists.append([])
+                self._reverse.append(set())
+                self._store_locked(row, self._vector(term_counts[row]))
+            self._build_lists_locked()
+            # Readers don't take the lock: swap in the complete lists in one assignment
+            published = {}
+            self._publish_locked(range(n), published)
+            self._published = published
+            self.built = True
+            self.version += 1
+        self.metrics['builds'] += 1
+        self.metrics['last_build_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        logger.info(f"Similar items built: {n} documents, {len(vocab)} terms ({len(head_terms)} dense) "
+                    f"in {self.metrics['last_build_ms']} ms")
+
+    def _tail_arrays_locked(self):
+        """Tail postings as CSC-style arrays (term -> rows) and rows -> terms, for block scoring"""
+        n = len(self._ids)
+        local = {tid: i for i, tid in enumerate(self._tail)}
+        col_ptr = np.zeros(len(local) + 1, dtype=np.int64)
+        col_ptr[1:] = np.cumsum([len(self._tail[tid]) for tid in local])
+        col_rows = np.empty(col_ptr[-1], dtype=np.int64)
+        col_vals = np.empty(col_ptr[-1], dtype=np.float32)
+        for tid, i in local.items():
+            postings = self._tail[tid]
+            col_rows[col_ptr[i]:col_ptr[i + 1]] = list(postings.keys())
+            col_vals[col_ptr[i]:col_ptr[i + 1]] = list(postings.values())
+        row_ptr = np.zeros(n + 1, dtype=np.int64)
+        row_ptr[1:] = np.cumsum([len(self._row_tail[row][0]) for row in range(n)])
+        row_terms = np.fromiter((local[tid] for row in range(n) for tid in self._row_tail[row][0]),
+                                dtype=np.int64, count=row_ptr[-1])
+        row_vals = np.fromiter((w for row in range(n) for w in self._row_tail[row][1]),
+                               dtype=np.float32, count=row_ptr[-1])
+        return col_ptr, col_rows, col_vals, row_ptr, row_terms, row_vals
+
+    def _build_lists_locked(self):
+        n = len(self._ids)
+        if n == 0:
+            return
+        col_ptr, col_rows, col_vals, row_ptr, row_terms, row_vals = self._tail_arrays_locked()
+        head = self._head[:n]
+        block = max(1, BLOCK_CELLS // n)
+        k = min(self.k, n - 1)
+        for b0 in range(0, n, block):
+            b1 = min(n, b0 + block)
+            size = b1 - b0
+            scores = head[b0:b1] @ head.T if head.shape[1] else np.zeros((size, n), dtype=np.float32)
+            # Tail: every (row, term) entry in the block meets every other row in the term's postings
+            lo, hi = row_ptr[b0], row_ptr[b1]
+            if hi > lo:
+                terms = row_terms[lo:hi]
+                lengths = col_ptr[terms + 1] - col_ptr[terms]
+                total = int(lengths.sum())
+                if total:
+                    entry_rows = np.repeat(np.arange(size), np.diff(row_ptr[b0:b1 + 1]))
+                    offsets = np.repeat(col_ptr[terms] - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+                    cells = np.repeat(entry_rows, lengths) * n + col_rows[offsets]
+                    weights = np.repeat(row_vals[lo:hi], lengths) * col_vals[offsets]
+                    scores += np.bincount(cells, weights=weights, minlength=size * n).reshape(size, n)
+            scores[np.arange(size), np.arange(b0, b1)] = -np.inf
+            if k <= 0:
+                continue
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            best = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-best, axis=1, kind='stable')
+            top = np.take_along_axis(top, order, axis=1).tolist()
+            best = np.take_along_axis(best, order, axis=1).tolist()
+            for i in range(size):
+                self._set_list_locked(b0 + i, [(r, s) for r, s in zip(top[i], best[i]) if s > 0])
+
+    # ---------- reads ----------
+
+    def ids(self) -> list:
+        return list(self._rows)
+
+    def neighbors(self, doc_id: str, limit: int = None) -> tuple:
+        """((neighbor id, score), ...) best first, or () if unknown"""
+        neighbors = self._published.get(doc_id, ())
+        return neighbors[:limit] if limit is not None else neighbors
+
+    def memory_bytes(self) -> int:
+        """Approximate footprint: dense block and masks, plus ~100 bytes per posting / list entry"""
+        entries = sum(len(postings) for postings in self._tail.values())
+        listed = sum(len(neighbors) for neighbors in self._lists)
+        return int(self._head.nbytes + self._active.nbytes + self._kth.nbytes + 100 * (entries + 2 * listed))
+
+    def stats(self) -> dict:
+        return {
+            'built': self.built,
+            'documents': len(self._rows),
+            'k': self.k,
+            'terms': len(self._vocab),
+            'dense_terms': len(self._head_cols),
+            'pending': len(self._pending),
+            'changed_since_build': self._changed_since_build,
+            'memory_mb': round(self.memory_bytes() / 1e6, 2),
+            **self.metrics,
+        }
+
+
+def store(db, name: str, index: SimilarIndex, dry_run: bool = False) -> int:
+    """Write every neighbor list to `similar_items` as {_id: '<collection>:<id>', neighbors: [...]}"""
+    from pymongo import ReplaceOne
+
+    ids = index.ids()
+    built_at = time.time()
+    ops = [ReplaceOne({'_id': f"{name}:{doc_id}"},
+                      {'collection': name, 'itemId': doc_id, 'builtAt': built_at,
+                       'neighbors': [{'id': other, 'score': score} for other, score in index.neighbors(doc_id)]},
+                      upsert=True)
+           for doc_id in ids]
+    if not dry_run:
+        for i in range(0, len(ops), 1000):
+            db['similar_items'].bulk_write(ops[i:i + 1000], ordered=False)
+        # Lists of documents that no longer exist
+        db['similar_items'].delete_many({'collection': name, 'builtAt': {'$lt': built_at}})
+    return len(ops)
+
+
+def main():
+    from pymongo import MongoClient
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    dry_run = '--dry-run' in sys.argv
+    client = MongoClient(os.getenv('MONGO_URL', 'mongodb://localhost:27017/'))
+    db = client[os.getenv('DB_NAME', 'app_database')]
+    products = load_products(db)
+    for name in ('outfits', 'beauty_looks'):
+        docs = [{**hydrate(doc, products.get), 'id': str(doc['_id'])} for doc in db[name].find({})]
+        index = SimilarIndex()
+        index.rebuild(docs)
+        count = store(db, name, index, dry_run=dry_run)
+        stats = index.stats()
+        print(f"{name}: {count} neighbor lists {'would be ' if dry_run else ''}stored "
+              f"({stats['terms']} terms, {stats['last_build_ms']} ms, ~{stats['memory_mb']} MB)")
+    client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+"""
+Fuzzy title scoring for TMDB candidates
+
+Replaces the equality/substring checks with magic scores (10000/5000/4000/1)
+that the recognition endpoints used to rank movies. A query is compared with
+the normalized titles of the top N results of a single TMDB search (or of a
+person's credits) using token coverage plus edit distance, then weighted by
+TMDB popularity and the Vision entity score.
+
+Candidates are normalized once, when they are fetched (`with_title_keys`),
+never per scoring call. Scoring a list computes a character-count upper bound
+on the edit similarity of every candidate in one NumPy pass; pairs without a
+shared word whose bound rules out a match are never compared character by
+character, and the remaining distances are bit-parallel and memoized.
+"""
+
+import math
+from array import array
+from functools import lru_cache
+
+import numpy as np
+
+from query_normalize import normalize_query
+
+# Similarity at or above which a candidate counts as a real title match
+MATCH_THRESHOLD = 0.65
+# Similarity at or above which no other candidate can meaningfully beat it
+PERFECT_THRESHOLD = 0.97
+# Without a shared word a title's similarity is its edit similarity; titles
+# whose bound cannot reach a match are scored 0 without computing the distance
+MIN_EDIT_SIMILARITY = MATCH_THRESHOLD
+
+# How many TMDB search results are scored per query
+TOP_N = 5
+
+# Result field holding its precomputed TitleKeys (internal, never sent to clients)
+TITLE_KEYS_FIELD = '_title_keys'
+
+# Popularity above this is treated as "maximally popular"
+_POPULARITY_CAP = math.log1p(500)
+
+
+# Character-count vectors: one column per common character, the rest hashed into buckets
+# (a shared bucket only loosens the bound, it never rules out a real match)
+_ALPHABET = 'abcdefghijklmnopqrstuvwxyz0123456789 '
+_COLUMN = {ch: i for i, ch in enumerate(_ALPHABET)}
+_BUCKETS = 64 - len(_ALPHABET)
+
+
+def char_counts(key: str) -> bytes:
+    counts = array('H', bytes(2 * (len(_ALPHABET) + _BUCKETS)))
+    for ch in key:
+        column = _COLUMN.get(ch)
+        if column is None:
+            column = len(_ALPHABET) + ord(ch) % _BUCKETS
+        counts[column] += 1
+    return counts.tobytes()
+
+
+class TitleKey:
+    """A title (or query) normalized once: its key, words and character counts"""
+
+    __slots__ = ('key', 'tokens', 'counts', 'length', 'signature')
+
+    def __init__(self, text: str):
+        self.key = normalize_query(text or '')
+        self.tokens = frozenset(self.key.split())
+        self.counts = char_counts(self.key)
+        self.length = len(self.key)
+        # One bit per word (hashed into 64): disjoint signatures mean no shared word
+        self.signature = 0
+        for token in self.tokens:
+            self.signature |= 1 << (hash(token) & 63)
+
+
+def title_keys(result: dict) -> tuple:
+    """TitleKeys of a TMDB result's title and (if different) original title"""
+    keys = result.get(TITLE_KEYS_FIELD)
+    if keys is None:
+        title, original = result.get('title') or '', result.get('original_title')
+        keys = (TitleKey(title),) + ((TitleKey(original),) if original and original != title else ())
+    return keys
+
+
+def with_title_keys(results: list) -> list:
+    """
+    Attach TitleKeys to TMDB results (in place) where they are fetched, so
+    scoring never normalizes a candidate; strip TITLE_KEYS_FIELD before
+    returning results to a client
+    """
+    for result in results:
+        if TITLE_KEYS_FIELD not in result:
+            result[TITLE_KEYS_FIELD] = title_keys(result)
+    return results
+
+
+def levenshtein(a: str, b: str) -> int:
+    """
+    Edit distance by the bit-parallel algorithm (Myers/Hyyrö): each character
+    of `a` updates whole columns of the DP matrix at once as integer bit
+    vectors, instead of len(b) Python-level min() calls
+    """
+    # A shared prefix or suffix never costs an edit ("inception" / "inception 2")
+    start, shortest = 0, min(len(a), len(b))
+    while start < shortest and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < shortest - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a, b = a[start:len(a) - end], b[start:len(b) - end]
+    if len(a) > len(b):
+        # One column update per character of the shorter string
+        a, b = b, a
+    if not a:
+        return len(b)
+    if not b:
+        return len(a)
+    full = (1 << len(b)) - 1
+    last = 1 << (len(b) - 1)
+    masks = {}
+    for i, ch in enumerate(b):
+        masks[ch] = masks.get(ch, 0) | (1 << i)
+    pv, mv, distance = full, 0, len(b)
+    for ch in a:
+        eq = masks.get(ch, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & full)
+        mh = pv & xh
+        if ph & last:
+            distance += 1
+        elif mh & last:
+            distance -= 1
+        ph = ((ph << 1) | 1) & full
+        mh = (mh << 1) & full
+        pv = mh | (~(xv | ph) & full)
+        mv = ph & xv
+    return distance
+
+
+@lru_cache(maxsize=16384)
+def edit_similarity(a: str, b: str) -> float:
+    """1 - Levenshtein(a, b) / max(len) on already-normalized strings"""
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    return 1.0 - levenshtein(a, b) / max(len(a), len(b))
+
+
+def common_chars(query: TitleKey, keys: list) -> list:
+    """How many characters (counted with multiplicity) each key has in common with `query`"""
+    counts = np.frombuffer(b''.join([key.counts for key in keys]), dtype=np.uint16).reshape(len(keys), -1)
+    return np.minimum(counts, np.frombuffer(query.counts, dtype=np.uint16)).sum(axis=1).tolist()
+
+
+def edit_bound(query: TitleKey, title: TitleKey, common: int) -> float:
+    """
+    Upper bound on edit_similarity(query, title) from their `common`
+    characters: every character one string has more of than the other costs
+    at least one edit, so the distance is at least max(len) - common
+    """
+    longest = max(query.length, title.length)
+    return common / longest if longest else 1.0
+
+
+def key_similarity(query: TitleKey, title: TitleKey, bound: float) -> float:
+    """
+    Similarity in [0, 1] between a normalized query and a normalized title,
+    `bound` being an upper bound on their edit similarity (see edit_bound).
+
+    Weighted toward how much of the *query* the title explains, so
+    "dark knight" -> "The Dark Knight Rises" scores well while
+    "leonardo dicaprio" -> "Leonardo" (an actor name hitting a title) does not.
+    """
+    if query.key == title.key:
+        return 1.0
+    if not query.tokens or not title.tokens:
+        return 0.0
+    shared = len(query.tokens & title.tokens)
+    if not shared:
+        # Without a shared word only the edit similarity counts; skip the
+        # distance when its bound already rules out a match
+        if bound < MIN_EDIT_SIMILARITY:
+            return 0.0
+        return edit_similarity(query.key, title.key)
+    edit = edit_similarity(query.key, title.key)
+    coverage = 0.55 * shared / len(query.tokens) + 0.25 * shared / len(title.tokens) + 0.2 * edit
+    return max(edit, coverage)
+
+
+def title_similarity(query: str, title: str) -> float:
+    """Similarity in [0, 1] between a query and one title (see key_similarity)"""
+    query_key, title_key = TitleKey(query), TitleKey(title)
+    bound = edit_bound(query_key, title_key, common_chars(query_key, [title_key])[0])
+    return key_similarity(query_key, title_key, bound)
+
+
+def candidate_similarities(query: TitleKey, results: list) -> list:
+    """Best similarity of `query` against each TMDB result's title or original title"""
+    rows = [(i, key) for i, result in enumerate(results) for key in title_keys(result)]
+    best = [0.0] * len(results)
+    if not rows:
+        return best
+    query_length = query.length
+    for (i, key), common in zip(rows, common_chars(query, [key for _, key in rows])):
+        if best[i] < 1.0:
+            # Only titles that may share a word with the query, or whose edit
+            # bound allows a match, are worth scoring (edit_bound, inlined)
+            longest = key.length if key.length > query_length else query_length
+            bound = common / longest if longest else 1.0
+            if key.signature & query.signature or bound >= MIN_EDIT_SIMILARITY:
+                best[i] = max(best[i], key_similarity(query, key, bound))
+    return best
+
+
+def candidate_similarity(query: str, result: dict) -> float:
+    """Best similarity of `query` against a TMDB result's title or original title"""
+    return candidate_similarities(TitleKey(query), [result])[0]
+
+
+def weighted_score(similarity: float, popularity: float = 0.0, entity_score: float = 0.0) -> float:
+    """Similarity dominates; popularity and Vision confidence only break near-ties"""
+    pop = min(math.log1p(popularity) / _POPULARITY_CAP, 1.0) if popularity and popularity > 0 else 0.0
+    ent = min(entity_score / 1.5, 1.0) if entity_score and entity_score > 0 else 0.0
+    return similarity * (0.9 + 0.07 * pop + 0.03 * ent)
+
+
+def rank_results(query: str, results: list, entity_score: float = 0.0, top_n: int = TOP_N) -> list:
+    """
+    Score the top `top_n` TMDB search results for `query`.
+    Returns [(weighted_score, similarity, result)] sorted best first.
+    """
+    candidates = results[:top_n]
+    scored = []
+    for result, similarity in zip(candidates, candidate_similarities(TitleKey(query), candidates)):
+        # Most of a long credits list shares nothing with the query and scores 0 whatever its popularity
+        score = weighted_score(similarity, result.get('popularity', 0.0), entity_score) if similarity else 0.0
+        scored.append((score, similarity, result))
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return scored
+
+
+def best_match(query: str, results: list, entity_score: float = 0.0, top_n: int = TOP_N):
+    """(weighted_score, similarity, result) of the best candidate, or None"""
+    ranked = rank_results(query, results, entity_score, top_n)
+    return ranked[0] if ranked else None
@@ -0,0 +1,224 @@
+"""
+Caches in front of TMDB search
+
+Most junk phrases produced by the OCR and Whisper fallbacks ("Directed By",
+"Coming Soon", ...) always come back empty from TMDB. Remembering those
+misses lets repeat scans answer them in-process instead of paying a
+100-300ms round trip each time:
+
+- TTLCache: small bounded dict with per-entry expiry
+- BloomFilter: compact bit array for "definitely never seen" checks
+- NegativeCache: short-TTL exact misses backed by a Bloom filter that is
+  persisted to MongoDB so it survives restarts
+"""
+
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Bounded LRU mapping whose entries expire `ttl` seconds after being set"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl: float = None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + (ttl if ttl is not None else self.ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[1] if entry is not None else default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+_MISSING = object()
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter using double hashing over a blake2b digest"""
+
+    def __init__(self, capacity: int = 100_000, error_rate: float = 0.01, bits: bytes = None):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        nbytes = (self.size + 7) // 8
+        if bits is not None and len(bits) == nbytes:
+            self.bits = bytearray(bits)
+        else:
+            self.bits = bytearray(nbytes)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key: str) -> bool:
+        """Add a key; returns True if it was not (probably) present before"""
+        added = False
+        for pos in self._positions(key):
+            byte, bit = divmod(pos, 8)
+            if not self.bits[byte] & (1 << bit):
+                self.bits[byte] |= 1 << bit
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def __contains__(self, key: str) -> bool:
+        for pos in self._positions(key):
+            byte, bit = divmod(pos, 8)
+            if not self.bits[byte] & (1 << bit):
+                return False
+        return True
+
+    def is_saturated(self) -> bool:
+        return self.count >= self.capacity
+
+
+class NegativeCache:
+    """
+    Known-miss cache for TMDB searches.
+
+    Fresh misses go into a short-TTL exact cache. A query that misses again
+    after its TTL expired is a repeat offender and is added to the Bloom
+    filter, which answers it in-process from then on. A background task
+    saves the filter periodically; it is rotated after `max_age` seconds
+    (or once saturated) so newly released titles are not shadowed forever.
+    """
+
+    STATE_ID = 'tmdb_miss_bloom'
+
+    def __init__(self, collection=None, ttl: float = 600, capacity: int = 100_000,
+                 error_rate: float = 0.01, max_age: float = 7 * 86400):
+        self.collection = collection
+        self.recent = TTLCache(maxsize=5000, ttl=ttl)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.max_age = max_age
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.created_at = time.time()
+        self._seen = TTLCache(maxsize=20_000, ttl=max_age)
+        self._unsaved = 0
+        self.bloom_hits = 0
+        # TMDB searches also run in worker threads (unified search)
+        self._lock = threading.Lock()
+
+    def is_known_miss(self, key: str) -> bool:
+        if key in self.recent:
+            return True
+        with self._lock:
+            self._maybe_rotate_locked()
+            if key in self.bloom:
+                self.bloom_hits += 1
+                return True
+        return False
+
+    def add(self, key: str):
+        """Record an empty TMDB result for `key`"""
+        self.recent.set(key, True)
+        with self._lock:
+            if key in self._seen:
+                if self.bloom.add(key):
+                    self._unsaved += 1
+            else:
+                self._seen.set(key, True)
+
+    def forget(self, key: str):
+        """Drop an exact entry (the Bloom filter cannot delete; rotation handles that)"""
+        self.recent.pop(key)
+
+    def _maybe_rotate_locked(self):
+        if time.time() - self.created_at > self.max_age or self.bloom.is_saturated():
+            logger.info("Rotating TMDB miss Bloom filter")
+            self.bloom = BloomFilter(self.capacity, self.error_rate)
+            self.created_at = time.time()
+            self._unsaved = 1
+
+    async def load(self):
+        """Restore the Bloom filter persisted by a previous process"""
+        if self.collection is None:
+            return
+        try:
+            doc = await self.collection.find_one({"_id": self.STATE_ID})
+            if not doc or time.time() - doc.get('created_at', 0) > self.max_age:
+                return
+            bloom = BloomFilter(self.capacity, self.error_rate, bits=bytes(doc['bits']))
+            bloom.count = doc.get('count', 0)
+            with self._lock:
+                self.bloom = bloom
+                self.created_at = doc['created_at']
+            logger.info(f"Loaded TMDB miss Bloom filter ({bloom.count} entries)")
+        except Exception as e:
+            logger.warning(f"Could not load TMDB miss Bloom filter: {e}")
+
+    async def save(self):
+        """Persist the Bloom filter if it changed since the last save"""
+        if self.collection is None or not self._unsaved:
+            return
+        with self._lock:
+            state = {"_id": self.STATE_ID, "bits": bytes(self.bloom.bits), "count": self.bloom.count,
+                     "created_at": self.created_at, "updated_at": time.time()}
+            unsaved, self._unsaved = self._unsaved, 0
+        try:
+            await self.collection.replace_one({"_id": self.STATE_ID}, state, upsert=True)
+        except Exception as e:
+            with self._lock:
+                self._unsaved += unsaved
+            logger.warning(f"Could not persist TMDB miss Bloom filter: {e}")
+
+    def stats(self) -> dict:
+        return {
+            'recent': self.recent.stats(),
+            'bloom_entries': self.bloom.count,
+            'bloom_bytes': len(self.bloom.bits),
+            'bloom_hits': self.bloom_hits,
+        }
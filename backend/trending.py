@@ -0,0 +1,150 @@
+"""
+Engagement-ranked trending feeds
+
+Scores are exponentially time-decayed engagement: every view, favorite or
+product click adds its weight, and a contribution halves every `half_life`
+seconds. Scores are stored relative to a fixed base time, so recording an
+event is a single addition and no stored score ever has to be decayed -
+decay only matters when comparing against "now", and it scales every item
+equally.
+
+Events are folded in as they are tracked; ranked lists per category are
+rebuilt from memory in the background, so serving a trending feed is a list
+slice. At startup the scores are rebuilt from the analytics collection,
+aggregated per item, event type and day.
+"""
+
+import heapq
+import logging
+import math
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HALF_LIFE = 3 * 86400
+# Re-base the stored scores before 2**exponent gets anywhere near float overflow
+MAX_EXPONENT = 500
+
+OUTFIT_EVENT_WEIGHTS = {'outfit_view': 1.0, 'outfit_favorited': 5.0, 'product_click': 3.0}
+BEAUTY_EVENT_WEIGHTS = {'beauty_view': 1.0, 'beauty_favorited': 5.0, 'product_click': 3.0}
+
+
+class TrendingRanker:
+    """Time-decayed engagement scores for one catalog, with ranked lists per category"""
+
+    def __init__(self, weights: dict, half_life: float = DEFAULT_HALF_LIFE):
+        self.weights = weights
+        self.half_life = half_life
+        self.base_time = time.time()
+        # item id -> score in base_time units
+        self._scores = {}
+        # category (None = all) -> item ids, best first
+        self._ranked = {}
+        self._lock = threading.Lock()
+        self.version = 0
+        self.events = 0
+
+    def _growth(self, timestamp: float) -> float:
+        return (timestamp - self.base_time) / self.half_life
+
+    def record(self, item_id: str, event_type: str, timestamp: float = None, count: int = 1):
+        weight = self.weights.get(event_type)
+        if not weight or not item_id:
+            return
+        exponent = self._growth(timestamp if timestamp is not None else time.time())
+        with self._lock:
+            if exponent > MAX_EXPONENT:
+                self._rebase_locked()
+                exponent = self._growth(timestamp if timestamp is not None else time.time())
+            self._scores[item_id] = self._scores.get(item_id, 0.0) + count * weight * 2.0 ** exponent
+            self.events += count
+
+    def _rebase_locked(self):
+        now = time.time()
+        factor = 2.0 ** -self._growth(now)
+        self._scores = {item: score * factor for item, score in self._scores.items() if score * factor > 1e-12}
+        self.base_time = now
+
+    def score(self, item_id: str, now: float = None) -> float:
+        """Current decayed score of one item"""
+        return self._scores.get(item_id, 0.0) * 2.0 ** -self._growth(now or time.time())
+
+    async def load(self, analytics, window_days: int = 30):
+        """Rebuild scores from analytics events of the last `window_days` days"""
+        since = time.time() - window_days * 86400
+        pipeline = [
+            {"$match": {"event_type": {"$in": list(self.weights)}, "timestamp": {"$gte": since}}},
+            {"$group": {
+                "_id": {"item": "$item_id", "type": "$event_type",
+                        "day": {"$floor": {"$divide": ["$timestamp", 86400]}}},
+                "count": {"$sum": 1},
+            }},
+        ]
+        try:
+            buckets = await analytics.aggregate(pipeline).to_list(length=None)
+        except Exception as e:
+            logger.warning(f"Could not load trending scores: {e}")
+            return
+        with self._lock:
+            self._scores = {}
+            self.base_time = time.time()
+        for bucket in buckets:
+            key = bucket['_id']
+            # Attribute a day's events to its midpoint
+            self.record(key.get('item'), key.get('type'), key['day'] * 86400 + 43200, bucket['count'])
+        logger.info(f"Trending scores loaded: {len(self._scores)} items from {len(buckets)} day buckets")
+
+    def rebuild(self, docs, category_of=lambda doc: doc.get('category'), eligible=None):
+        """
+        Recompute ranked id lists (overall and per category) for `docs`.
+        Items without engagement follow the engaged ones, newest first.
+        """
+        with self._lock:
+            scores = dict(self._scores)
+        ranked, ordered = {}, []
+        for doc in docs:
+            if eligible is not None and not eligible(doc):
+                continue
+            ordered.append((-scores.get(doc['id'], 0.0), _neg_id(doc['id']), doc['id'], category_of(doc)))
+        ordered.sort()
+        for _, _, doc_id, category in ordered:
+            ranked.setdefault(None, []).append(doc_id)
+            ranked.setdefault(category, []).append(doc_id)
+        self._ranked = ranked
+        self.version += 1
+
+    def top(self, limit: int = 10, category: str = None, randomize: bool = False, pool_factor: int = 3) -> list:
+        """
+        Best `limit` ids. With `randomize`, draws `limit` ids without replacement
+        from the top `limit * pool_factor`, weighted by score (Efraimidis-Spirakis
+        keys), so the feed varies between visits but still favors what trends.
+        """
+        ranked = self._ranked.get(category, [])
+        if not randomize:
+            return ranked[:limit]
+        pool = ranked[:limit * pool_factor]
+        now = time.time()
+        scores = {i: self.score(i, now) for i in pool}
+        # Unengaged items still get a (small) chance
+        floor = min((s for s in scores.values() if s > 0), default=1.0) / 2
+        keyed = [(math.log(random.random() or 1e-12) / (scores[i] or floor), i) for i in pool]
+        return [item for _, item in heapq.nlargest(limit, keyed)]
+
+    def stats(self) -> dict:
+        now = time.time()
+        best = self._ranked.get(None, [])[:5]
+        return {
+            'items_scored': len(self._scores),
+            'events': self.events,
+            'half_life_hours': round(self.half_life / 3600, 1),
+            'version': self.version,
+            'categories': len([c for c in self._ranked if c is not None]),
+            'top': [{'id': i, 'score': round(self.score(i, now), 3)} for i in best],
+        }
+
+
+def _neg_id(doc_id: str):
+    """Sort key that puts larger (newer) ObjectId hex strings first"""
+    return tuple(-ord(ch) for ch in doc_id)
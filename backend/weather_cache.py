@@ -0,0 +1,172 @@
+"""
+Weather cache keyed by geohash cell
+
+Current weather barely differs across a few kilometres and only changes every
+~10 minutes, yet every /recommendations/weather call with coordinates used to
+hit OpenWeatherMap. Requests are bucketed into coarse geohash cells
+(precision 5 is ~4.9 x 4.9 km) and each cell's weather is reused for `ttl`
+seconds. The weather for a cell is always fetched at the cell centre, so
+every user in the cell sees the same answer.
+
+Past the TTL the last known value is kept for `stale_ttl` more seconds: it is
+served when the provider is slow, failing or out of budget. Cells are also
+counted by demand so a background task can refresh the busiest ones before
+they expire.
+"""
+
+import threading
+import time
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_INDEX = {ch: i for i, ch in enumerate(GEOHASH_ALPHABET)}
+
+
+def geohash(lat: float, lon: float, precision: int = 5) -> str:
+    """Standard base-32 geohash of a point"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, coord = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if coord >= mid:
+            value = (value << 1) | 1
+            rng[0] = mid
+        else:
+            value <<= 1
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def geohash_center(cell: str) -> tuple:
+    """(lat, lon) at the centre of a geohash cell"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for ch in cell:
+        value = GEOHASH_INDEX[ch]
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (value >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+
+class WeatherCache:
+    """Per-cell weather with a freshness TTL, a stale fallback window and demand counts"""
+
+    def __init__(self, ttl: float = 600, stale_ttl: float = 6 * 3600, precision: int = 5,
+                 demand_window: float = 3600, maxsize: int = 20000):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.precision = precision
+        self.demand_window = demand_window
+        self.maxsize = maxsize
+        # cell -> (weather, fetched_at)
+        self._entries = {}
+        # cell -> [requests in the current window, last request time]
+        self._demand = {}
+        self._lock = threading.Lock()
+        self.metrics = {
+            'requests': 0,
+            'hits': 0,
+            'misses': 0,
+            'stale_served': 0,
+            'upstream_calls': 0,
+            'upstream_failures': 0,
+            'prefetch_calls': 0,
+        }
+
+    def cell(self, lat: float, lon: float) -> str:
+        return geohash(lat, lon, self.precision)
+
+    def touch(self, cell: str):
+        """Count one request for `cell` (drives prefetching)"""
+        now = time.time()
+        with self._lock:
+            self.metrics['requests'] += 1
+            demand = self._demand.get(cell)
+            if demand is None or now - demand[1] > self.demand_window:
+                self._demand[cell] = [1, now]
+            else:
+                demand[0] += 1
+                demand[1] = now
+
+    def get(self, cell: str):
+        """Fresh weather for `cell`, or None (counted as a miss)"""
+        with self._lock:
+            entry = self._entries.get(cell)
+            if entry is not None and time.time() - entry[1] < self.ttl:
+                self.metrics['hits'] += 1
+                return entry[0]
+            self.metrics['misses'] += 1
+            return None
+
+    def last_known(self, cell: str):
+        """Expired-but-recent weather for `cell` when the provider cannot answer, or None"""
+        with self._lock:
+            entry = self._entries.get(cell)
+            if entry is not None and time.time() - entry[1] < self.ttl + self.stale_ttl:
+                self.metrics['stale_served'] += 1
+                return entry[0]
+            return None
+
+    def put(self, cell: str, weather: dict, prefetch: bool = False):
+        with self._lock:
+            self._entries[cell] = (weather, time.time())
+            self.metrics['prefetch_calls' if prefetch else 'upstream_calls'] += 1
+            if len(self._entries) > self.maxsize:
+                self._evict_locked()
+
+    def failed(self):
+        with self._lock:
+            self.metrics['upstream_failures'] += 1
+
+    def _evict_locked(self):
+        # Drop the oldest tenth: entries past the stale window go first anyway
+        for cell, _ in sorted(self._entries.items(), key=lambda item: item[1][1])[:max(1, self.maxsize // 10)]:
+            del self._entries[cell]
+
+    def hot_cells(self, limit: int = 50, refresh_within: float = 120, min_requests: int = 2) -> list:
+        """
+        The most requested cells (at least `min_requests` in the last
+        `demand_window` seconds) whose weather is missing or expires within
+        `refresh_within` seconds
+        """
+        now = time.time()
+        with self._lock:
+            for cell in [c for c, (_, last) in self._demand.items() if now - last > self.demand_window]:
+                del self._demand[cell]
+            ranked = sorted(self._demand.items(), key=lambda item: -item[1][0])
+            due = []
+            for cell, (count, _) in ranked:
+                if count < min_requests:
+                    break
+                entry = self._entries.get(cell)
+                if entry is None or now - entry[1] > self.ttl - refresh_within:
+                    due.append(cell)
+                    if len(due) >= limit:
+                        break
+            return due
+
+    def stats(self) -> dict:
+        with self._lock:
+            served = self.metrics['hits'] + self.metrics['stale_served']
+            lookups = self.metrics['hits'] + self.metrics['misses']
+            return {
+                'cells': len(self._entries),
+                'active_cells': len(self._demand),
+                'ttl_seconds': self.ttl,
+                'precision': self.precision,
+                **self.metrics,
+                'hit_rate': round(self.metrics['hits'] / lookups, 4) if lookups else 0.0,
+                # Requests answered without a call of their own
+                'upstream_calls_saved': served,
+            }
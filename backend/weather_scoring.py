@@ -0,0 +1,207 @@
+"""
+Vectorized weather-to-outfit scoring
+
+Every outfit is a row of a float32 feature matrix built from the
+TEMP_CATEGORY_RULES vocabulary (see weather_tags.py):
+
+- one column per style (1.0 when it is the outfit's category, 0.5 when
+  merely mentioned) and per keyword (1.0 when mentioned)
+- `warmth` in [0, 1] (0 = hot-weather outfit, 1 = cold-weather outfit) and
+  its square
+- readiness for rain, snow, wind and sun
+
+Weather becomes a weight vector over the same columns: the current
+temperature category's styles and keywords, the current condition, and
+2*t*WARMTH_WEIGHT on `warmth` with -WARMTH_WEIGHT on its square, which adds
+-WARMTH_WEIGHT * (warmth - t)^2 (plus a constant) - a penalty for being too
+warm or too light for the target warmth t. Ranking the catalog is then one
+matrix-vector product and an argpartition; many locations (push campaigns)
+are one matrix-matrix product with a row-wise argpartition.
+
+Rows are updated in place as the outfit snapshot changes.
+"""
+
+import threading
+
+import numpy as np
+
+from weather_tags import (
+    TEMP_CATEGORY_RULES, CONDITION_KEYWORDS, get_temp_category, weather_condition,
+    outfit_category, outfit_terms, temp_scores, ready_conditions
+)
+
+STYLES = sorted({style for rules in TEMP_CATEGORY_RULES.values() for style in rules['styles']})
+KEYWORDS = sorted({keyword for rules in TEMP_CATEGORY_RULES.values() for keyword in rules['keywords']})
+CONDITIONS = list(CONDITION_KEYWORDS)
+COLUMNS = ([f"style:{style}" for style in STYLES] + [f"keyword:{keyword}" for keyword in KEYWORDS]
+           + ['warmth', 'warmth_sq'] + [f"condition:{condition}" for condition in CONDITIONS])
+COLUMN_INDEX = {name: i for i, name in enumerate(COLUMNS)}
+
+# Warmth of an outfit tagged for each temperature category
+TEMP_WARMTH = {'hot': 0.0, 'warm': 0.25, 'mild': 0.5, 'cool': 0.75, 'cold': 1.0}
+NEUTRAL_WARMTH = 0.5
+# Target warmth runs linearly from 0 at HOT_F and above to 1 at COLD_F and below
+HOT_F, COLD_F = 85.0, 25.0
+
+STYLE_WEIGHT = 1.0
+KEYWORD_WEIGHT = 0.5
+WARMTH_WEIGHT = 2.0
+CONDITION_WEIGHT = 1.0
+
+# Bound the (outfits x locations) score block of a batch to about this many bytes
+MAX_BATCH_BYTES = 64 * 1024 * 1024
+
+
+def outfit_features(doc: dict) -> np.ndarray:
+    terms = outfit_terms(doc)
+    category = outfit_category(doc)
+    row = np.zeros(len(COLUMNS), dtype=np.float32)
+    for style in STYLES:
+        if style == category:
+            row[COLUMN_INDEX[f"style:{style}"]] = 1.0
+        elif style in terms:
+            row[COLUMN_INDEX[f"style:{style}"]] = 0.5
+    for keyword in KEYWORDS:
+        if keyword in terms:
+            row[COLUMN_INDEX[f"keyword:{keyword}"]] = 1.0
+    scores = temp_scores(category, terms)
+    total = sum(scores.values())
+    warmth = sum(TEMP_WARMTH[temp] * score for temp, score in scores.items()) / total if total else NEUTRAL_WARMTH
+    row[COLUMN_INDEX['warmth']] = warmth
+    row[COLUMN_INDEX['warmth_sq']] = warmth * warmth
+    for condition in ready_conditions(terms):
+        row[COLUMN_INDEX[f"condition:{condition}"]] = 1.0
+    return row
+
+
+def target_warmth(temp_f: float) -> float:
+    return min(1.0, max(0.0, (HOT_F - temp_f) / (HOT_F - COLD_F)))
+
+
+def weather_vector(temp_f: float, condition: str = None) -> np.ndarray:
+    """Column weights for the weather at one location"""
+    rules = TEMP_CATEGORY_RULES[get_temp_category(temp_f)]
+    vector = np.zeros(len(COLUMNS), dtype=np.float32)
+    for style in rules['styles']:
+        vector[COLUMN_INDEX[f"style:{style}"]] = STYLE_WEIGHT
+    for keyword in rules['keywords']:
+        vector[COLUMN_INDEX[f"keyword:{keyword}"]] = KEYWORD_WEIGHT
+    target = target_warmth(temp_f)
+    vector[COLUMN_INDEX['warmth']] = 2 * target * WARMTH_WEIGHT
+    vector[COLUMN_INDEX['warmth_sq']] = -WARMTH_WEIGHT
+    tag = weather_condition(condition)
+    if tag:
+        vector[COLUMN_INDEX[f"condition:{tag}"]] = CONDITION_WEIGHT
+    return vector
+
+
+class WeatherScorer:
+    """Outfit feature matrix with top-k weather ranking; subscribe `update` to the outfit snapshot"""
+
+    def __init__(self, capacity: int = 1024):
+        self._matrix = np.zeros((capacity, len(COLUMNS)), dtype=np.float32)
+        self._active = np.zeros(capacity, dtype=bool)
+        # row -> id and id -> row; rows of removed outfits are reused
+        self._ids = []
+        self._rows = {}
+        self._free = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def update(self, doc_id: str, doc):
+        """Re-featurize one outfit (None removes it)"""
+        features = outfit_features(doc) if doc is not None else None
+        with self._lock:
+            row = self._rows.get(doc_id)
+            if features is None:
+                if row is not None:
+                    del self._rows[doc_id]
+                    self._ids[row] = None
+                    self._active[row] = False
+                    self._matrix[row] = 0.0
+                    self._free.append(row)
+                return
+            if row is None:
+                row = self._free.pop() if self._free else self._append_locked()
+                self._rows[doc_id] = row
+                self._ids[row] = doc_id
+            self._matrix[row] = features
+            self._active[row] = True
+
+    def _append_locked(self) -> int:
+        row = len(self._ids)
+        if row == len(self._matrix):
+            capacity = max(1024, 2 * len(self._matrix))
+            matrix = np.zeros((capacity, len(COLUMNS)), dtype=np.float32)
+            matrix[:row] = self._matrix
+            active = np.zeros(capacity, dtype=bool)
+            active[:row] = self._active
+            self._matrix, self._active = matrix, active
+        self._ids.append(None)
+        return row
+
+    def ready_for(self, doc_id: str, condition: str) -> bool:
+        """Whether an outfit's features mark it ready for a condition tag (rain, snow, ...)"""
+        row = self._rows.get(doc_id)
+        column = COLUMN_INDEX.get(f"condition:{condition}")
+        return row is not None and column is not None and bool(self._matrix[row, column] > 0)
+
+    @staticmethod
+    def _top_rows(scores: np.ndarray, k: int) -> np.ndarray:
+        """Column indices of the k largest scores in each row, best first"""
+        if k < scores.shape[-1]:
+            top = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+        else:
+            top = np.broadcast_to(np.arange(scores.shape[-1]), scores.shape)
+        order = np.argsort(-np.take_along_axis(scores, top, axis=-1), axis=-1, kind='stable')
+        return np.take_along_axis(top, order, axis=-1)
+
+    def top(self, temp_f: float, condition: str = None, limit: int = 6) -> list:
+        """[(doc_id, score)] of the `limit` outfits best suited to one location's weather"""
+        vector = weather_vector(temp_f, condition)
+        with self._lock:
+            n = len(self._ids)
+            if not self._rows or limit < 1:
+                return []
+            scores = self._matrix[:n] @ vector
+            scores[~self._active[:n]] = -np.inf
+            rows = self._top_rows(scores, min(limit, len(self._rows)))
+            return [(self._ids[row], float(scores[row])) for row in rows]
+
+    def top_batch(self, weathers: list, limit: int = 6) -> list:
+        """
+        `top` for many locations at once: `weathers` is a list of
+        (temp_f, condition); returns one [(doc_id, score)] list per location.
+        Locations are scored in chunks (one locations x outfits product each)
+        so the score block stays bounded.
+        """
+        if not weathers:
+            return []
+        vectors = np.stack([weather_vector(temp_f, condition) for temp_f, condition in weathers])
+        results = []
+        with self._lock:
+            n = len(self._ids)
+            k = min(limit, len(self._rows))
+            if k < 1:
+                return [[] for _ in weathers]
+            matrix_t, inactive = self._matrix[:n].T, ~self._active[:n]
+            chunk = max(1, MAX_BATCH_BYTES // (4 * n))
+            for start in range(0, len(vectors), chunk):
+                scores = vectors[start:start + chunk] @ matrix_t
+                scores[:, inactive] = -np.inf
+                rows = self._top_rows(scores, k)
+                best = np.take_along_axis(scores, rows, axis=1)
+                for row_ids, row_scores in zip(rows.tolist(), best.tolist()):
+                    results.append([(self._ids[row], score) for row, score in zip(row_ids, row_scores)])
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'outfits': len(self._rows),
+                'features': len(COLUMNS),
+                'matrix_bytes': int(self._matrix.nbytes),
+                'free_rows': len(self._free),
+            }
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Weather suitability tags for outfits
+
+Each outfit is tagged once - from its category, title, description and item
+and product names, using TEMP_CATEGORY_RULES - with the temperature
+categories it suits (`weatherTemps`, with a score per category in
+`weatherScores`) and the conditions it is ready for (`weatherConditions`:
+rain, snow, wind, sun).
+
+`/recommendations/weather` ranks the in-memory catalog with the feature
+matrix in weather_scoring.py, built from the same rules. The tags are also
+stored on the documents (`python weather_tags.py`) so the MongoDB fallback
+is one query on the `weatherTemps` index.
+"""
+
+import os
+import re
+import sys
+
+from products import hydrate, load_products
+
+# Temperature to outfit category mapping
+TEMP_CATEGORY_RULES = {
+    'hot': {'min_temp': 85, 'styles': ['light', 'summer', 'casual'], 'keywords': ['tank', 'shorts', 'sandals', 'linen', 'breathable']},
+    'warm': {'min_temp': 70, 'styles': ['casual', 'streetwear', 'summer'], 'keywords': ['t-shirt', 'light', 'sneakers', 'casual']},
+    'mild': {'min_temp': 55, 'styles': ['casual', 'smart-casual', 'minimal'], 'keywords': ['long sleeve', 'jeans', 'jacket', 'layers']},
+    'cool': {'min_temp': 40, 'styles': ['layered', 'elegant', 'autumn'], 'keywords': ['sweater', 'coat', 'boots', 'scarf']},
+    'cold': {'min_temp': -100, 'styles': ['winter', 'warm', 'layered'], 'keywords': ['heavy coat', 'layers', 'beanie', 'warm boots']},
+}
+
+# Words that make an outfit ready for a weather condition
+CONDITION_KEYWORDS = {
+    'rain': ['waterproof', 'rain', 'raincoat', 'trench', 'umbrella', 'rain boots', 'water-resistant'],
+    'snow': ['snow', 'puffer', 'down jacket', 'thermal', 'beanie', 'gloves', 'snow boots', 'heavy coat'],
+    'wind': ['windbreaker', 'scarf', 'turtleneck', 'parka'],
+    'sun': ['sunglasses', 'cap', 'sun hat', 'linen', 'shorts', 'sandals', 'tank', 'breathable'],
+}
+
+# A style naming the outfit's category counts more than a passing mention
+CATEGORY_STYLE_WEIGHT = 3.0
+TEXT_STYLE_WEIGHT = 1.0
+KEYWORD_WEIGHT = 1.0
+MIN_TAG_SCORE = 1.0
+# ...and at least this share of the outfit's best category, so a summer look
+# that mentions "warm" once is not filed under cold weather
+RELATIVE_TAG_SCORE = 0.5
+
+WEATHER_FIELDS = ('weatherTemps', 'weatherScores', 'weatherConditions')
+
+
+def get_temp_category(temp_f: float) -> str:
+    """Get temperature category from Fahrenheit temperature"""
+    if temp_f >= 85:
+        return 'hot'
+    elif temp_f >= 70:
+        return 'warm'
+    elif temp_f >= 55:
+        return 'mild'
+    elif temp_f >= 40:
+        return 'cool'
+    return 'cold'
+
+
+def weather_condition(condition: str):
+    """OpenWeatherMap condition ("Rain", "Drizzle", "Clear", ...) -> condition tag, or None"""
+    text = (condition or '').lower()
+    if any(word in text for word in ('rain', 'drizzle', 'thunderstorm')):
+        return 'rain'
+    if 'snow' in text:
+        return 'snow'
+    if any(word in text for word in ('wind', 'squall', 'tornado')):
+        return 'wind'
+    if any(word in text for word in ('clear', 'sun')):
+        return 'sun'
+    return None
+
+
+WORD_PATTERN = re.compile(r"[\w'-]+")
+
+
+def outfit_category(doc: dict) -> str:
+    category = doc.get('category')
+    return category.lower() if isinstance(category, str) else ''
+
+
+def outfit_terms(doc: dict) -> set:
+    """
+    Words and two-word phrases of an outfit's category, title, description and
+    item/product names - every rule keyword is one of these, so matching a
+    keyword is a set lookup
+    """
+    parts = [doc.get('title'), doc.get('category'), doc.get('description')]
+    for field in ('items', 'products'):
+        for entry in doc.get(field) or []:
+            if isinstance(entry, dict):
+                parts += [entry.get('name'), entry.get('type')]
+    terms = set()
+    for part in parts:
+        if isinstance(part, str):
+            words = WORD_PATTERN.findall(part.lower())
+            terms.update(words)
+            terms.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return terms
+
+
+def temp_scores(category: str, terms: set) -> dict:
+    """Temperature category -> suitability score, for the categories an outfit is tagged with"""
+    scores = {}
+    for temp, rules in TEMP_CATEGORY_RULES.items():
+        score = 0.0
+        for style in rules['styles']:
+            if style == category:
+                score += CATEGORY_STYLE_WEIGHT
+            elif style in terms:
+                score += TEXT_STYLE_WEIGHT
+        score += KEYWORD_WEIGHT * sum(1 for keyword in rules['keywords'] if keyword in terms)
+        if score >= MIN_TAG_SCORE:
+            scores[temp] = score
+    best = max(scores.values(), default=0.0)
+    return {temp: score for temp, score in scores.items() if score >= best * RELATIVE_TAG_SCORE}
+
+
+def ready_conditions(terms: set) -> list:
+    return [condition for condition, words in CONDITION_KEYWORDS.items() if any(word in terms for word in words)]
+
+
+def weather_tags(doc: dict) -> dict:
+    """Temperature categories (with scores) and conditions an outfit suits"""
+    terms = outfit_terms(doc)
+    scores = temp_scores(outfit_category(doc), terms)
+    return {
+        'weatherTemps': sorted(scores, key=lambda temp: -scores[temp]),
+        'weatherScores': scores,
+        'weatherConditions': ready_conditions(terms),
+    }
+
+
+def backfill(db, batch_size: int = 500, dry_run: bool = False) -> int:
+    """Store weather tags on every outfit whose tags are missing or stale; returns the number updated"""
+    from pymongo import UpdateOne
+
+    collection = db['outfits']
+    products = load_products(db)
+    projection = {'title': 1, 'category': 1, 'description': 1, 'items': 1, 'products': 1,
+                  **{field: 1 for field in WEATHER_FIELDS}}
+    ops, count = [], 0
+    for doc in collection.find({}, projection):
+        tags = weather_tags(hydrate(doc, products.get))
+        if all(doc.get(field) == value for field, value in tags.items()):
+            continue
+        count += 1
+        ops.append(UpdateOne({'_id': doc['_id']}, {'$set': tags}))
+        if len(ops) >= batch_size:
+            if not dry_run:
+                collection.bulk_write(ops, ordered=False)
+            ops = []
+    if ops and not dry_run:
+        collection.bulk_write(ops, ordered=False)
+    return count
+
+
+def main():
+    from pymongo import MongoClient
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    dry_run = '--dry-run' in sys.argv
+    client = MongoClient(os.getenv('MONGO_URL', 'mongodb://localhost:27017/'))
+    db = client[os.getenv('DB_NAME', 'app_database')]
+    count = backfill(db, dry_run=dry_run)
+    print(f"outfits: {count} documents {'would be ' if dry_run else ''}tagged")
+    for temp in TEMP_CATEGORY_RULES:
+        print(f"  {temp:<5} {db['outfits'].count_documents({'weatherTemps': temp})}")
+    client.close()
+
+
+if __name__ == '__main__':
+    main()
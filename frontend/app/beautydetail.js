@@ -39,14 +39,35 @@ export default function BeautyDetail() {
   const [products, setProducts] = useState([]);
   const [similarLooks, setSimilarLooks] = useState([]);
 
-  // Initialize products when look loads
+  // Initialize products when look loads. Listings pass a card (no products or
+  // description), so the full look is fetched before falling back to mock products.
   useEffect(() => {
-    if (look) {
-      const beautyProducts = look.products && look.products.length > 0 
-        ? look.products 
-        : generateMockBeautyProducts(look);
-      setProducts(beautyProducts);
+    if (!look) return;
+    if (look.products && look.products.length > 0) {
+      setProducts(look.products);
+      return;
+    }
+    if (look.detailsLoaded || !look.id) {
+      setProducts(generateMockBeautyProducts(look));
+      return;
     }
+
+    let cancelled = false;
+    const fetchFullLook = async () => {
+      try {
+        const response = await fetch(`${API_BASE_URL}/api/beauty/id/${look.id}`);
+        const data = await response.json();
+        if (!cancelled) {
+          setLook({ ...look, ...(data.success ? asCardItem(data.look) : {}), detailsLoaded: true });
+        }
+      } catch (error) {
+        console.error('Error fetching beauty look details:', error);
+        if (!cancelled) setLook({ ...look, detailsLoaded: true });
+      }
+    };
+
+    fetchFullLook();
+    return () => { cancelled = true; };
   }, [look]);
 
   // Fetch beauty look by ID if coming from deep link
@@ -60,7 +81,7 @@ export default function BeautyDetail() {
           
           if (data.success) {
             const normalizedLook = asCardItem(data.look);
-            setLook(normalizedLook);
+            setLook({ ...normalizedLook, detailsLoaded: true });
             trackBeautyView(normalizedLook);
           } else {
             Alert.alert('Error', 'Beauty look not found');